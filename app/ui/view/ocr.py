@@ -1,17 +1,317 @@
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QHBoxLayout, QFrame
+import os
 
-from app.ui.library.qfluentwidgets import SubtitleLabel, setFont
+from PySide6.QtCore import Qt, QSize, QTimer
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QApplication, QListWidgetItem
+from PySide6.QtGui import QFont, QGuiApplication, QImage, QPixmap, QIcon
 
+from app.ui.library.qfluentwidgets import (
+    setFont, PushButton, ScrollArea, TextEdit, InfoBar, HeaderCardWidget, CaptionLabel, ComboBox,
+    SearchLineEdit, ListWidget
+)
 
-class OCR(QFrame):
+from app.ui.view.watermark_add import FileSelectorCard, GradientHeader
+from app.ui.widgets.status_bar_widget import StatusInfoWidget
+
+from core.watermark.extract import collect_images
+from core.watermark.render import qimage_view
+from core.ocr.runner import OcrRunner, BatchOcrEngine
+from core.ocr.index import SearchIndex, THUMB_SIZE
+
+
+SEARCH_LIMIT = 100              # 搜索结果最多显示的条数
+THUMBS_PER_TICK = 4             # 每轮事件循环加载的缩略图数, 未缓存的缩略图需要解码原图
+SNIPPET_LENGTH = 60             # 搜索结果中显示的文字长度
+RESULT_HEIGHT = 96              # 搜索结果每行的高度, 缩略图按比例缩放到该高度以内
+
+
+class HeaderWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        text = "OCR"
-        self.label = SubtitleLabel(text, self)
-        self.hBoxLayout = QHBoxLayout(self)
-
-        setFont(self.label, 24)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.hBoxLayout.addWidget(self.label, 1, Qt.AlignCenter)
-        self.setObjectName(text.replace(' ', '-'))
\ No newline at end of file
+        header = GradientHeader(parent=self)
+        header_layout = QHBoxLayout(header)
+        header_layout.setContentsMargins(30, 20, 30, 20)
+        header_layout.setSpacing(10)
+
+        title_label = QLabel("🔤 文字提取")
+        setFont(title_label, fontSize=24, weight=QFont.DemiBold)
+        title_label.setStyleSheet("""
+            QLabel {
+                color: white;
+            }
+        """)
+        header_layout.addWidget(title_label)
+        header_layout.addStretch(1)
+
+        self.clipboard_btn = PushButton(text="📋 识别剪贴板")
+        self.clipboard_btn.setStyleSheet("""
+            PushButton {
+                background-color: rgba(255, 255, 255, 0.2);
+                color: white;
+                border: 1px solid rgba(255, 255, 255, 0.3);
+                padding: 8px 16px;
+                border-radius: 8px;
+                font-size: 14px;
+            }
+            PushButton:hover {
+                background-color: rgba(255, 255, 255, 0.3);
+            }
+            QPushButton:pressed {
+                background-color: rgba(255, 255, 255, 0.15);
+            }
+        """)
+        header_layout.addWidget(self.clipboard_btn)
+
+        self.process_btn = PushButton(text="▶️ 开始识别")
+        self.process_btn.setStyleSheet("""
+            PushButton {
+                background-color: white;
+                color: #667eea;
+                padding: 8px 16px;
+                border-radius: 8px;
+                font-size: 14px;
+                font-weight: 500;
+            }
+            PushButton:hover {
+                background-color: #f8f9fa;
+            }
+            PushButton:pressed {
+                background-color: #5a67d8;
+            }
+        """)
+        header_layout.addWidget(self.process_btn)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+        main_layout.addWidget(header)
+
+
+class OcrSettingsCard(HeaderCardWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTitle(self.tr("⚙️ 识别设置"))
+        self.setBorderRadius(8)
+        self.viewLayout.setContentsMargins(10, 10, 10, 10)
+
+        settings = QWidget()
+        settings_layout = QVBoxLayout(settings)
+        settings_layout.setAlignment(Qt.AlignmentFlag.AlignLeft)
+        settings_layout.setContentsMargins(0, 0, 0, 0)
+        settings_layout.setSpacing(8)
+
+        source_label = CaptionLabel(text=self.tr("图片类型"))
+        setFont(source_label, 13)
+        source_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        settings_layout.addWidget(source_label)
+        # 扫描件需要校正倾斜和二值化; 截图的文字本身是水平的, 浅色文字二值化后反而会丢失
+        self.source_combo = ComboBox()
+        self.source_combo.addItems([
+            self.tr("屏幕截图"), self.tr("扫描文档 (校正倾斜、二值化)")
+        ])
+        settings_layout.addWidget(self.source_combo)
+
+        self.viewLayout.addWidget(settings)
+
+    def is_scan(self):
+        return self.source_combo.currentIndex() == 1
+
+
+class ControlPanelWidget(ScrollArea):
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        view = QWidget(self)
+        view.setObjectName('controlPanel')
+        main_layout = QVBoxLayout(view)
+        main_layout.setContentsMargins(0, 0, 12, 0)
+        main_layout.setSpacing(10)
+        main_layout.setAlignment(Qt.AlignTop)
+
+        self.fileSelectorCard = FileSelectorCard(self)
+        main_layout.addWidget(self.fileSelectorCard)
+
+        self.ocrSettingsCard = OcrSettingsCard(self)
+        main_layout.addWidget(self.ocrSettingsCard)
+
+        self.setWidget(view)
+        self.setViewportMargins(0, 0, 0, 0)
+        self.setWidgetResizable(True)
+        self.enableTransparentBackground()
+
+
+class ResultWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("ResultWidget")
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+
+        # 在已识别的图片中按文字搜索
+        self.search_edit = SearchLineEdit()
+        self.search_edit.setPlaceholderText(self.tr("搜索已识别的图片"))
+        main_layout.addWidget(self.search_edit)
+        self.result_list = ListWidget()
+        self.result_list.setIconSize(QSize(THUMB_SIZE, RESULT_HEIGHT - 8))
+        self.result_list.hide()
+        main_layout.addWidget(self.result_list, 1)
+
+        self.text_edit = TextEdit()
+        self.text_edit.setReadOnly(True)
+        self.text_edit.setPlaceholderText(self.tr("识别结果"))
+        main_layout.addWidget(self.text_edit, 1)
+
+        # 底部状态栏
+        self.status_info_widget = StatusInfoWidget(self)
+        main_layout.addWidget(self.status_info_widget)
+
+    def append_result(self, title, lines):
+        text = "\n".join(line.text for line in lines) or self.tr("(未识别到文字)")
+        self.text_edit.append(f"── {title} ──\n{text}\n")
+
+
+class OCR(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.setObjectName("OCR")
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+
+        self.engine = None
+        # 识别进程在第一次显示页面时启动, 用户选择文件期间模型已经加载完成
+        self.runner = OcrRunner(parent=self)
+        self.runner.resultReady.connect(self.on_clipboard_result)
+        self.runner.jobFailed.connect(
+            lambda key, reason: InfoBar.error(self.tr("识别失败"), reason, duration=3000, parent=self))
+        QApplication.instance().aboutToQuit.connect(self.runner.shutdown)
+        self.warmed = False
+
+        # 识别结果写入全文索引, 缩略图分批加载, 搜索结果较多时界面不会卡住
+        self.index = SearchIndex()
+        QApplication.instance().aboutToQuit.connect(self.index.close)
+        self.thumb_queue = []
+        self.thumb_timer = QTimer(self)
+        self.thumb_timer.timeout.connect(self.load_thumbnails)
+
+        self.header = HeaderWidget(self)
+        main_layout.addWidget(self.header, 0, Qt.AlignTop)
+
+        view_layout = QHBoxLayout()
+        view_layout.setContentsMargins(0, 0, 0, 0)
+        view_layout.setSpacing(0)
+
+        self.control_panel_widget = ControlPanelWidget(self)
+        view_layout.addWidget(self.control_panel_widget, 3)
+
+        self.right_content = ResultWidget(self)
+        view_layout.addWidget(self.right_content, 7)
+
+        main_layout.addLayout(view_layout)
+
+        self.header.process_btn.clicked.connect(self.start_recognition)
+        self.header.clipboard_btn.clicked.connect(self.recognize_clipboard)
+        self.right_content.search_edit.searchSignal.connect(self.search)
+        self.right_content.search_edit.clearSignal.connect(self.clear_search)
+        self.right_content.result_list.itemClicked.connect(self.show_document)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.warmed:
+            self.warmed = True
+            if self.runner.testing:
+                self.check_backend()
+            else:
+                self.runner.warm_up()
+
+    def check_backend(self):
+        """ 没有安装识别模型时只有测试后端可用, 它的输出不是识别结果, 拒绝运行 """
+        if not self.runner.testing:
+            return True
+        InfoBar.error(self.tr("未安装文字识别模型"), self.tr("请先安装 rapidocr_onnxruntime, 再重新打开程序"),
+                      duration=5000, parent=self)
+        return False
+
+    def start_recognition(self):
+        if not self.check_backend():
+            return
+        if self.engine and self.engine.isRunning():
+            InfoBar.warning(self.tr("正在处理"), self.tr("请等待当前任务完成"), duration=2000, parent=self)
+            return
+
+        files, dirs = self.control_panel_widget.fileSelectorCard.selected_sources()
+        paths = collect_images(files, dirs)
+        if not paths:
+            InfoBar.warning(self.tr("没有可处理的文件"), self.tr("请先选择图片文件或目录"), duration=2000, parent=self)
+            return
+
+        status = self.right_content.status_info_widget
+        status.reset(len(paths))
+        self.right_content.text_edit.clear()
+
+        clean = self.control_panel_widget.ocrSettingsCard.is_scan()
+        self.engine = BatchOcrEngine(paths, self.runner, clean, parent=self)
+        self.engine.progressChanged.connect(status.set_progress)
+        self.engine.jobFailed.connect(status.add_failure)
+        self.engine.resultReady.connect(self.on_file_result)
+        self.engine.finished.connect(self.index.flush)
+        self.engine.start()
+
+    def on_file_result(self, path, lines):
+        self.right_content.append_result(os.path.basename(path), lines)
+        if not self.runner.testing:
+            self.index.add(path, "\n".join(line.text for line in lines))
+
+    def recognize_clipboard(self):
+        if not self.check_backend():
+            return
+        image = QGuiApplication.clipboard().image()
+        if image.isNull():
+            InfoBar.warning(self.tr("剪贴板中没有图片"), self.tr("请先截图或复制一张图片"), duration=2000, parent=self)
+            return
+        image = image.convertToFormat(QImage.Format_RGBX8888)
+        # 复制为紧凑的 RGB 数组后再送到工作进程
+        pixels = qimage_view(image)[..., :3].copy()
+        self.runner.recognize("clipboard", pixels)
+
+    def on_clipboard_result(self, key, lines):
+        self.right_content.append_result(self.tr("剪贴板"), lines)
+
+    def search(self, query):
+        results = self.index.search(query, SEARCH_LIMIT)
+        result_list = self.right_content.result_list
+        result_list.clear()
+        self.thumb_queue = []
+        for path, text in results:
+            snippet = " ".join(text.split())[:SNIPPET_LENGTH]
+            item = QListWidgetItem(f"{os.path.basename(path)}\n{snippet}")
+            item.setData(Qt.UserRole, (path, text))
+            item.setToolTip(path)
+            item.setSizeHint(QSize(0, RESULT_HEIGHT))
+            result_list.addItem(item)
+            self.thumb_queue.append(item)
+        result_list.setVisible(bool(results))
+        if results:
+            self.thumb_timer.start(0)
+        else:
+            InfoBar.info(self.tr("没有找到"), query, duration=2000, parent=self)
+
+    def clear_search(self):
+        self.thumb_queue = []
+        self.thumb_timer.stop()
+        self.right_content.result_list.clear()
+        self.right_content.result_list.hide()
+
+    def load_thumbnails(self):
+        batch, self.thumb_queue = self.thumb_queue[:THUMBS_PER_TICK], self.thumb_queue[THUMBS_PER_TICK:]
+        for item in batch:
+            pixmap = QPixmap()
+            if pixmap.loadFromData(self.index.thumbnail(item.data(Qt.UserRole)[0])):
+                item.setIcon(QIcon(pixmap))
+        if not self.thumb_queue:
+            self.thumb_timer.stop()
+
+    def show_document(self, item):
+        path, text = item.data(Qt.UserRole)
+        self.right_content.text_edit.setPlainText(f"── {os.path.basename(path)} ──\n{text}")
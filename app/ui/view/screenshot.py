@@ -1,17 +1,129 @@
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QHBoxLayout, QFrame
+from PySide6.QtCore import Qt, QTimer, QRect
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFileDialog
+from PySide6.QtGui import QFont, QPixmap, QGuiApplication
 
-from app.ui.library.qfluentwidgets import SubtitleLabel, setFont
+from app.ui.library.qfluentwidgets import setFont, PushButton, InfoBar
 
+from app.ui.view.watermark_add import GradientHeader
+from app.ui.widgets.image_preview_widget import SyncGraphicsView
+from app.ui.widgets.selection_overlay import SelectionOverlay
 
-class Screenshot(QFrame):
+from core.capture.screen import create_capture
+
+
+HIDE_DELAY = 200                # 隐藏主窗口后等待窗口管理器重绘的时间 (毫秒)
+
+
+class HeaderWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        header = GradientHeader(parent=self)
+        header_layout = QHBoxLayout(header)
+        header_layout.setContentsMargins(30, 20, 30, 20)
+        header_layout.setSpacing(10)
+
+        title_label = QLabel("📷 屏幕截图")
+        setFont(title_label, fontSize=24, weight=QFont.DemiBold)
+        title_label.setStyleSheet("""
+            QLabel {
+                color: white;
+            }
+        """)
+        header_layout.addWidget(title_label)
+        header_layout.addStretch(1)
+
+        self.copy_btn = PushButton(text="📋 复制")
+        self.save_btn = PushButton(text="💾 保存")
+        self.capture_btn = PushButton(text="✂️ 新建截图")
+        for button in (self.copy_btn, self.save_btn, self.capture_btn):
+            button.setStyleSheet("""
+                PushButton {
+                    background-color: white;
+                    color: #667eea;
+                    padding: 8px 16px;
+                    border-radius: 8px;
+                    font-size: 14px;
+                    font-weight: 500;
+                }
+                PushButton:hover {
+                    background-color: #f8f9fa;
+                }
+                PushButton:pressed {
+                    background-color: #5a67d8;
+                }
+            """)
+            header_layout.addWidget(button)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+        main_layout.addWidget(header)
+
+
+class Screenshot(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        text = "Screenshot"
-        self.label = SubtitleLabel(text, self)
-        self.hBoxLayout = QHBoxLayout(self)
-
-        setFont(self.label, 24)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.hBoxLayout.addWidget(self.label, 1, Qt.AlignCenter)
-        self.setObjectName(text.replace(' ', '-'))
\ No newline at end of file
+        self.setObjectName("Screenshot")
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+
+        self.capture = None
+        self.overlay = None
+        self.result = None
+
+        self.header = HeaderWidget(self)
+        main_layout.addWidget(self.header, 0, Qt.AlignTop)
+        self.preview = SyncGraphicsView(sub_title="点击新建截图开始")
+        main_layout.addWidget(self.preview, 1)
+
+        self.header.capture_btn.clicked.connect(self.start_capture)
+        self.header.copy_btn.clicked.connect(self.copy_result)
+        self.header.save_btn.clicked.connect(self.save_result)
+
+    def start_capture(self):
+        if self.overlay:
+            return
+        # 主窗口隐藏后再冻结画面, 避免截到自己
+        self.window().hide()
+        QTimer.singleShot(HIDE_DELAY, self.show_overlay)
+
+    def show_overlay(self):
+        if self.capture is None:
+            self.capture = create_capture()
+        # 截图后端复用同一块内存, 冻结的画面需要复制
+        frame = self.capture.grab().copy()
+        geometry = QRect()
+        for screen in QGuiApplication.screens():
+            geometry = geometry.united(screen.geometry())
+
+        self.overlay = SelectionOverlay(frame, geometry)
+        self.overlay.regionSelected.connect(self.on_region_selected)
+        self.overlay.destroyed.connect(self.on_overlay_closed)
+        self.overlay.show()
+        self.overlay.activateWindow()
+
+    def on_region_selected(self, rect):
+        self.result = self.overlay.frame.copy(rect)
+        self.preview.set_pixmap(QPixmap.fromImage(self.result))
+
+    def on_overlay_closed(self):
+        self.overlay = None
+        window = self.window()
+        window.show()
+        window.activateWindow()
+
+    def copy_result(self):
+        if self.result is None:
+            return
+        QGuiApplication.clipboard().setImage(self.result)
+        InfoBar.success(self.tr("已复制"), self.tr("截图已复制到剪贴板"), duration=2000, parent=self)
+
+    def save_result(self):
+        if self.result is None:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, self.tr("保存截图"), "screenshot.png",
+                                              self.tr("图片 (*.png *.jpg *.bmp)"))
+        if path and not self.result.save(path):
+            InfoBar.error(self.tr("保存失败"), path, duration=3000, parent=self)
@@ -1,17 +1,222 @@
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QHBoxLayout, QFrame
+from PySide6.QtCore import Qt, QTimer, QRect, QPoint
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QFileDialog
+from PySide6.QtGui import QFont, QImage, QGuiApplication
 
-from app.ui.library.qfluentwidgets import SubtitleLabel, setFont
+from app.ui.library.qfluentwidgets import setFont, PushButton, InfoBar, CaptionLabel
 
+from app.ui.view.watermark_add import GradientHeader
+from app.ui.widgets.image_preview_widget import SyncGraphicsView
+from app.ui.widgets.selection_overlay import SelectionOverlay
+from app.ui.widgets.tiled_canvas_item import TiledCanvasItem
 
-class ScrollScreenshot(QFrame):
+from core.capture.screen import create_capture
+from core.capture.stitch import ScrollStitcher
+from core.capture.canvas import TiledCanvas
+from core.capture.damage import CaptureScheduler
+
+
+HIDE_DELAY = 200                # 隐藏主窗口后等待窗口管理器重绘的时间 (毫秒)
+TOOLBAR_MARGIN = 8              # 拼接工具条与截图区域之间的距离
+
+
+class HeaderWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        header = GradientHeader(parent=self)
+        header_layout = QHBoxLayout(header)
+        header_layout.setContentsMargins(30, 20, 30, 20)
+        header_layout.setSpacing(10)
+
+        title_label = QLabel("📜 滚动截图")
+        setFont(title_label, fontSize=24, weight=QFont.DemiBold)
+        title_label.setStyleSheet("""
+            QLabel {
+                color: white;
+            }
+        """)
+        header_layout.addWidget(title_label)
+        header_layout.addStretch(1)
+
+        self.copy_btn = PushButton(text="📋 复制")
+        self.save_btn = PushButton(text="💾 保存")
+        self.capture_btn = PushButton(text="✂️ 新建滚动截图")
+        for button in (self.copy_btn, self.save_btn, self.capture_btn):
+            button.setStyleSheet("""
+                PushButton {
+                    background-color: white;
+                    color: #667eea;
+                    padding: 8px 16px;
+                    border-radius: 8px;
+                    font-size: 14px;
+                    font-weight: 500;
+                }
+                PushButton:hover {
+                    background-color: #f8f9fa;
+                }
+                PushButton:pressed {
+                    background-color: #5a67d8;
+                }
+            """)
+            header_layout.addWidget(button)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+        main_layout.addWidget(header)
+
+
+class StitchToolbar(QWidget):
+    """ 拼接过程中显示在截图区域旁边的工具条, 不能与截图区域重叠, 否则会被截进画面 """
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        self.setStyleSheet("""
+            StitchToolbar {
+                background-color: white;
+                border: 1px solid #667eea;
+                border-radius: 8px;
+            }
+        """)
+        self.setAttribute(Qt.WA_StyledBackground)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(10, 6, 6, 6)
+        layout.setSpacing(10)
+        self.status_label = CaptionLabel(self.tr("请向下滚动"))
+        layout.addWidget(self.status_label)
+        self.finish_btn = PushButton(text="✅ 完成")
+        layout.addWidget(self.finish_btn)
+
+    def place(self, region: QRect, bounds: QRect):
+        """ 放在区域下方, 下方放不下时放在上方, 都放不下时放在区域内的右上角 """
+        self.adjustSize()
+        x = min(max(region.left(), bounds.left()), bounds.right() - self.width())
+        if region.bottom() + TOOLBAR_MARGIN + self.height() <= bounds.bottom():
+            y = region.bottom() + TOOLBAR_MARGIN
+        elif region.top() - TOOLBAR_MARGIN - self.height() >= bounds.top():
+            y = region.top() - TOOLBAR_MARGIN - self.height()
+        else:
+            x, y = region.right() - self.width(), region.top()
+        self.move(QPoint(x, y))
+
+
+class ScrollScreenshot(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        text = "ScrollScreenshot"
-        self.label = SubtitleLabel(text, self)
-        self.hBoxLayout = QHBoxLayout(self)
-
-        setFont(self.label, 24)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.hBoxLayout.addWidget(self.label, 1, Qt.AlignCenter)
-        self.setObjectName(text.replace(' ', '-'))
\ No newline at end of file
+        self.setObjectName("ScrollScreenshot")
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+
+        self.capture = None
+        self.overlay = None
+        self.stitcher = None
+        self.scheduler = None
+        self.canvas = None
+        self.canvas_item = None
+
+        self.header = HeaderWidget(self)
+        main_layout.addWidget(self.header, 0, Qt.AlignTop)
+        self.preview = SyncGraphicsView(sub_title="点击新建滚动截图, 选择区域后向下滚动")
+        main_layout.addWidget(self.preview, 1)
+
+        self.toolbar = StitchToolbar()
+        self.toolbar.finish_btn.clicked.connect(self.finish_stitching)
+
+        self.header.capture_btn.clicked.connect(self.start_capture)
+        self.header.copy_btn.clicked.connect(self.copy_result)
+        self.header.save_btn.clicked.connect(self.save_result)
+
+    def start_capture(self):
+        if self.overlay or self.stitcher:
+            return
+        # 主窗口隐藏后再冻结画面, 避免截到自己
+        self.window().hide()
+        QTimer.singleShot(HIDE_DELAY, self.show_overlay)
+
+    def show_overlay(self):
+        if self.capture is None:
+            self.capture = create_capture()
+        # 截图后端复用同一块内存, 冻结的画面需要复制
+        frame = self.capture.grab().copy()
+        geometry = QRect()
+        for screen in QGuiApplication.screens():
+            geometry = geometry.united(screen.geometry())
+
+        self.overlay = SelectionOverlay(frame, geometry)
+        self.overlay.regionSelected.connect(self.start_stitching)
+        self.overlay.cancelled.connect(self.restore_window)
+        self.overlay.destroyed.connect(self.on_overlay_closed)
+        self.overlay.show()
+        self.overlay.activateWindow()
+
+    def on_overlay_closed(self):
+        self.overlay = None
+
+    def start_stitching(self, rect):
+        """ 选定区域后用户开始滚动, 区域内的画面变化时才截图并交给拼接器
+
+        拼接结果写入临时文件中的 TiledCanvas, 预览只绘制可见的图块, 长度不受内存限制.
+        """
+        if self.canvas is not None:
+            self.canvas.close()
+        self.canvas = TiledCanvas(rect.width())
+        self.stitcher = ScrollStitcher(self.canvas)
+        self.canvas_item = TiledCanvasItem(self.canvas)
+        self.preview.set_item(self.canvas_item)
+        geometry = QRect()
+        for screen in QGuiApplication.screens():
+            geometry = geometry.united(screen.geometry())
+        self.toolbar.status_label.setText(self.tr("请向下滚动"))
+        self.toolbar.place(rect, geometry)
+        self.toolbar.show()
+        # 画面静止时不截图, 相同的画面也不会送到拼接器
+        self.scheduler = CaptureScheduler(self.capture, rect, parent=self)
+        self.scheduler.frameReady.connect(self.on_frame)
+        self.scheduler.start()
+
+    def on_frame(self, frame):
+        added = self.stitcher.push(frame)
+        if added is None:
+            self.toolbar.status_label.setText(self.tr("无法对齐, 请放慢滚动速度"))
+        elif added:
+            self.canvas_item.refresh()
+            self.toolbar.status_label.setText(self.tr("已拼接 {0} 行").format(self.canvas.height))
+
+    def finish_stitching(self):
+        self.scheduler.close()
+        self.scheduler.deleteLater()
+        self.scheduler = None
+        self.toolbar.hide()
+        self.stitcher.finish()
+        self.stitcher = None
+        self.canvas_item.refresh()
+        self.restore_window()
+
+    def restore_window(self):
+        window = self.window()
+        window.show()
+        window.activateWindow()
+
+    def copy_result(self):
+        if self.canvas is None or self.stitcher or self.canvas.height == 0:
+            return
+        pixels = self.canvas.rows(0, self.canvas.height)
+        image = QImage(pixels.data, pixels.shape[1], pixels.shape[0], pixels.strides[0], QImage.Format_RGB32)
+        QGuiApplication.clipboard().setImage(image.copy())
+        InfoBar.success(self.tr("已复制"), self.tr("截图已复制到剪贴板"), duration=2000, parent=self)
+
+    def save_result(self):
+        if self.canvas is None or self.stitcher or self.canvas.height == 0:
+            return
+        path, _ = QFileDialog.getSaveFileName(self, self.tr("保存截图"), "screenshot.png",
+                                              self.tr("图片 (*.png *.jpg *.bmp *.tif)"))
+        if not path:
+            return
+        # 逐图块写出, 不生成整幅位图
+        try:
+            self.canvas.export(path)
+        except (OSError, ValueError) as e:
+            InfoBar.error(self.tr("保存失败"), str(e), duration=3000, parent=self)
@@ -1,12 +1,14 @@
-from PySide6.QtCore import Qt
+import os
+
+from PySide6.QtCore import Qt, Signal
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QStackedWidget, QHBoxLayout, QLabel, QLineEdit, QFileDialog
 )
-from PySide6.QtGui import QPainter, QBrush, QLinearGradient, QColor, QFont, QAction
+from PySide6.QtGui import QPainter, QBrush, QLinearGradient, QColor, QFont, QAction, QPixmap
 
 from app.ui.library.qfluentwidgets import (
     ScrollArea, HeaderCardWidget, SegmentedWidget, setFont, FluentIcon,
-    PushButton, CaptionLabel, TextEdit, SpinBox, ComboBox, Slider, LineEdit
+    PushButton, CaptionLabel, TextEdit, SpinBox, ComboBox, Slider, LineEdit, InfoBar
 )
 
 from app.ui.widgets.font_card import FontCard, get_available_fonts
@@ -17,6 +19,14 @@ from app.ui.widgets.image_preview_widget import SyncImageViewer
 from app.ui.widgets.video_preview_widget import SyncVideoViewer
 from app.ui.widgets.status_bar_widget import StatusInfoWidget
 
+from core.watermark.settings import (WatermarkSettings, WatermarkType, ContentType, Location, OutputFormat,
+                                     IMAGE_EXTENSIONS)
+from core.watermark.render import render_layer
+from core.watermark.engine import BatchWatermarkEngine, collect_jobs, collect_video_jobs
+from core.watermark.video import VideoWatermarkPipeline
+from core.watermark.preview import PreviewRenderer
+from core.watermark.extract import BatchExtractEngine, collect_images, REPORT_NAME
+
 
 class FileSelectorCard(HeaderCardWidget):
     def __init__(self, parent=None):
@@ -36,14 +46,18 @@ class FileSelectorCard(HeaderCardWidget):
         self.viewLayout.setContentsMargins(10, 10, 10, 10)
         self.viewLayout.addLayout(main_layout)
 
-        singleFileSelector = FileSelectorWidget(self)
-        batchFilesSelector = DirectorySelectorWidget(self)
+        self.selected_files = []
+        self.selected_dirs = []
+        self.singleFileSelector = FileSelectorWidget(self)
+        self.batchFilesSelector = DirectorySelectorWidget(self)
+        self.singleFileSelector.file_selected.connect(self.on_files_selected)
+        self.batchFilesSelector.directory_selected.connect(self.on_dirs_selected)
 
-        self.addSubInterface(singleFileSelector, 'FileSelectorWidget', self.tr("文件"))
-        self.addSubInterface(batchFilesSelector, 'DirectorySelectorWidget', self.tr("目录"))
+        self.addSubInterface(self.singleFileSelector, 'FileSelectorWidget', self.tr("文件"))
+        self.addSubInterface(self.batchFilesSelector, 'DirectorySelectorWidget', self.tr("目录"))
 
-        self.stackedWidget.setCurrentWidget(singleFileSelector)
-        self.pivot.setCurrentItem(singleFileSelector.objectName())
+        self.stackedWidget.setCurrentWidget(self.singleFileSelector)
+        self.pivot.setCurrentItem(self.singleFileSelector.objectName())
         self.pivot.currentItemChanged.connect(
             lambda k:  self.stackedWidget.setCurrentWidget(self.findChild(QWidget, k)))
 
@@ -52,8 +66,22 @@ class FileSelectorCard(HeaderCardWidget):
         self.stackedWidget.addWidget(widget)
         self.pivot.addItem(routeKey=objectName, text=text)
 
+    def on_files_selected(self, files):
+        self.selected_files = files
+
+    def on_dirs_selected(self, dirs):
+        self.selected_dirs = dirs
+
+    def selected_sources(self):
+        """返回当前标签页对应的 (文件列表, 目录列表)"""
+        if self.stackedWidget.currentWidget() is self.batchFilesSelector:
+            return [], self.selected_dirs
+        return self.selected_files, []
+
 
 class WatermarkTypeSelectorCard(HeaderCardWidget):
+    type_changed = Signal(str)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.selected_type = "visible"  # 表示被选择的水印类型
@@ -152,6 +180,7 @@ class WatermarkTypeSelectorCard(HeaderCardWidget):
             return
         self.selected_type = type_name
         self.update_styles()
+        self.type_changed.emit(type_name)
 
     def update_styles(self):
         if self.selected_type == "visible":
@@ -189,27 +218,27 @@ class WatermarkContentCard(HeaderCardWidget):
         setFont(text_label_1, 13)
         text_label_1.setStyleSheet("color: #888888;")  # 设置为浅灰色
         text_settings_layout.addWidget(text_label_1)
-        text_edit = TextEdit()
-        text_edit.setPlaceholderText(self.tr("输入水印文字"))
-        text_edit.setText("@ PowerTools")
-        text_edit.setFixedHeight(50)
-        setFont(text_edit, 13)
-        text_settings_layout.addWidget(text_edit)
+        self.text_edit = TextEdit()
+        self.text_edit.setPlaceholderText(self.tr("输入水印文字"))
+        self.text_edit.setText("@ PowerTools")
+        self.text_edit.setFixedHeight(50)
+        setFont(self.text_edit, 13)
+        text_settings_layout.addWidget(self.text_edit)
         text_settings_layout.addSpacing(10)
 
         text_label_2 = CaptionLabel(text=self.tr("字体"))
         setFont(text_label_2, 13)
         text_label_2.setStyleSheet("color: #888888;")  # 设置为浅灰色
         text_settings_layout.addWidget(text_label_2)
-        font_combo = ComboBox()
+        self.font_combo = ComboBox()
         self.common_fonts_zh, self.common_fonts_en = get_available_fonts()
-        font_combo.addItems(list(self.common_fonts_zh.keys()) + list(self.common_fonts_en.keys()))
-        font_combo.currentTextChanged.connect(self.font_changed)
-        text_settings_layout.addWidget(font_combo)
-        if font_combo.currentText() in self.common_fonts_zh.keys():
-            self.font_card = FontCard(self.common_fonts_zh[font_combo.currentText()], "你好，世界", parent=self)
+        self.font_combo.addItems(list(self.common_fonts_zh.keys()) + list(self.common_fonts_en.keys()))
+        self.font_combo.currentTextChanged.connect(self.font_changed)
+        text_settings_layout.addWidget(self.font_combo)
+        if self.font_combo.currentText() in self.common_fonts_zh.keys():
+            self.font_card = FontCard(self.common_fonts_zh[self.font_combo.currentText()], "你好，世界", parent=self)
         else:
-            self.font_card = FontCard(self.common_fonts_en[font_combo.currentText()], "hello, world", parent=self)
+            self.font_card = FontCard(self.common_fonts_en[self.font_combo.currentText()], "hello, world", parent=self)
         text_settings_layout.addWidget(self.font_card)
         text_settings_layout.addSpacing(10)
 
@@ -217,21 +246,21 @@ class WatermarkContentCard(HeaderCardWidget):
         setFont(text_label_3, 13)
         text_label_3.setStyleSheet("color: #888888;")  # 设置为浅灰色
         text_settings_layout.addWidget(text_label_3)
-        spinBox = SpinBox()
-        setFont(spinBox, 13)
-        spinBox.setRange(8, 50)
-        spinBox.setValue(15)
+        self.font_size_spin_box = SpinBox()
+        setFont(self.font_size_spin_box, 13)
+        self.font_size_spin_box.setRange(8, 50)
+        self.font_size_spin_box.setValue(15)
         # 监听数值改变信号
-        # spinBox.valueChanged.connect(lambda value: print("当前值：", value))
-        text_settings_layout.addWidget(spinBox)
+        # self.font_size_spin_box.valueChanged.connect(lambda value: print("当前值：", value))
+        text_settings_layout.addWidget(self.font_size_spin_box)
         text_settings_layout.addSpacing(10)
 
         text_label_4 = CaptionLabel(text=self.tr("颜色"))
         setFont(text_label_4, 13)
         text_label_4.setStyleSheet("color: #888888;")  # 设置为浅灰色
         text_settings_layout.addWidget(text_label_4)
-        select_color = ColorPicker()
-        text_settings_layout.addWidget(select_color)
+        self.select_color = ColorPicker()
+        text_settings_layout.addWidget(self.select_color)
 
         # 图片水印设置界面
         imageSettings = QWidget()
@@ -244,8 +273,10 @@ class WatermarkContentCard(HeaderCardWidget):
         text_label_1.setStyleSheet("color: #888888;")  # 设置为浅灰色
         image_settings_layout.addWidget(text_label_1)
         FileSelectorWidget.format_text_value = self.tr("支持 JPG, PNG 格式")
-        upload_file_selector = FileSelectorWidget()
-        image_settings_layout.addWidget(upload_file_selector)
+        self.watermark_image_path = ""
+        self.upload_file_selector = FileSelectorWidget()
+        self.upload_file_selector.file_selected.connect(self.on_watermark_image_selected)
+        image_settings_layout.addWidget(self.upload_file_selector)
         image_settings_layout.addSpacing(10)
 
         slider_top_layout = QHBoxLayout()
@@ -260,11 +291,11 @@ class WatermarkContentCard(HeaderCardWidget):
         slider_top_layout.addStretch(1)
         slider_top_layout.addWidget(self.slider_value_label)
         image_settings_layout.addLayout(slider_top_layout)
-        slider = Slider(Qt.Horizontal)
-        slider.setRange(0, 100)
-        slider.setValue(20)
-        slider.valueChanged.connect(self.update_value)
-        image_settings_layout.addWidget(slider)
+        self.opacity_slider = Slider(Qt.Horizontal)
+        self.opacity_slider.setRange(0, 100)
+        self.opacity_slider.setValue(20)
+        self.opacity_slider.valueChanged.connect(self.update_value)
+        image_settings_layout.addWidget(self.opacity_slider)
 
         self.addSubInterface(textSettings, 'TextSettings', self.tr("文字"))
         self.addSubInterface(imageSettings, 'ImageSettings', self.tr("图片"))
@@ -297,6 +328,19 @@ class WatermarkContentCard(HeaderCardWidget):
     def update_value(self, val):
         self.slider_value_label.setText(str(val)+"%")
 
+    def on_watermark_image_selected(self, files):
+        self.watermark_image_path = files[0]
+
+    def content_type(self):
+        if self.stackedWidget.currentWidget().objectName() == 'ImageSettings':
+            return ContentType.IMAGE
+        return ContentType.TEXT
+
+    def font_family(self):
+        """返回下拉框显示名对应的真实字体族名"""
+        font_name = self.font_combo.currentText()
+        return self.common_fonts_zh.get(font_name) or self.common_fonts_en.get(font_name, "")
+
     def font_changed(self, font_name):
         if font_name in self.common_fonts_zh.keys():
             text = "你好，世界"
@@ -324,14 +368,16 @@ class WatermarkSettingsCard(HeaderCardWidget):
         setFont(watermark_location_label, 13)
         watermark_location_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
         watermark_location_layout.addWidget(watermark_location_label)
-        watermark_location_combo = ComboBox()
-        watermark_location_combo.addItems([
+        self.watermark_location_combo = ComboBox()
+        self.watermark_location_combo.addItems([
             self.tr("左上"), self.tr("上中"), self.tr("右上"),
             self.tr("左中"), self.tr("居中"), self.tr("右中"),
             self.tr("左下"), self.tr("下中"), self.tr("右下"),
+            self.tr("平铺"),
         ])
-        watermark_location_combo.currentTextChanged.connect(self.watermark_location_changed)
-        watermark_location_layout.addWidget(watermark_location_combo)
+        self.watermark_location_combo.setCurrentIndex(Location.BOTTOM_RIGHT.value)
+        self.watermark_location_combo.currentTextChanged.connect(self.watermark_location_changed)
+        watermark_location_layout.addWidget(self.watermark_location_combo)
         watermark_location_layout.addSpacing(10)
 
         rotation_slider_top_layout = QHBoxLayout()
@@ -345,12 +391,12 @@ class WatermarkSettingsCard(HeaderCardWidget):
         self.slider_rotation_value_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
         rotation_slider_top_layout.addStretch(1)
         rotation_slider_top_layout.addWidget(self.slider_rotation_value_label)
-        slider = Slider(Qt.Horizontal)
-        slider.setRange(-180, 180)
-        slider.setValue(0)
-        slider.valueChanged.connect(self.update_rotation_value)
+        self.rotation_slider = Slider(Qt.Horizontal)
+        self.rotation_slider.setRange(-180, 180)
+        self.rotation_slider.setValue(0)
+        self.rotation_slider.valueChanged.connect(self.update_rotation_value)
         watermark_location_layout.addLayout(rotation_slider_top_layout)
-        watermark_location_layout.addWidget(slider)
+        watermark_location_layout.addWidget(self.rotation_slider)
         watermark_location_layout.addSpacing(10)
 
         zoom_slider_top_layout = QHBoxLayout()
@@ -364,12 +410,12 @@ class WatermarkSettingsCard(HeaderCardWidget):
         self.slider_zoom_value_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
         zoom_slider_top_layout.addStretch(1)
         zoom_slider_top_layout.addWidget(self.slider_zoom_value_label)
-        zoom_slider = Slider(Qt.Horizontal)
-        zoom_slider.setRange(10, 200)
-        zoom_slider.setValue(100)
-        zoom_slider.valueChanged.connect(self.update_zoom_value)
+        self.zoom_slider = Slider(Qt.Horizontal)
+        self.zoom_slider.setRange(10, 200)
+        self.zoom_slider.setValue(100)
+        self.zoom_slider.valueChanged.connect(self.update_zoom_value)
         watermark_location_layout.addLayout(zoom_slider_top_layout)
-        watermark_location_layout.addWidget(zoom_slider)
+        watermark_location_layout.addWidget(self.zoom_slider)
 
         self.viewLayout.addWidget(watermark_location)
 
@@ -411,11 +457,11 @@ class OutputSettingsCard(HeaderCardWidget):
         setFont(output_format_label, 13)
         output_format_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
         output_settings_layout.addWidget(output_format_label)
-        output_format_combo = ComboBox()
-        output_format_combo.addItems([
+        self.output_format_combo = ComboBox()
+        self.output_format_combo.addItems([
             self.tr("保持原格式"), "JPG", "PNG"
         ])
-        output_settings_layout.addWidget(output_format_combo)
+        output_settings_layout.addWidget(self.output_format_combo)
 
         self.viewLayout.addWidget(output_settings)
 
@@ -451,6 +497,8 @@ class GradientHeader(QWidget):
 
 
 class ControlPanelWidget(ScrollArea):
+    settings_changed = Signal()
+
     def __init__(self, parent=None):
         super().__init__(parent=parent)
         view = QWidget(self)
@@ -460,20 +508,20 @@ class ControlPanelWidget(ScrollArea):
         main_layout.setSpacing(10)
         main_layout.setAlignment(Qt.AlignTop)
 
-        fileSelectorCard = FileSelectorCard(self)
-        main_layout.addWidget(fileSelectorCard)
+        self.fileSelectorCard = FileSelectorCard(self)
+        main_layout.addWidget(self.fileSelectorCard)
 
-        watermarkTypeSelectorCard = WatermarkTypeSelectorCard(self)
-        main_layout.addWidget(watermarkTypeSelectorCard)
+        self.watermarkTypeSelectorCard = WatermarkTypeSelectorCard(self)
+        main_layout.addWidget(self.watermarkTypeSelectorCard)
 
-        watermarkContentCard = WatermarkContentCard(self)
-        main_layout.addWidget(watermarkContentCard)
+        self.watermarkContentCard = WatermarkContentCard(self)
+        main_layout.addWidget(self.watermarkContentCard)
 
-        watermarkSettingsCard = WatermarkSettingsCard(self)
-        main_layout.addWidget(watermarkSettingsCard)
+        self.watermarkSettingsCard = WatermarkSettingsCard(self)
+        main_layout.addWidget(self.watermarkSettingsCard)
 
-        outputSettingsCard = OutputSettingsCard(self)
-        main_layout.addWidget(outputSettingsCard)
+        self.outputSettingsCard = OutputSettingsCard(self)
+        main_layout.addWidget(self.outputSettingsCard)
 
         self.setWidget(view)
         self.setViewportMargins(0, 0, 0, 0)
@@ -481,6 +529,45 @@ class ControlPanelWidget(ScrollArea):
         self.enableTransparentBackground()
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
 
+        # 影响预览的控件变化统一转发为 settings_changed
+        content = self.watermarkContentCard
+        settings = self.watermarkSettingsCard
+        for signal in (
+            self.watermarkTypeSelectorCard.type_changed,
+            content.pivot.currentItemChanged,
+            content.text_edit.textChanged,
+            content.font_combo.currentTextChanged,
+            content.font_size_spin_box.valueChanged,
+            content.select_color.color_changed,
+            content.upload_file_selector.file_selected,
+            content.opacity_slider.valueChanged,
+            settings.watermark_location_combo.currentIndexChanged,
+            settings.rotation_slider.valueChanged,
+            settings.zoom_slider.valueChanged,
+        ):
+            signal.connect(self.settings_changed)
+
+    def get_settings(self) -> WatermarkSettings:
+        """收集各卡片的当前参数"""
+        content = self.watermarkContentCard
+        settings = self.watermarkSettingsCard
+        output = self.outputSettingsCard
+        return WatermarkSettings(
+            watermark_type=WatermarkType(self.watermarkTypeSelectorCard.selected_type),
+            content_type=content.content_type(),
+            text=content.text_edit.toPlainText(),
+            font_family=content.font_family(),
+            font_size=content.font_size_spin_box.value(),
+            color=content.select_color.selected_color,
+            image_path=content.watermark_image_path,
+            opacity=content.opacity_slider.value(),
+            location=Location(settings.watermark_location_combo.currentIndex()),
+            rotation=settings.rotation_slider.value(),
+            scale=settings.zoom_slider.value(),
+            output_dir=output.save_location_line_edit.text(),
+            output_format=list(OutputFormat)[output.output_format_combo.currentIndex()],
+        )
+
 
 class HeaderWidget(QWidget):
     def __init__(self, parent=None):
@@ -500,8 +587,8 @@ class HeaderWidget(QWidget):
         header_layout.addWidget(title_label)  
         header_layout.addStretch(1)
 
-        extract_btn = PushButton(text="🔍 提取水印")
-        extract_btn.setStyleSheet("""
+        self.extract_btn = PushButton(text="🔍 提取水印")
+        self.extract_btn.setStyleSheet("""
             PushButton {
                 background-color: rgba(255, 255, 255, 0.2);
                 color: white;
@@ -517,10 +604,10 @@ class HeaderWidget(QWidget):
                 background-color: rgba(255, 255, 255, 0.15);
             }                     
         """)
-        header_layout.addWidget(extract_btn)
+        header_layout.addWidget(self.extract_btn)
 
-        process_btn = PushButton(text="▶️ 开始处理")
-        process_btn.setStyleSheet("""
+        self.process_btn = PushButton(text="▶️ 开始处理")
+        self.process_btn.setStyleSheet("""
             PushButton {
                 background-color: white;
                 color: #667eea;
@@ -536,7 +623,7 @@ class HeaderWidget(QWidget):
                 background-color: #5a67d8;
             }
         """)
-        header_layout.addWidget(process_btn)
+        header_layout.addWidget(self.process_btn)
 
         main_layout = QVBoxLayout(self)
         main_layout.setContentsMargins(0, 0, 0, 0)
@@ -553,13 +640,13 @@ class PreviewWidget(QWidget):
         main_layout.setContentsMargins(0, 0, 0, 0)
         main_layout.setSpacing(0)
 
-        preview_widget = SyncImageViewer(img1="", img2="")
-        # preview_widget = SyncVideoViewer(self)
-        main_layout.addWidget(preview_widget)
+        self.preview_widget = SyncImageViewer(img1="", img2="")
+        # self.preview_widget = SyncVideoViewer(self)
+        main_layout.addWidget(self.preview_widget)
 
         # 底部状态栏
-        status_info_widget = StatusInfoWidget(self)
-        main_layout.addWidget(status_info_widget)
+        self.status_info_widget = StatusInfoWidget(self)
+        main_layout.addWidget(self.status_info_widget)
 
     
 class WatermarkAdd(QWidget):
@@ -571,19 +658,138 @@ class WatermarkAdd(QWidget):
         main_Layout.setContentsMargins(0, 0, 0, 0)
         main_Layout.setSpacing(0)
 
-        header = HeaderWidget(self)
-        main_Layout.addWidget(header, 0, Qt.AlignTop)
+        self.engine = None
+        self.video_pipeline = None
+        self.video_queue = []
+
+        self.header = HeaderWidget(self)
+        main_Layout.addWidget(self.header, 0, Qt.AlignTop)
 
         view_layout = QHBoxLayout()
         view_layout.setContentsMargins(0, 0, 0, 0)
         view_layout.setSpacing(0)
 
         # 左侧控制面板
-        control_panel_widget = ControlPanelWidget(self)
-        view_layout.addWidget(control_panel_widget, 3)
+        self.control_panel_widget = ControlPanelWidget(self)
+        view_layout.addWidget(self.control_panel_widget, 3)
 
         # 右侧预览
-        right_content = PreviewWidget(self)
-        view_layout.addWidget(right_content, 7)
+        self.right_content = PreviewWidget(self)
+        view_layout.addWidget(self.right_content, 7)
 
         main_Layout.addLayout(view_layout)
+
+        # 实时预览: 在缩小的代理图上重绘水印
+        self.preview_renderer = PreviewRenderer(self)
+        self.preview_renderer.sourceReady.connect(
+            lambda image: self.right_content.preview_widget.view1.set_pixmap(QPixmap.fromImage(image)))
+        self.preview_renderer.previewReady.connect(
+            lambda image: self.right_content.preview_widget.view2.set_pixmap(QPixmap.fromImage(image)))
+        self.control_panel_widget.settings_changed.connect(self.update_preview)
+        self.control_panel_widget.fileSelectorCard.singleFileSelector.file_selected.connect(self.update_preview)
+
+        self.header.process_btn.clicked.connect(self.start_processing)
+        self.header.extract_btn.clicked.connect(self.start_extracting)
+
+    def update_preview(self):
+        files = self.control_panel_widget.fileSelectorCard.selected_files
+        images = [path for path in files if path.lower().endswith(IMAGE_EXTENSIONS)]
+        if images:
+            self.preview_renderer.request(images[0], self.control_panel_widget.get_settings())
+
+    def is_busy(self):
+        if (self.engine and self.engine.isRunning()) or self.video_pipeline:
+            InfoBar.warning(self.tr("正在处理"), self.tr("请等待当前任务完成"), duration=2000, parent=self)
+            return True
+        return False
+
+    def start_processing(self):
+        if self.is_busy():
+            return
+
+        settings = self.control_panel_widget.get_settings()
+        files, dirs = self.control_panel_widget.fileSelectorCard.selected_sources()
+        jobs = collect_jobs(files, dirs, settings)
+        videos = collect_video_jobs(files, settings)
+        if not jobs and not videos:
+            InfoBar.warning(self.tr("没有可处理的文件"), self.tr("请先选择图片文件或目录"), duration=2000, parent=self)
+            return
+
+        layer = None
+        if settings.watermark_type == WatermarkType.VISIBLE:
+            try:
+                layer = render_layer(settings)
+            except OSError as e:
+                InfoBar.error(self.tr("水印图片读取失败"), str(e), duration=3000, parent=self)
+                return
+
+        # 视频在图片批处理结束后逐个处理
+        self.video_queue = [(job.src, job.dst) for job in videos]
+        self.video_settings, self.video_layer = settings, layer
+
+        status = self.right_content.status_info_widget
+        status.reset(len(jobs), len(self.video_queue))
+        if not jobs:
+            self.start_next_video()
+            return
+
+        self.engine = BatchWatermarkEngine(jobs, settings, layer, parent=self)
+        self.engine.progressChanged.connect(status.set_progress)
+        self.engine.jobFailed.connect(status.add_failure)
+        self.engine.finished.connect(self.start_next_video)
+        self.engine.start()
+
+    def start_next_video(self):
+        if not self.video_queue:
+            return
+
+        src, dst = self.video_queue.pop(0)
+
+        # 视频按文件计入统计, 帧进度显示在速度标签中
+        pipeline = VideoWatermarkPipeline(src, dst, self.video_settings, self.video_layer, parent=self)
+        self.right_content.status_info_widget.track_video(pipeline, os.path.basename(src))
+        pipeline.finished.connect(self.on_video_finished)
+        self.video_pipeline = pipeline
+        pipeline.start()
+
+    def on_video_finished(self):
+        self.video_pipeline.deleteLater()
+        self.video_pipeline = None
+        self.start_next_video()
+
+    def start_extracting(self):
+        if self.is_busy():
+            return
+
+        settings = self.control_panel_widget.get_settings()
+        files, dirs = self.control_panel_widget.fileSelectorCard.selected_sources()
+        paths = collect_images(files, dirs)
+        if not paths:
+            InfoBar.warning(self.tr("没有可处理的文件"), self.tr("请先选择图片文件或目录"), duration=2000, parent=self)
+            return
+
+        # 目录模式把结果写入 JSONL 报告, 单文件模式直接提示提取结果
+        report_path = None
+        if dirs:
+            report_path = os.path.join(settings.output_dir or dirs[0], REPORT_NAME)
+
+        status = self.right_content.status_info_widget
+        status.reset(len(paths))
+
+        self.engine = BatchExtractEngine(paths, settings.blind_key, settings.blind_strength,
+                                         settings.blind_block, report_path, parent=self)
+        self.engine.progressChanged.connect(status.set_progress)
+        self.engine.jobFailed.connect(status.add_failure)
+        if report_path:
+            self.engine.finished.connect(lambda: InfoBar.success(
+                self.tr("提取完成"), self.tr("结果已保存到 ") + report_path, duration=3000, parent=self))
+        else:
+            self.engine.resultReady.connect(self.on_extract_result)
+        self.engine.start()
+
+    def on_extract_result(self, path, text, confidence):
+        title = os.path.basename(path)
+        if text:
+            InfoBar.success(title, self.tr("水印内容: ") + f"{text} ({confidence:.0%})", duration=5000, parent=self)
+        else:
+            InfoBar.info(title, self.tr("未检测到盲水印") + f" ({confidence:.0%})", duration=5000, parent=self)
@@ -1,17 +1,447 @@
-from PySide6.QtCore import Qt
-from PySide6.QtWidgets import QHBoxLayout, QFrame
+import os
 
-from app.ui.library.qfluentwidgets import SubtitleLabel, setFont
+import numpy as np
+from PySide6.QtCore import Qt, QUrl
+from PySide6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QStackedWidget
+from PySide6.QtGui import QFont, QPixmap, QPainter
 
+from app.ui.library.qfluentwidgets import (
+    ScrollArea, HeaderCardWidget, setFont, PushButton, CaptionLabel, ComboBox, Slider, InfoBar
+)
 
-class WatermarkRemove(QFrame):
+from app.ui.widgets.file_selector_widget import FileSelectorWidget
+from app.ui.widgets.video_preview_widget import SyncVideoViewer
+from app.ui.view.watermark_add import FileSelectorCard, OutputSettingsCard, GradientHeader, PreviewWidget
+
+from core.watermark.settings import WatermarkSettings, OutputFormat, IMAGE_EXTENSIONS
+from core.watermark.engine import collect_jobs, collect_video_jobs
+from core.watermark.preview import load_proxy, array_to_qimage
+from core.removal.inpaint import InpaintMethod
+from core.removal.engine import BatchRemovalEngine
+from core.removal.estimate import MaskEstimationEngine
+from core.removal.incremental import IncrementalInpainter, MaskInpaintUpdater
+from core.removal.video import VideoRemovalPipeline
+
+
+class RemovalSettingsCard(HeaderCardWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTitle(self.tr("🎯 水印区域"))
+        self.setBorderRadius(8)
+        self.viewLayout.setContentsMargins(10, 10, 10, 10)
+
+        removal_settings = QWidget()
+        removal_settings_layout = QVBoxLayout(removal_settings)
+        removal_settings_layout.setAlignment(Qt.AlignmentFlag.AlignTop)
+        removal_settings_layout.setContentsMargins(0, 0, 0, 0)
+        removal_settings_layout.setSpacing(8)
+
+        locate_label = CaptionLabel(text=self.tr("定位方式"))
+        setFont(locate_label, 13)
+        locate_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        removal_settings_layout.addWidget(locate_label)
+        self.locate_combo = ComboBox()
+        self.locate_combo.addItems([self.tr("模板匹配"), self.tr("多图估计"), self.tr("手动涂抹")])
+        self.locate_combo.currentIndexChanged.connect(self.on_locate_changed)
+        removal_settings_layout.addWidget(self.locate_combo)
+        removal_settings_layout.addSpacing(10)
+
+        # 多图估计从整批图片中统计出共有的水印, 不需要模板
+        self.template_widget = QWidget()
+        template_layout = QVBoxLayout(self.template_widget)
+        template_layout.setContentsMargins(0, 0, 0, 0)
+        template_layout.setSpacing(8)
+        template_label = CaptionLabel(text=self.tr("水印模板"))
+        setFont(template_label, 13)
+        template_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        template_layout.addWidget(template_label)
+        self.template_path = ""
+        self.template_selector = FileSelectorWidget()
+        self.template_selector.file_selected.connect(self.on_template_selected)
+        template_layout.addWidget(self.template_selector)
+        template_layout.addSpacing(10)
+        removal_settings_layout.addWidget(self.template_widget)
+
+        # 手动涂抹在预览的原图上画出水印区域, 下方实时显示修复结果
+        self.brush_widget = QWidget()
+        brush_layout = QVBoxLayout(self.brush_widget)
+        brush_layout.setContentsMargins(0, 0, 0, 0)
+        brush_layout.setSpacing(8)
+        brush_top_layout = QHBoxLayout()
+        brush_label = CaptionLabel(text=self.tr("画笔大小"))
+        setFont(brush_label, 13)
+        brush_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        brush_top_layout.addWidget(brush_label)
+        self.brush_value_label = QLabel("12")
+        setFont(self.brush_value_label, 13)
+        self.brush_value_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        brush_top_layout.addStretch(1)
+        brush_top_layout.addWidget(self.brush_value_label)
+        brush_layout.addLayout(brush_top_layout)
+        self.brush_slider = Slider(Qt.Horizontal)
+        self.brush_slider.setRange(2, 60)
+        self.brush_slider.setValue(12)
+        self.brush_slider.valueChanged.connect(lambda value: self.brush_value_label.setText(str(value)))
+        brush_layout.addWidget(self.brush_slider)
+        self.clear_brush_btn = PushButton(text=self.tr("清除涂抹"))
+        brush_layout.addWidget(self.clear_brush_btn)
+        brush_layout.addSpacing(10)
+        self.brush_widget.setVisible(False)
+        removal_settings_layout.addWidget(self.brush_widget)
+
+        method_label = CaptionLabel(text=self.tr("修复方式"))
+        setFont(method_label, 13)
+        method_label.setStyleSheet("color: #888888;")  # 设置为浅灰色
+        removal_settings_layout.addWidget(method_label)
+        self.method_combo = ComboBox()
+        self.method_combo.addItems([self.tr("快速修复"), self.tr("纹理修复")])
+        removal_settings_layout.addWidget(self.method_combo)
+
+        self.viewLayout.addWidget(removal_settings)
+
+    def on_locate_changed(self, index):
+        self.template_widget.setVisible(index == 0)
+        self.brush_widget.setVisible(self.use_brush())
+
+    def on_template_selected(self, files):
+        self.template_path = files[0]
+
+    def use_estimate(self) -> bool:
+        return self.locate_combo.currentIndex() == 1
+
+    def use_brush(self) -> bool:
+        return self.locate_combo.currentIndex() == 2
+
+    def method(self) -> InpaintMethod:
+        return list(InpaintMethod)[self.method_combo.currentIndex()]
+
+
+class ControlPanelWidget(ScrollArea):
     def __init__(self, parent=None):
         super().__init__(parent=parent)
-        text = "WatermarkRemove"
-        self.label = SubtitleLabel(text, self)
-        self.hBoxLayout = QHBoxLayout(self)
-
-        setFont(self.label, 24)
-        self.label.setAlignment(Qt.AlignCenter)
-        self.hBoxLayout.addWidget(self.label, 1, Qt.AlignCenter)
-        self.setObjectName(text.replace(' ', '-'))
\ No newline at end of file
+        view = QWidget(self)
+        view.setObjectName('controlPanel')
+        main_layout = QVBoxLayout(view)
+        main_layout.setContentsMargins(0, 0, 12, 0)
+        main_layout.setSpacing(10)
+        main_layout.setAlignment(Qt.AlignTop)
+
+        self.fileSelectorCard = FileSelectorCard(self)
+        main_layout.addWidget(self.fileSelectorCard)
+
+        self.removalSettingsCard = RemovalSettingsCard(self)
+        main_layout.addWidget(self.removalSettingsCard)
+
+        self.outputSettingsCard = OutputSettingsCard(self)
+        main_layout.addWidget(self.outputSettingsCard)
+
+        self.setWidget(view)
+        self.setViewportMargins(0, 0, 0, 0)
+        self.setWidgetResizable(True)
+        self.enableTransparentBackground()
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+
+    def get_settings(self) -> WatermarkSettings:
+        """输出路径和格式沿用加水印的设置"""
+        output = self.outputSettingsCard
+        return WatermarkSettings(
+            output_dir=output.save_location_line_edit.text(),
+            output_format=list(OutputFormat)[output.output_format_combo.currentIndex()],
+        )
+
+
+class HeaderWidget(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        header = GradientHeader(parent=self)
+        header_layout = QHBoxLayout(header)
+        header_layout.setContentsMargins(30, 20, 30, 20)
+        header_layout.setSpacing(10)
+
+        title_label = QLabel("🧹 水印去除工具")
+        setFont(title_label, fontSize=24, weight=QFont.DemiBold)
+        title_label.setStyleSheet("""
+            QLabel {
+                color: white;
+            }
+        """)
+        header_layout.addWidget(title_label)
+        header_layout.addStretch(1)
+
+        self.process_btn = PushButton(text="▶️ 开始处理")
+        self.process_btn.setStyleSheet("""
+            PushButton {
+                background-color: white;
+                color: #667eea;
+                padding: 8px 16px;
+                border-radius: 8px;
+                font-size: 14px;
+                font-weight: 500;
+            }
+            PushButton:hover {
+                background-color: #f8f9fa;
+            }
+            PushButton:pressed {
+                background-color: #5a67d8;
+            }
+        """)
+        header_layout.addWidget(self.process_btn)
+
+        main_layout = QVBoxLayout(self)
+        main_layout.setContentsMargins(0, 0, 0, 0)
+        main_layout.setSpacing(0)
+        main_layout.addWidget(header)
+
+
+class RemovalPreviewWidget(PreviewWidget):
+    """图片对比预览, 处理完视频后切换为视频对比; 视频播放器在第一次使用时创建"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.video_widget = None
+        self.stacked_widget = QStackedWidget(self)
+        layout = self.layout()
+        layout.removeWidget(self.preview_widget)
+        self.stacked_widget.addWidget(self.preview_widget)
+        layout.insertWidget(0, self.stacked_widget)
+
+    def show_images(self):
+        self.stacked_widget.setCurrentWidget(self.preview_widget)
+
+    def show_video(self, src, dst):
+        if self.video_widget is None:
+            self.video_widget = SyncVideoViewer(self)
+            self.stacked_widget.addWidget(self.video_widget)
+        self.video_widget.setVideos(QUrl.fromLocalFile(src), QUrl.fromLocalFile(dst))
+        self.stacked_widget.setCurrentWidget(self.video_widget)
+
+
+class WatermarkRemove(QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setObjectName("WatermarkRemove")
+
+        main_Layout = QVBoxLayout(self)
+        main_Layout.setContentsMargins(0, 0, 0, 0)
+        main_Layout.setSpacing(0)
+
+        self.engine = None
+        self.jobs = []
+        self.estimate = None
+        self.preview_job = None
+        self.video_pipeline = None
+        self.video_queue = []
+        self.inpainter = None
+        self.mask_updater = None
+
+        self.header = HeaderWidget(self)
+        main_Layout.addWidget(self.header, 0, Qt.AlignTop)
+
+        view_layout = QHBoxLayout()
+        view_layout.setContentsMargins(0, 0, 0, 0)
+        view_layout.setSpacing(0)
+
+        # 左侧控制面板
+        self.control_panel_widget = ControlPanelWidget(self)
+        view_layout.addWidget(self.control_panel_widget, 3)
+
+        # 右侧预览
+        self.right_content = RemovalPreviewWidget(self)
+        view_layout.addWidget(self.right_content, 7)
+
+        main_Layout.addLayout(view_layout)
+
+        removal = self.control_panel_widget.removalSettingsCard
+        preview = self.right_content.preview_widget
+        self.control_panel_widget.fileSelectorCard.singleFileSelector.file_selected.connect(self.update_preview)
+        removal.locate_combo.currentIndexChanged.connect(self.update_preview)
+        removal.method_combo.currentIndexChanged.connect(self.on_method_changed)
+        removal.brush_slider.valueChanged.connect(self.on_brush_changed)
+        removal.clear_brush_btn.clicked.connect(self.clear_brush)
+        preview.view1.brushStroke.connect(self.on_brush_stroke)
+        preview.view1.brushReleased.connect(self.on_brush_released)
+        self.header.process_btn.clicked.connect(self.start_processing)
+
+    def update_preview(self):
+        files = self.control_panel_widget.fileSelectorCard.selected_files
+        images = [path for path in files if path.lower().endswith(IMAGE_EXTENSIONS)]
+        if not images:
+            return
+        self.right_content.show_images()
+        if self.control_panel_widget.removalSettingsCard.use_brush():
+            self.setup_brush(images[0])
+        else:
+            self.close_brush()
+            self.right_content.preview_widget.view1.set_pixmap(QPixmap(images[0]))
+
+    def setup_brush(self, path):
+        """ 在预览代理图上涂抹, 掩码按比例缩放后用于整批图片 """
+        self.close_brush()
+        proxy, _ = load_proxy(path, os.path.getmtime(path))
+        removal = self.control_panel_widget.removalSettingsCard
+        self.inpainter = IncrementalInpainter(proxy, removal.method())
+        self.mask_updater = MaskInpaintUpdater(self.inpainter, self)
+        self.mask_updater.patchReady.connect(self.on_patch_ready)
+
+        preview = self.right_content.preview_widget
+        pixmap = QPixmap.fromImage(array_to_qimage(proxy))
+        preview.view1.set_pixmap(pixmap)
+        preview.view1.clear_overlay()
+        preview.view1.set_brush_radius(removal.brush_slider.value())
+        preview.view2.set_pixmap(pixmap)
+
+    def close_brush(self):
+        self.right_content.preview_widget.view1.set_brush_radius(0)
+        self.right_content.preview_widget.view1.clear_overlay()
+        if self.mask_updater:
+            self.mask_updater.close()
+        self.inpainter = None
+        self.mask_updater = None
+
+    def clear_brush(self):
+        if not self.inpainter:
+            return
+        self.inpainter.clear()
+        preview = self.right_content.preview_widget
+        preview.view1.clear_overlay()
+        preview.view2.set_pixmap(QPixmap.fromImage(array_to_qimage(self.inpainter.result)))
+
+    def on_brush_changed(self, value):
+        if self.inpainter:
+            self.right_content.preview_widget.view1.set_brush_radius(value)
+
+    def on_method_changed(self):
+        # 已有的涂抹区域按新的修复方式重新预览
+        if self.inpainter:
+            self.inpainter.method = self.control_panel_widget.removalSettingsCard.method()
+            height, width = self.inpainter.mask.shape
+            if self.inpainter.mask.any():
+                self.mask_updater.update((0, 0, width, height))
+
+    def on_brush_stroke(self, p0, p1):
+        if self.mask_updater:
+            radius = self.control_panel_widget.removalSettingsCard.brush_slider.value()
+            self.mask_updater.paint((p0.x(), p0.y()), (p1.x(), p1.y()), radius)
+
+    def on_brush_released(self):
+        if self.mask_updater:
+            self.mask_updater.end_stroke()
+
+    def on_patch_ready(self, x, y, width, height):
+        # 只把更新区域画回下方预览的位图, 其余像素不动
+        item = self.right_content.preview_widget.view2.pixmap_item
+        if item is None:
+            return
+        pixmap = item.pixmap()
+        patch = np.ascontiguousarray(self.inpainter.result[y:y + height, x:x + width])
+        painter = QPainter(pixmap)
+        painter.drawImage(x, y, array_to_qimage(patch))
+        painter.end()
+        item.setPixmap(pixmap)
+
+    def is_busy(self):
+        if (self.engine and self.engine.isRunning()) or self.video_pipeline:
+            InfoBar.warning(self.tr("正在处理"), self.tr("请等待当前任务完成"), duration=2000, parent=self)
+            return True
+        return False
+
+    def start_processing(self):
+        if self.is_busy():
+            return
+
+        settings = self.control_panel_widget.get_settings()
+        files, dirs = self.control_panel_widget.fileSelectorCard.selected_sources()
+        jobs = collect_jobs(files, dirs, settings)
+        videos = collect_video_jobs(files, settings)
+        if not jobs and not videos:
+            InfoBar.warning(self.tr("没有可处理的文件"), self.tr("请先选择图片文件或目录"), duration=2000, parent=self)
+            return
+
+        removal = self.control_panel_widget.removalSettingsCard
+        if removal.use_brush():
+            if not self.inpainter or not self.inpainter.mask.any():
+                InfoBar.warning(self.tr("没有水印区域"), self.tr("请先在原图预览上涂抹水印区域"), duration=2000, parent=self)
+                return
+        elif (videos or not removal.use_estimate()) and not removal.template_path:
+            InfoBar.warning(self.tr("没有水印模板"), self.tr("请先选择水印模板图片"), duration=2000, parent=self)
+            return
+
+        # 视频在图片处理结束后逐个处理
+        self.video_queue = [(job.src, job.dst) for job in videos]
+
+        self.jobs = jobs
+        self.preview_job = jobs[0] if jobs else None
+        status = self.right_content.status_info_widget
+        status.reset(len(jobs), len(self.video_queue))
+
+        if not jobs:
+            self.start_next_video()
+        elif removal.use_brush():
+            self.start_removal(mask=self.inpainter.mask.copy())
+        elif removal.use_estimate():
+            # 先流式统计整批图片估计水印的透明度和颜色, 再逐张反向混合
+            self.engine = MaskEstimationEngine([job.src for job in jobs], parent=self)
+            self.engine.progressChanged.connect(status.set_progress)
+            self.engine.jobFailed.connect(status.add_failure)
+            self.engine.estimateReady.connect(self.on_estimate_ready)
+            self.engine.finished.connect(self.on_estimate_finished)
+            self.estimate = None
+            self.engine.start()
+        else:
+            # 每张图片先用模板定位水印再修复
+            self.start_removal(template_path=removal.template_path)
+
+    def start_removal(self, **kwargs):
+        status = self.right_content.status_info_widget
+        status.reset(len(self.jobs), len(self.video_queue))
+        self.engine = BatchRemovalEngine(self.jobs, method=self.control_panel_widget.removalSettingsCard.method(),
+                                         parent=self, **kwargs)
+        self.engine.progressChanged.connect(status.set_progress)
+        self.engine.jobFailed.connect(status.add_failure)
+        self.engine.finished.connect(self.on_finished)
+        self.engine.start()
+
+    def on_estimate_ready(self, estimate):
+        self.estimate = estimate
+
+    def on_estimate_finished(self):
+        # estimateReady 和 finished 来自同一线程, 按发出顺序到达
+        if self.estimate is None or not self.estimate.mask.any():
+            InfoBar.warning(self.tr("未检测到水印"), self.tr("多图估计至少需要两张带有相同水印的图片"),
+                            duration=3000, parent=self)
+            self.start_next_video()
+            return
+        self.start_removal(overlay=self.estimate)
+
+    def on_finished(self):
+        # 处理完成后在下方预览第一张图片的修复结果, 涂抹模式下预览已经是修复结果
+        job = self.preview_job
+        if job and os.path.exists(job.dst) and not self.inpainter:
+            preview = self.right_content.preview_widget
+            preview.view1.set_pixmap(QPixmap(job.src))
+            preview.view2.set_pixmap(QPixmap(job.dst))
+        self.start_next_video()
+
+    def start_next_video(self):
+        if not self.video_queue:
+            return
+
+        src, dst = self.video_queue.pop(0)
+        removal = self.control_panel_widget.removalSettingsCard
+
+        # 视频按文件计入统计, 帧进度和处理速度显示在速度标签中
+        if removal.use_brush() and self.inpainter:
+            region = dict(mask=self.inpainter.mask.copy())
+        else:
+            region = dict(template_path=removal.template_path)
+        pipeline = VideoRemovalPipeline(src, dst, method=removal.method(), parent=self, **region)
+        self.right_content.status_info_widget.track_video(pipeline, os.path.basename(src))
+        pipeline.finished.connect(lambda reason: self.on_video_finished(src, dst, reason))
+        self.video_pipeline = pipeline
+        pipeline.start()
+
+    def on_video_finished(self, src, dst, reason):
+        if not reason:
+            self.right_content.show_video(src, dst)
+        self.video_pipeline.deleteLater()
+        self.video_pipeline = None
+        self.start_next_video()
@@ -1,6 +1,6 @@
-from PySide6.QtCore import Signal, Qt, QTimer, QRect, Property, QEasingCurve, QPropertyAnimation
-from PySide6.QtWidgets import QGraphicsView, QWidget , QVBoxLayout, QGraphicsScene, QGraphicsPixmapItem, QGraphicsTextItem, QScrollBar
-from PySide6.QtGui import QPixmap, QWheelEvent, QColor, QPainter, QBrush
+from PySide6.QtCore import Signal, Qt, QTimer, QRect, QRectF, QPointF, Property, QEasingCurve, QPropertyAnimation
+from PySide6.QtWidgets import QGraphicsView, QWidget , QVBoxLayout, QGraphicsScene, QGraphicsItem, QGraphicsPixmapItem, QGraphicsTextItem, QGraphicsPathItem, QScrollBar
+from PySide6.QtGui import QPixmap, QWheelEvent, QColor, QPainter, QBrush, QPen, QPainterPath
 from app.ui.library.qfluentwidgets import setFont, qconfig, Theme 
 
 
@@ -138,6 +138,8 @@ class ScrollBar(QScrollBar):
 class SyncGraphicsView(QGraphicsView):
     zoomChanged = Signal(float)
     scrollChanged = Signal(int, int)
+    brushStroke = Signal(QPointF, QPointF)  # 画笔模式下一段笔画的起点和终点 (场景坐标)
+    brushReleased = Signal()
 
     def __init__(self, pixmap: QPixmap = None, parent=None, sub_title: str = ""):
         super().__init__(parent)
@@ -162,6 +164,10 @@ class SyncGraphicsView(QGraphicsView):
         self.pixmap_item = None
         self.placeholder = None
         self.sub_title = sub_title
+        self.brush_radius = 0
+        self._brush_item = None
+        self._brush_path = None
+        self._last_point = None
 
         self._init_placeholder()
         if pixmap and not pixmap.isNull():
@@ -218,7 +224,16 @@ class SyncGraphicsView(QGraphicsView):
         self._center_placeholder()
 
     def set_pixmap(self, pixmap: QPixmap):
+        # 尺寸不变时只替换像素, 保留当前的缩放和滚动位置
+        if self.pixmap_item and pixmap and not pixmap.isNull() \
+                and pixmap.size() == self.pixmap_item.pixmap().size():
+            self.pixmap_item.setPixmap(pixmap)
+            return
+
         self.scene.clear()
+        self.pixmap_item = None
+        self._brush_item = None
+        self._last_point = None
         if pixmap and not pixmap.isNull():
             self.pixmap_item = QGraphicsPixmapItem(pixmap)
             self.scene.addItem(self.pixmap_item)
@@ -226,6 +241,58 @@ class SyncGraphicsView(QGraphicsView):
         else:
             self._init_placeholder()
 
+    def set_item(self, item: QGraphicsItem):
+        """ 显示自绘的图形项 (如超长的拼接截图), 场景范围随图形项自动增长 """
+        self.scene.clear()
+        self.pixmap_item = None
+        self._brush_item = None
+        self._last_point = None
+        self.scene.addItem(item)
+        self.scene.setSceneRect(QRectF())
+
+    def set_brush_radius(self, radius: float):
+        """ 半径大于 0 时左键拖动在图片上涂抹, 否则恢复拖动浏览 """
+        self.brush_radius = radius
+        self.setDragMode(QGraphicsView.NoDrag if radius > 0 else QGraphicsView.ScrollHandDrag)
+
+    def clear_overlay(self):
+        for item in self.scene.items():
+            if isinstance(item, QGraphicsPathItem):
+                self.scene.removeItem(item)
+        self._brush_item = None
+
+    def mousePressEvent(self, event):
+        if self.brush_radius <= 0 or self.pixmap_item is None or event.button() != Qt.LeftButton:
+            super().mousePressEvent(event)
+            return
+        point = self.mapToScene(event.position().toPoint())
+        # 每一笔一个半透明的路径项, 笔宽即涂抹的直径
+        self._brush_path = QPainterPath(point)
+        self._brush_path.lineTo(point)
+        self._brush_item = QGraphicsPathItem(self._brush_path)
+        self._brush_item.setPen(QPen(QColor(255, 0, 0, 110), self.brush_radius * 2,
+                                     Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
+        self.scene.addItem(self._brush_item)
+        self._last_point = point
+        self.brushStroke.emit(point, point)
+
+    def mouseMoveEvent(self, event):
+        if self._last_point is None:
+            super().mouseMoveEvent(event)
+            return
+        point = self.mapToScene(event.position().toPoint())
+        self._brush_path.lineTo(point)
+        self._brush_item.setPath(self._brush_path)
+        self.brushStroke.emit(self._last_point, point)
+        self._last_point = point
+
+    def mouseReleaseEvent(self, event):
+        if self._last_point is None:
+            super().mouseReleaseEvent(event)
+            return
+        self._last_point = None
+        self.brushReleased.emit()
+
     def wheelEvent(self, event: QWheelEvent):
         zoom_factor = 1.25 if event.angleDelta().y() > 0 else 0.8
         old_zoom = self._zoom
@@ -0,0 +1,192 @@
+from PySide6.QtCore import Qt, Signal, QRect, QPoint
+from PySide6.QtGui import QPainter, QPixmap, QImage, QColor, QPen, QRegion, QFont
+from PySide6.QtWidgets import QWidget
+
+from core.watermark.render import qimage_view
+
+
+DIM_ALPHA = 120                 # 选区外变暗的程度
+BORDER_WIDTH = 2                # 选区边框宽度, 重绘时按该宽度外扩
+MAGNIFIER_SOURCE = 15           # 放大镜取样的边长 (像素), 取奇数使光标位于中心
+MAGNIFIER_SCALE = 8             # 放大倍数
+MAGNIFIER_OFFSET = 20           # 放大镜与光标的距离
+READOUT_HEIGHT = 40             # 放大镜下方坐标和颜色读数的高度
+LABEL_SIZE = (120, 24)          # 选区尺寸标签的大小
+
+
+class SelectionOverlay(QWidget):
+    """ 在冻结的全屏画面上框选区域
+
+    画面在显示前上传一次为位图, 选区外的变暗背景也预先画好. 鼠标移动时只计算选区边框、
+    十字线、尺寸标签和放大镜在移动前后的矩形, 选区本身只重绘前后两次选区的差集;
+    绘制时按重绘区域中的每个矩形从两张位图中复制对应部分. 放大镜直接从内存中的画面取样,
+    不读取屏幕.
+    """
+
+    regionSelected = Signal(QRect)      # 冻结画面中的像素坐标
+    cancelled = Signal()
+
+    def __init__(self, frame: QImage, geometry: QRect, parent=None):
+        super().__init__(parent, Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.setAttribute(Qt.WA_OpaquePaintEvent)
+        self.setMouseTracking(True)
+        self.setCursor(Qt.CrossCursor)
+        self.setGeometry(geometry)
+
+        # 画面为设备像素, 窗口坐标为逻辑像素
+        self.frame = frame.convertToFormat(QImage.Format_RGB32)
+        self.pixels = qimage_view(self.frame)
+        self.ratio = self.frame.width() / geometry.width()
+        self.pixmap = QPixmap.fromImage(self.frame)
+        dimmed = self.frame.copy()
+        painter = QPainter(dimmed)
+        painter.fillRect(dimmed.rect(), QColor(0, 0, 0, DIM_ALPHA))
+        painter.end()
+        self.dimmed = QPixmap.fromImage(dimmed)
+
+        self.origin = None
+        self.selection = QRect()
+        self.cursor_pos = QPoint(-1, -1)
+        self.readout_font = QFont(self.font())
+        self.readout_font.setPixelSize(12)
+
+    def _source(self, rect: QRect) -> QRect:
+        """ 窗口矩形对应的画面矩形 """
+        r = self.ratio
+        return QRect(round(rect.x() * r), round(rect.y() * r), round(rect.width() * r), round(rect.height() * r))
+
+    def _border_region(self, rect: QRect) -> QRegion:
+        if rect.isEmpty():
+            return QRegion()
+        b = BORDER_WIDTH
+        return QRegion(rect.adjusted(-b, -b, b, b)).subtracted(QRegion(rect.adjusted(b, b, -b, -b)))
+
+    def _label_rect(self) -> QRect:
+        width, height = LABEL_SIZE
+        top = self.selection.top() - height - 4
+        return QRect(self.selection.left(), top if top >= 0 else self.selection.top() + 4, width, height)
+
+    def _magnifier_rect(self) -> QRect:
+        size = MAGNIFIER_SOURCE * MAGNIFIER_SCALE
+        x, y = self.cursor_pos.x() + MAGNIFIER_OFFSET, self.cursor_pos.y() + MAGNIFIER_OFFSET
+        # 靠近屏幕右侧或底部时放到光标的另一侧
+        if x + size > self.width():
+            x = self.cursor_pos.x() - MAGNIFIER_OFFSET - size
+        if y + size + READOUT_HEIGHT > self.height():
+            y = self.cursor_pos.y() - MAGNIFIER_OFFSET - size - READOUT_HEIGHT
+        return QRect(x, y, size, size + READOUT_HEIGHT)
+
+    def _decorations(self) -> QRegion:
+        """ 当前状态下画在画面之上的所有元素覆盖的区域 """
+        region = self._border_region(self.selection)
+        if not self.selection.isEmpty():
+            region += self._label_rect()
+        if self.rect().contains(self.cursor_pos):
+            x, y = self.cursor_pos.x(), self.cursor_pos.y()
+            region += QRect(0, y, self.width(), 1)
+            region += QRect(x, 0, 1, self.height())
+            region += self._magnifier_rect().adjusted(-1, -1, 1, 1)
+        return region
+
+    def _move_to(self, pos: QPoint, selection: QRect):
+        dirty = self._decorations() + QRegion(self.selection).xored(QRegion(selection))
+        self.cursor_pos = pos
+        self.selection = selection
+        self.update(dirty + self._decorations())
+
+    def mousePressEvent(self, event):
+        pos = event.position().toPoint()
+        if event.button() == Qt.LeftButton:
+            self.origin = pos
+            self._move_to(pos, QRect())
+        elif event.button() == Qt.RightButton:
+            # 右键先取消当前选区, 没有选区时退出
+            if self.selection.isEmpty():
+                self.cancel()
+            else:
+                self.origin = None
+                self._move_to(pos, QRect())
+
+    def mouseMoveEvent(self, event):
+        pos = event.position().toPoint()
+        selection = QRect(self.origin, pos).normalized() if self.origin is not None else self.selection
+        self._move_to(pos, selection)
+
+    def mouseReleaseEvent(self, event):
+        if event.button() != Qt.LeftButton or self.origin is None:
+            return
+        self.origin = None
+        if self.selection.width() > 1 and self.selection.height() > 1:
+            self.accept()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.cancel()
+        elif event.key() in (Qt.Key_Return, Qt.Key_Enter) and not self.selection.isEmpty():
+            self.accept()
+
+    def accept(self):
+        self.regionSelected.emit(self._source(self.selection).intersected(self.frame.rect()))
+        self.close()
+
+    def cancel(self):
+        self.cancelled.emit()
+        self.close()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        region = event.region()
+        for rect in region:
+            painter.drawPixmap(rect, self.dimmed, self._source(rect))
+            inside = rect.intersected(self.selection)
+            if not inside.isEmpty():
+                painter.drawPixmap(inside, self.pixmap, self._source(inside))
+
+        painter.setClipRegion(region)
+        if not self.selection.isEmpty():
+            self._paint_selection(painter)
+        if self.rect().contains(self.cursor_pos):
+            self._paint_cursor(painter, region)
+
+    def _paint_selection(self, painter: QPainter):
+        painter.setPen(QPen(QColor("#667eea"), BORDER_WIDTH))
+        painter.drawRect(self.selection)
+        label = self._label_rect()
+        size = self._source(self.selection)
+        painter.fillRect(label, QColor(0, 0, 0, 160))
+        painter.setPen(Qt.white)
+        painter.setFont(self.readout_font)
+        painter.drawText(label, Qt.AlignCenter, f"{size.width()} × {size.height()}")
+
+    def _paint_cursor(self, painter: QPainter, region: QRegion):
+        x, y = self.cursor_pos.x(), self.cursor_pos.y()
+        painter.setPen(QPen(QColor(102, 126, 234, 160), 1))
+        painter.drawLine(0, y, self.width(), y)
+        painter.drawLine(x, 0, x, self.height())
+
+        panel = self._magnifier_rect()
+        if not region.intersects(panel):
+            return
+        # 放大镜按最近邻从画面取样, 不做平滑
+        size = MAGNIFIER_SOURCE * MAGNIFIER_SCALE
+        view = QRect(panel.x(), panel.y(), size, size)
+        center = self._source(QRect(self.cursor_pos, self.cursor_pos)).topLeft()
+        half = MAGNIFIER_SOURCE // 2
+        painter.fillRect(view, Qt.black)
+        painter.drawImage(view, self.frame, QRect(center.x() - half, center.y() - half,
+                                                  MAGNIFIER_SOURCE, MAGNIFIER_SOURCE))
+        painter.setPen(QPen(QColor(102, 126, 234), 1))
+        painter.drawRect(view.adjusted(0, 0, -1, -1))
+        painter.drawRect(view.x() + half * MAGNIFIER_SCALE, view.y() + half * MAGNIFIER_SCALE,
+                         MAGNIFIER_SCALE, MAGNIFIER_SCALE)
+
+        # 坐标和光标处的颜色
+        readout = QRect(panel.x(), panel.y() + size, size, READOUT_HEIGHT)
+        painter.fillRect(readout, QColor(0, 0, 0, 200))
+        px = min(max(center.x(), 0), self.frame.width() - 1)
+        py = min(max(center.y(), 0), self.frame.height() - 1)
+        b, g, r = self.pixels[py, px, :3]
+        painter.setPen(Qt.white)
+        painter.setFont(self.readout_font)
+        painter.drawText(readout, Qt.AlignCenter, f"({px}, {py})\n#{r:02X}{g:02X}{b:02X}")
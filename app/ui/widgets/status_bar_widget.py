@@ -381,6 +381,9 @@ class StatusInfoWidget(QWidget):
         }
         
         self.processing_timer = None
+        self.image_progress = (0, 0, 0, 0)
+        self.video_results = [0, 0]
+        self.video_total = 0
         self.setup_ui()
         self.setup_style()
         self.update_display()
@@ -410,8 +413,11 @@ class StatusInfoWidget(QWidget):
         self.failed_card = StatCard(2, self.tr("失败数"), "error")
         self.failed_card.setObjectName("failed")
         
-        # 进度环
+        # 进度环和处理速度 (视频按帧计)
         self.progress_ring = ProgressRing()
+        self.speed_label = QLabel()
+        setFont(self.speed_label, 13)
+        self.speed_label.setStyleSheet("color: #888888;")
 
         self.total_card.clicked.connect(self.on_stat_clicked)
         self.processed_card.clicked.connect(self.on_stat_clicked)
@@ -424,6 +430,7 @@ class StatusInfoWidget(QWidget):
         status_layout.addWidget(self.success_card)
         status_layout.addWidget(self.failed_card)
         status_layout.addStretch()
+        status_layout.addWidget(self.speed_label)
         status_layout.addWidget(self.progress_ring)
         
         # 失败信息面板
@@ -472,6 +479,12 @@ class StatusInfoWidget(QWidget):
         self.update_display()
         
     def update_display(self):
+        self.update_stats()
+
+        # 更新失败列表
+        self.update_failure_list()
+
+    def update_stats(self):
         self.total_card.update_value(self.status_data['total'])
         self.processed_card.update_value(self.status_data['processed'])
         self.success_card.update_value(self.status_data['success'])
@@ -483,10 +496,49 @@ class StatusInfoWidget(QWidget):
         else:
             percentage = (self.status_data['processed'] / self.status_data['total']) * 100
         self.progress_ring.set_percentage_animated(percentage)
-        
-        # 更新失败列表
-        self.update_failure_list()
-        
+
+    def reset(self, total, videos=0):
+        """开始新一批任务时清空统计和失败列表, 图片之后逐个处理的视频按文件计入总数"""
+        self.image_progress = (total, 0, 0, 0)
+        self.video_results = [0, 0]     # 已完成视频的 (成功数, 失败数)
+        self.video_total = videos
+        self.status_data.update(total=total + videos, processed=0, success=0, failed=0, failures=[])
+        self.speed_label.clear()
+        self.update_display()
+
+    def set_progress(self, total, processed, success, failed):
+        """图片批处理的进度, 与已完成视频的统计合并显示"""
+        self.image_progress = (total, processed, success, failed)
+        self.merge_progress()
+
+    def merge_progress(self):
+        total, processed, success, failed = self.image_progress
+        video_success, video_failed = self.video_results
+        self.status_data.update(total=total + self.video_total,
+                                processed=processed + video_success + video_failed,
+                                success=success + video_success, failed=failed + video_failed)
+        self.update_stats()
+
+    def track_video(self, pipeline, filename):
+        """当前视频的帧进度和速度显示在速度标签中, 结束时按文件计入成功或失败"""
+        pipeline.progressChanged.connect(
+            lambda processed, total, fps: self.speed_label.setText(
+                self.tr("{0}: {1}/{2} 帧 · {3:.1f} fps").format(filename, processed, total, fps)))
+        pipeline.finished.connect(lambda reason: self.add_video_result(filename, reason))
+
+    def add_video_result(self, filename, reason):
+        if reason:
+            self.video_results[1] += 1
+            self.add_failure(filename, reason)
+        else:
+            self.video_results[0] += 1
+        self.merge_progress()
+
+    def add_failure(self, filename, reason):
+        # 只追加新条目, 不重建整个列表
+        self.status_data['failures'].append((filename, reason))
+        self.failure_panel.add_failure(filename, reason)
+
     def update_failure_list(self):
         self.failure_panel.clear_failures()
         for filename, reason in self.status_data['failures']:
@@ -0,0 +1,40 @@
+from PySide6.QtCore import QRectF, QPointF
+from PySide6.QtGui import QImage
+from PySide6.QtWidgets import QGraphicsItem
+
+from core.capture.canvas import TiledCanvas
+
+
+class TiledCanvasItem(QGraphicsItem):
+    """ 按需绘制 TiledCanvas 的图形项, 只读取与暴露区域相交的图块, 不生成整幅位图 """
+
+    def __init__(self, canvas: TiledCanvas, parent=None):
+        super().__init__(parent)
+        self.canvas = canvas
+        self.height = canvas.height
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.canvas.width, self.height)
+
+    def refresh(self):
+        """ 画布追加了行之后调用, 只重绘新增的部分 """
+        if self.canvas.height == self.height:
+            return
+        top = self.height
+        self.prepareGeometryChange()
+        self.height = self.canvas.height
+        self.update(QRectF(0, top, self.canvas.width, self.height - top))
+
+    def paint(self, painter, option, widget=None):
+        rect = option.exposedRect.intersected(self.boundingRect())
+        if rect.isEmpty():
+            return
+        rows = self.canvas.tile_rows
+        first = max(int(rect.top()) // rows, 0)
+        last = min(int(rect.bottom()) // rows, self.canvas.tile_count - 1)
+        for index in range(first, last + 1):
+            # 图片直接引用映射的图块, 绘制期间不复制像素
+            tile = self.canvas.tile(index)
+            image = QImage(tile, tile.shape[1], tile.shape[0], tile.strides[0], QImage.Format_RGB32)
+            painter.drawImage(QPointF(0, index * rows), image)
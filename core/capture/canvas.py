@@ -0,0 +1,98 @@
+import mmap
+import os
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+from core.watermark.tiled import open_strip_writer
+
+
+TILE_ROWS = 512                 # 每个图块的行数, 绘制和导出都以图块为单位
+MAPPED_TILES = 16               # 同时映射的图块数上限, 常驻内存只取决于该值和图宽
+JPEG_MAX_ROWS = 65500           # JPEG 格式的尺寸上限
+
+
+class TiledCanvas:
+    """ 保存在临时文件中的长图, 像素为 BGRX, 逐行连续存放, 按固定行数的图块访问
+
+    像素顺序与截图得到的 QImage.Format_RGB32 的内存布局相同, 截图的行可以直接追加, 绘制时
+    也不需要转换; 导出时再调换为 RGB.
+
+    追加的行直接写入文件, 读取时按图块映射文件的一段, 最近使用的 MAPPED_TILES 个映射保留,
+    其余的在不再被引用后解除映射. 无论拼接多长, 进程内存中只有这些映射的页面.
+    """
+
+    def __init__(self, width: int, tile_rows: int = TILE_ROWS):
+        self.width = width
+        self.tile_rows = tile_rows
+        self.height = 0
+        self.row_bytes = width * 4
+        self.file = tempfile.TemporaryFile(prefix="canvas-")
+        self.mapped = OrderedDict()         # 图块序号 -> 映射的 (tile_rows, width, 4) 数组
+
+    @property
+    def tile_count(self) -> int:
+        return -(-self.height // self.tile_rows)
+
+    def append(self, rows: np.ndarray):
+        """ 在末尾追加 (h, width, 4) 的 BGRX 行 """
+        if rows.shape[1:] != (self.width, 4):
+            raise ValueError("行的尺寸与画布不同")
+        # 文件按整个图块扩展, 映射的图块始终完整, 之后写入的行通过页缓存直接可见
+        tiles = -(-(self.height + len(rows)) // self.tile_rows)
+        size = tiles * self.tile_rows * self.row_bytes
+        if os.fstat(self.file.fileno()).st_size < size:
+            self.file.truncate(size)
+        self.file.seek(self.height * self.row_bytes)
+        self.file.write(np.ascontiguousarray(rows).data)
+        self.file.flush()
+        self.height += len(rows)
+
+    def tile(self, index: int) -> np.ndarray:
+        """ 第 index 个图块的只读数组, 最后一个图块只包含已写入的行 """
+        array = self.mapped.get(index)
+        if array is None:
+            # 映射起点需要按分配粒度对齐
+            offset = index * self.tile_rows * self.row_bytes
+            start = offset - offset % mmap.ALLOCATIONGRANULARITY
+            length = offset - start + self.tile_rows * self.row_bytes
+            view = mmap.mmap(self.file.fileno(), length, offset=start, access=mmap.ACCESS_READ)
+            array = np.frombuffer(view, np.uint8, self.tile_rows * self.row_bytes, offset - start)
+            array = array.reshape(self.tile_rows, self.width, 4)
+            self.mapped[index] = array
+            while len(self.mapped) > MAPPED_TILES:
+                self.mapped.popitem(last=False)
+        else:
+            self.mapped.move_to_end(index)
+        return array[:min(self.height - index * self.tile_rows, self.tile_rows)]
+
+    def rows(self, y0: int, y1: int) -> np.ndarray:
+        """ 复制第 y0 到 y1 行 """
+        return np.concatenate([self.tile(i)[max(y0 - i * self.tile_rows, 0):y1 - i * self.tile_rows]
+                               for i in range(y0 // self.tile_rows, -(-y1 // self.tile_rows))])
+
+    def export(self, path: str, quality: int = 95):
+        """ 导出为图片: PNG/TIFF/BMP 逐图块写出; JPEG 编码器需要整幅图像, 直接读取映射的临时文件 """
+        ext = os.path.splitext(path)[1].lower()
+        if ext in (".jpg", ".jpeg"):
+            if self.height > JPEG_MAX_ROWS:
+                raise ValueError("图片过长, JPEG 最多支持 65500 行, 请导出为 PNG")
+            view = mmap.mmap(self.file.fileno(), self.height * self.row_bytes, access=mmap.ACCESS_READ)
+            Image.frombuffer("RGB", (self.width, self.height), view, "raw", "BGRX", 0, 1) \
+                .save(path, "JPEG", quality=quality)
+            return
+
+        writer = open_strip_writer(path, self.width, self.height, 3, self.tile_rows)
+        if writer is None:
+            raise ValueError(f"不支持导出为 {ext} 格式")
+        try:
+            for index in range(self.tile_count):
+                writer.write(self.tile(index)[..., 2::-1])
+        finally:
+            writer.close()
+
+    def close(self):
+        self.mapped.clear()
+        self.file.close()
@@ -0,0 +1,156 @@
+import hashlib
+
+import numpy as np
+from PySide6.QtCore import QObject, QRect, QSocketNotifier, QTimer, Signal
+
+from core.watermark.render import qimage_view
+
+try:
+    import xcffib
+    import xcffib.damage
+    import xcffib.xfixes
+    import xcffib.xproto
+except ImportError:     # 只在 Linux 上安装
+    xcffib = None
+
+
+MIN_INTERVAL = 16               # 两次截图的最短间隔 (毫秒), 约 60 fps
+MAX_INTERVAL = 250              # 轮询模式下画面静止时逐步放宽到的间隔 (毫秒)
+
+
+class DamageMonitor:
+    """ 通过 X11 DAMAGE 扩展接收根窗口的重绘通知, 画面不变时不产生任何事件
+
+    使用 BoundingBox 报告级别: 累积的损坏区域包围盒扩大时才发出事件, 每次截图前清空累积区域,
+    截图期间及之后的重绘会重新产生事件.
+    """
+
+    def __init__(self, display: str = None):
+        if xcffib is None:
+            raise OSError("xcffib 未安装")
+        self.conn = xcffib.connect(display=display)
+        try:
+            name = b"DAMAGE"
+            if not self.conn.core.QueryExtension(len(name), name).reply().present:
+                raise OSError("X 服务器不支持 DAMAGE")
+            # DAMAGE 的区域参数依赖 XFIXES, 两个扩展都需要先协商版本
+            self.conn(xcffib.xfixes.key).QueryVersion(5, 0).reply()
+            self.damage = self.conn(xcffib.damage.key)
+            self.damage.QueryVersion(1, 1).reply()
+            root = self.conn.get_setup().roots[self.conn.pref_screen].root
+            self.handle = self.conn.generate_id()
+            self.damage.Create(self.handle, root, xcffib.damage.ReportLevel.BoundingBox, is_checked=True).check()
+        except Exception:
+            self.conn.disconnect()
+            raise
+
+    def fileno(self) -> int:
+        return self.conn.get_file_descriptor()
+
+    def poll(self, rect: QRect) -> bool:
+        """ 取出所有已到达的事件, 返回其中是否有与 rect 相交的重绘 """
+        changed = False
+        while True:
+            event = self.conn.poll_for_event()
+            if event is None:
+                return changed
+            if isinstance(event, xcffib.damage.NotifyEvent):
+                area = event.area
+                changed = changed or rect.intersects(QRect(area.x, area.y, area.width, area.height))
+
+    def reset(self):
+        """ 清空累积的损坏区域 """
+        self.damage.Subtract(self.handle, 0, 0)
+        self.conn.flush()
+
+    def close(self):
+        self.damage.Destroy(self.handle)
+        self.conn.disconnect()
+
+
+def frame_signature(frame: np.ndarray) -> bytes:
+    """ 整个区域的 BLAKE2b 摘要, 用于丢弃与上一帧相同的画面; 取样会漏掉光标、单个字符这样的小变化 """
+    return hashlib.blake2b(frame.data, digest_size=16).digest()
+
+
+class CaptureScheduler(QObject):
+    """ 只在画面变化时截取指定区域
+
+    X11 下订阅 DAMAGE 事件, 区域内有重绘时才截图, 画面静止时不唤醒; 多次重绘合并到一次截图,
+    两次截图至少间隔 MIN_INTERVAL. 没有 DAMAGE 时退回轮询, 画面不变时间隔逐步放宽到 MAX_INTERVAL.
+    两种方式都用整帧摘要丢弃与上一帧相同的画面, 下游的拼接或编码不会收到重复帧.
+    """
+
+    frameReady = Signal(object)     # (h, w, 4) uint8 数组, 调用方可以保留
+
+    def __init__(self, capture, rect: QRect, parent=None):
+        super().__init__(parent=parent)
+        self.capture = capture
+        self.rect = rect
+        self.signature = None
+        self.interval = MIN_INTERVAL
+
+        self.monitor = None
+        if xcffib is not None:
+            try:
+                self.monitor = DamageMonitor()
+            except (OSError, xcffib.XcffibException):
+                self.monitor = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self._onTimeout)
+        if self.monitor:
+            self.timer.setSingleShot(True)
+            self.notifier = QSocketNotifier(self.monitor.fileno(), QSocketNotifier.Read, self)
+            self.notifier.setEnabled(False)
+            self.notifier.activated.connect(self._onActivated)
+
+    def start(self):
+        self.signature = None
+        self.interval = MIN_INTERVAL
+        if self.monitor:
+            self.monitor.poll(self.rect)
+            self.notifier.setEnabled(True)
+        # 第一帧总是立即截取
+        self.timer.start(0)
+
+    def stop(self):
+        self.timer.stop()
+        if self.monitor:
+            self.notifier.setEnabled(False)
+
+    def close(self):
+        self.stop()
+        if self.monitor:
+            self.monitor.close()
+            self.monitor = None
+
+    def _onActivated(self):
+        if self.monitor.poll(self.rect) and not self.timer.isActive():
+            self.timer.start(MIN_INTERVAL)
+
+    def _onTimeout(self):
+        if self.monitor:
+            # 先清空再截图, 截图期间发生的重绘会产生新的事件
+            self.monitor.reset()
+        changed = self._grab()
+        if self.monitor:
+            # 发出清空请求时 xcb 可能已把事件读入队列, 套接字不会再次通知
+            if self.monitor.poll(self.rect):
+                self.timer.start(MIN_INTERVAL)
+        else:
+            self.interval = MIN_INTERVAL if changed else min(self.interval * 2, MAX_INTERVAL)
+            self.timer.start(self.interval)
+
+    def _grab(self) -> bool:
+        image = self.capture.grab(self.rect)
+        if image.isNull():
+            return False
+        # 截图后端复用同一块内存, 先复制成连续数组再计算摘要, 发出的也是这份副本
+        frame = qimage_view(image).copy()
+        signature = frame_signature(frame)
+        if signature == self.signature:
+            return False
+        self.signature = signature
+        self.frameReady.emit(frame)
+        return True
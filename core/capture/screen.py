@@ -0,0 +1,149 @@
+import ctypes
+import ctypes.util
+import os
+import sys
+
+from PySide6.QtCore import QRect
+from PySide6.QtGui import QGuiApplication, QImage
+
+try:
+    import xcffib
+    import xcffib.shm
+    import xcffib.xproto
+except ImportError:     # 只在 Linux 上安装
+    xcffib = None
+
+
+IPC_PRIVATE = 0
+IPC_CREAT = 0o1000
+IPC_RMID = 0
+SHM_PERMISSIONS = 0o600         # 共享内存段只允许本用户访问
+ALL_PLANES = 0xFFFFFFFF
+
+
+def _libc():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    libc.shmget.argtypes = [ctypes.c_int, ctypes.c_size_t, ctypes.c_int]
+    libc.shmget.restype = ctypes.c_int
+    libc.shmat.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_int]
+    libc.shmat.restype = ctypes.c_void_p
+    libc.shmdt.argtypes = [ctypes.c_void_p]
+    libc.shmctl.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+    return libc
+
+
+def _clip(rect: QRect, width: int, height: int) -> QRect:
+    """ rect 为 None 时表示整个屏幕, 否则裁剪到屏幕范围内 """
+    screen = QRect(0, 0, width, height)
+    return screen if rect is None else rect.intersected(screen)
+
+
+class ShmScreenCapture:
+    """ 通过 X11 MIT-SHM 扩展截屏
+
+    X 服务器把像素直接写入与本进程共享的内存段, 返回的 QImage 和 qimage_view 得到的数组都直接
+    指向这段内存, 整个过程没有经过 socket 和 Qt 的复制. 内存段按整个根窗口的大小分配一次,
+    之后每次截图复用, 因此返回的图片只在下一次 grab 之前有效, 需要保留时应自行 copy().
+    坐标为 X 根窗口的设备像素, 多显示器时覆盖整个虚拟桌面.
+    """
+
+    def __init__(self, display: str = None):
+        if xcffib is None:
+            raise OSError("xcffib 未安装")
+        self.conn = xcffib.connect(display=display)
+        self.libc = None
+        self.address = None
+        self.segment = None
+        try:
+            self._setup()
+        except Exception:
+            self.close()
+            raise
+
+    def _setup(self):
+        name = b"MIT-SHM"
+        if not self.conn.core.QueryExtension(len(name), name).reply().present:
+            raise OSError("X 服务器不支持 MIT-SHM")
+        self.shm = self.conn(xcffib.shm.key)
+
+        setup = self.conn.get_setup()
+        screen = setup.roots[self.conn.pref_screen]
+        bits = {f.depth: f.bits_per_pixel for f in setup.pixmap_formats}
+        if screen.root_depth not in (24, 32) or bits.get(screen.root_depth) != 32 \
+                or setup.image_byte_order != xcffib.xproto.ImageOrder.LSBFirst:
+            raise OSError("不支持的像素格式")
+        self.root = screen.root
+        self.width = screen.width_in_pixels
+        self.height = screen.height_in_pixels
+
+        # 创建后立即标记删除, 双方都分离 (包括进程异常退出) 后由内核回收, 不会残留
+        self.libc = _libc()
+        size = self.width * self.height * 4
+        shmid = self.libc.shmget(IPC_PRIVATE, size, IPC_CREAT | SHM_PERMISSIONS)
+        if shmid < 0:
+            raise OSError(ctypes.get_errno(), "shmget 失败")
+        try:
+            address = self.libc.shmat(shmid, None, 0)
+            if address in (None, ctypes.c_void_p(-1).value):
+                raise OSError(ctypes.get_errno(), "shmat 失败")
+            self.address = address
+            segment = self.conn.generate_id()
+            self.shm.Attach(segment, shmid, False, is_checked=True).check()
+            self.segment = segment
+        finally:
+            self.libc.shmctl(shmid, IPC_RMID, None)
+        self.buffer = (ctypes.c_ubyte * size).from_address(self.address)
+
+    def grab(self, rect: QRect = None) -> QImage:
+        """ 截取根窗口的 rect 区域, 返回与共享内存段共用像素的 Format_RGB32 图片 """
+        rect = _clip(rect, self.width, self.height)
+        if rect.isEmpty():
+            return QImage()
+        self.shm.GetImage(self.root, rect.x(), rect.y(), rect.width(), rect.height(), ALL_PLANES,
+                          xcffib.xproto.ImageFormat.ZPixmap, self.segment, 0).reply()
+        return QImage(self.buffer, rect.width(), rect.height(), rect.width() * 4, QImage.Format_RGB32)
+
+    def close(self):
+        if self.segment is not None:
+            self.shm.Detach(self.segment)
+            self.conn.flush()
+            self.segment = None
+        if self.address is not None:
+            self.libc.shmdt(self.address)
+            self.address = None
+        if self.conn is not None:
+            self.conn.disconnect()
+            self.conn = None
+
+
+class QtScreenCapture:
+    """ 通过 QScreen.grabWindow 截屏, 用于没有 MIT-SHM 的平台, 每次截图都会复制 """
+
+    def __init__(self):
+        geometry = QRect()
+        for screen in QGuiApplication.screens():
+            geometry = geometry.united(screen.geometry())
+        self.width = geometry.right() + 1
+        self.height = geometry.bottom() + 1
+
+    def grab(self, rect: QRect = None) -> QImage:
+        rect = _clip(rect, self.width, self.height)
+        if rect.isEmpty():
+            return QImage()
+        screen = QGuiApplication.primaryScreen()
+        pixmap = screen.grabWindow(0, rect.x(), rect.y(), rect.width(), rect.height())
+        return pixmap.toImage().convertToFormat(QImage.Format_RGB32)
+
+    def close(self):
+        pass
+
+
+def create_capture():
+    """ X11 下优先使用 MIT-SHM, 扩展不可用 (远程连接、Wayland、其他平台) 时退回 grabWindow """
+    if xcffib is not None and sys.platform.startswith("linux") and os.environ.get("DISPLAY") \
+            and QGuiApplication.platformName() == "xcb":
+        try:
+            return ShmScreenCapture()
+        except (OSError, xcffib.XcffibException):
+            pass
+    return QtScreenCapture()
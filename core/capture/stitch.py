@@ -0,0 +1,156 @@
+import numpy as np
+from scipy import fft
+
+
+MIN_OVERLAP = 32                # 相邻两帧至少要有这么多行重叠, 否则视为滚动过快
+MIN_VOTES = 3                   # 行哈希投票至少需要这么多行唯一的行一致
+MATCH_RATIO = 0.9               # 对齐后重叠部分行哈希相同的比例下限, 允许光标闪烁等少量变化
+PHASE_COLUMN_STEP = 4           # 相位相关每隔这么多列取一列
+PHASE_PEAKS = 3                 # 相位相关取前几个峰逐一验证
+PHASE_TOLERANCE = 6.0           # 相位相关对齐后重叠部分逐行平均绝对差的中位数上限 (灰度), 允许少数行有变化
+
+_HASH_WEIGHTS = {}
+
+
+def row_hashes(frame: np.ndarray) -> np.ndarray:
+    """ 每行一个 64 位哈希: 按 8 字节分组与随机奇数权重相乘后求和, 溢出自然回绕 """
+    height = frame.shape[0]
+    rows = np.ascontiguousarray(frame).reshape(height, -1)
+    if rows.shape[1] % 8:
+        rows = np.pad(rows, ((0, 0), (0, 8 - rows.shape[1] % 8)))
+    words = rows.view(np.uint64)
+    count = words.shape[1]
+    if count not in _HASH_WEIGHTS:
+        _HASH_WEIGHTS[count] = np.random.default_rng(count).integers(1, 2 ** 63, count, np.uint64) | np.uint64(1)
+    return (words * _HASH_WEIGHTS[count]).sum(axis=1, dtype=np.uint64)
+
+
+def _luma(frame: np.ndarray) -> np.ndarray:
+    """ 隔列取样的前三个通道的均值, 与通道顺序无关, 用于相位相关和验证 """
+    return frame[:, ::PHASE_COLUMN_STEP, :3].mean(axis=2, dtype=np.float32)
+
+
+def static_margins(previous: np.ndarray, current: np.ndarray):
+    """ 两帧顶部和底部逐行相同的行数, 即固定的标题栏和底栏 """
+    same = previous == current
+    if same.all():
+        return len(same), 0
+    top = int(np.argmin(same))
+    bottom = int(np.argmin(same[::-1]))
+    return top, bottom
+
+
+def hash_shift(previous: np.ndarray, current: np.ndarray):
+    """ 用只出现一次的行投票估计滚动行数 d, 满足 current[i] == previous[i + d]; 失败返回 None """
+    length = len(previous)
+    values_a, index_a, count_a = np.unique(previous, return_index=True, return_counts=True)
+    values_b, index_b, count_b = np.unique(current, return_index=True, return_counts=True)
+    _, pick_a, pick_b = np.intersect1d(values_a[count_a == 1], values_b[count_b == 1], return_indices=True)
+    shifts = index_a[count_a == 1][pick_a] - index_b[count_b == 1][pick_b]
+    shifts = shifts[(shifts > 0) & (shifts <= length - MIN_OVERLAP)]
+    if len(shifts) < MIN_VOTES:
+        return None
+
+    votes = np.bincount(shifts)
+    shift = int(np.argmax(votes))
+    if votes[shift] < MIN_VOTES or np.mean(current[:length - shift] == previous[shift:]) < MATCH_RATIO:
+        return None
+    return shift
+
+
+def phase_shift(previous: np.ndarray, current: np.ndarray):
+    """ 按列做一维相位相关估计滚动行数, 用于内容有细微变化、行哈希无法匹配的情况; 失败返回 None """
+    length = len(previous)
+    if length <= MIN_OVERLAP:
+        return None
+    a = previous - previous.mean(axis=0)
+    b = current - current.mean(axis=0)
+    size = 2 * length
+    cross = (fft.rfft(a, size, axis=0) * np.conj(fft.rfft(b, size, axis=0))).sum(axis=1)
+    cross /= np.maximum(np.abs(cross), 1e-6)
+    correlation = fft.irfft(cross, size)[1:length - MIN_OVERLAP + 1]
+
+    # 相关峰不一定是真实位移, 取前几个峰逐一验证重叠部分
+    best, best_error = None, PHASE_TOLERANCE
+    for shift in np.argsort(correlation)[::-1][:PHASE_PEAKS] + 1:
+        error = np.median(np.abs(current[:length - shift] - previous[shift:]).mean(axis=1))
+        if error < best_error:
+            best, best_error = int(shift), error
+    return best
+
+
+class MemoryCanvas:
+    """ 保存在内存中的拼接结果, 追加的行按块存放, 追加的代价只与新增行数有关 """
+
+    def __init__(self):
+        self.chunks = []
+        self.height = 0
+
+    def append(self, rows: np.ndarray):
+        self.chunks.append(rows.copy())
+        self.height += len(rows)
+
+    def to_array(self) -> np.ndarray:
+        return np.concatenate(self.chunks) if self.chunks else None
+
+
+class ScrollStitcher:
+    """ 把向下滚动时依次截取的同尺寸画面拼接为长图
+
+    每一帧只与上一帧比较: 先去掉两帧中逐行相同的顶部和底部 (固定的标题栏和底栏), 再在中间
+    区域估计滚动的行数, 优先用行哈希投票, 失败时用相位相关. 画布只追加上一帧之后新露出的行,
+    底栏在结束时追加一次. 每帧的计算量只与画面高度有关, 与已拼接的总高度无关.
+    """
+
+    def __init__(self, canvas=None):
+        self.canvas = canvas if canvas is not None else MemoryCanvas()
+        self.previous = None        # (画面, 行哈希, 灰度)
+        self.appended = 0           # 上一帧中已追加到画布的行数, 画布的最后一行对应上一帧的 appended - 1 行
+
+    def push(self, frame: np.ndarray):
+        """ 加入一帧 (h, w, C) 画面, 返回新追加的行数; 画面没有滚动时返回 0, 无法对齐时返回 None """
+        hashes = row_hashes(frame)
+        luma = None
+        if self.previous is None:
+            self.previous = (frame.copy(), hashes, luma)
+            return 0
+
+        previous, previous_hashes, previous_luma = self.previous
+        if frame.shape != previous.shape:
+            raise ValueError("画面尺寸与上一帧不同")
+        top, bottom = static_margins(previous_hashes, hashes)
+        if top == len(hashes):
+            return 0
+
+        end = len(hashes) - bottom
+        shift = hash_shift(previous_hashes[top:end], hashes[top:end])
+        if shift is None:
+            luma = _luma(frame)
+            if previous_luma is None:
+                previous_luma = _luma(previous)
+            shift = phase_shift(previous_luma[top:end], luma[top:end])
+        if shift is None:
+            return None
+
+        # 第一次对齐时追加第一帧底栏以上的部分, 之后追加上一帧已追加部分之后露出的行
+        if self.canvas.height == 0:
+            self.canvas.append(previous[:end])
+            self.appended = end
+        start = max(self.appended - shift, top)
+        added = max(end - start, 0)
+        if added:
+            self.canvas.append(frame[start:end])
+        self.appended = end if added else self.appended - shift
+        self.previous = (frame.copy(), hashes, luma)
+        return added
+
+    def finish(self):
+        """ 结束拼接, 追加最后一帧中尚未追加的底部, 返回画布 """
+        if self.previous is not None:
+            frame = self.previous[0]
+            if self.canvas.height == 0:
+                self.canvas.append(frame)
+            elif self.appended < len(frame):
+                self.canvas.append(frame[self.appended:])
+            self.previous = None
+        return self.canvas
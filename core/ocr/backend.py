@@ -0,0 +1,154 @@
+import importlib.metadata
+import importlib.util
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from core.ocr.layout import find_lines
+
+
+REC_BATCH = 16          # 每次交给识别模型的文本行数
+
+
+@dataclass(frozen=True)
+class TextLine:
+    """ 识别出的一行文字 """
+
+    text: str
+    box: tuple                  # (x0, y0, x1, y1), 原图像素坐标
+    confidence: float
+
+
+class OcrBackend(ABC):
+    """ 文字识别后端: 检测文本行的位置, 再批量识别裁剪出的文本行
+
+    load 在工作进程启动时调用一次, 模型常驻在进程中. 图片均为 (h, w, 3) 的 uint8 RGB 数组.
+    threads 为每个进程可用的推理线程数, 0 表示由后端自行决定. testing 为 True 的后端不做真正的
+    识别, 结果不能写入缓存或索引.
+    """
+
+    name = ""
+    version = ""
+    threads = 0
+    testing = False
+
+    def load(self):
+        pass
+
+    @abstractmethod
+    def detect(self, image: np.ndarray) -> List[tuple]:
+        """ 返回文本行的包围盒 [(x0, y0, x1, y1)] """
+
+    @abstractmethod
+    def recognize(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        """ 返回每个裁剪区域的 (文字, 置信度) """
+
+
+class FakeBackend(OcrBackend):
+    """ 测试用后端, 不需要模型, 在进程内运行
+
+    把深色像素连续出现的行段当作文本行, 识别结果由包围盒尺寸生成, 结果完全确定.
+    load_delay 模拟模型加载时间.
+    """
+
+    name = "fake"
+    version = "1"
+    testing = True
+
+    def __init__(self, text: str = "文本", load_delay: float = 0.0):
+        self.text = text
+        self.load_delay = load_delay
+
+    def load(self):
+        time.sleep(self.load_delay)
+
+    def detect(self, image: np.ndarray) -> List[tuple]:
+        ink = image.mean(axis=2) < 128
+        rows = np.flatnonzero(np.diff(np.concatenate([[False], ink.any(axis=1), [False]]).astype(np.int8)))
+        boxes = []
+        for y0, y1 in zip(rows[::2], rows[1::2]):
+            cols = np.flatnonzero(ink[y0:y1].any(axis=0))
+            boxes.append((int(cols[0]), int(y0), int(cols[-1]) + 1, int(y1)))
+        return boxes
+
+    def recognize(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        return [(f"{self.text} {crop.shape[1]}x{crop.shape[0]}", 1.0) for crop in crops]
+
+
+class RapidOcrBackend(OcrBackend):
+    """ RapidOCR (PaddleOCR 模型的 ONNX Runtime 版本), 需要安装 rapidocr_onnxruntime """
+
+    name = "rapidocr"
+
+    def __init__(self):
+        self.engine = None
+        # 版本号是缓存键的一部分, 模型随安装包更新
+        self.version = importlib.metadata.version("rapidocr_onnxruntime")
+
+    def load(self):
+        from rapidocr_onnxruntime import RapidOCR
+        self.engine = RapidOCR(intra_op_num_threads=self.threads or -1)
+        # 第一次推理会初始化计算图, 在加载时完成
+        self.engine.text_det(np.full((64, 64, 3), 255, np.uint8))
+
+    def detect(self, image: np.ndarray) -> List[tuple]:
+        quads, _ = self.engine.text_det(np.ascontiguousarray(image[..., ::-1]))
+        if quads is None:
+            return []
+        height, width = image.shape[:2]
+        boxes = []
+        for quad in quads:
+            x0, y0 = np.floor(quad.min(axis=0)).astype(int)
+            x1, y1 = np.ceil(quad.max(axis=0)).astype(int)
+            boxes.append((max(int(x0), 0), max(int(y0), 0), min(int(x1), width), min(int(y1), height)))
+        return boxes
+
+    def recognize(self, crops: List[np.ndarray]) -> List[Tuple[str, float]]:
+        results, _ = self.engine.text_rec([np.ascontiguousarray(crop[..., ::-1]) for crop in crops])
+        return [(text, float(score)) for text, score in results]
+
+
+BACKENDS = {
+    FakeBackend.name: FakeBackend,
+    RapidOcrBackend.name: RapidOcrBackend,
+}
+
+
+def register_backend(backend: type):
+    BACKENDS[backend.name] = backend
+
+
+def create_backend(name: str, **options) -> OcrBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"未知的识别后端 {name}")
+    return BACKENDS[name](**options)
+
+
+def default_backend() -> str:
+    """ 已安装 RapidOCR 时使用它, 否则只能使用测试后端 """
+    return RapidOcrBackend.name if importlib.util.find_spec("rapidocr_onnxruntime") else FakeBackend.name
+
+
+def recognize_image(backend: OcrBackend, image: np.ndarray, ink: np.ndarray = None) -> List[TextLine]:
+    """ 检测并识别一张图片, 文本行按阅读顺序排列
+
+    给出二值图 ink 时由版面分析定位文本行, 不再对整张图运行检测模型. 裁剪出的文本行按宽度
+    排序后每 REC_BATCH 个一批识别, 同一批内宽度相近, 补齐的空白最少.
+    """
+    if ink is not None:
+        boxes = find_lines(ink)
+    else:
+        boxes = sorted(backend.detect(image), key=lambda box: (box[1], box[0]))
+    boxes = [box for box in boxes if box[2] > box[0] and box[3] > box[1]]
+    crops = [image[y0:y1, x0:x1] for x0, y0, x1, y1 in boxes]
+
+    order = sorted(range(len(crops)), key=lambda i: crops[i].shape[1])
+    results = [None] * len(crops)
+    for start in range(0, len(order), REC_BATCH):
+        batch = order[start:start + REC_BATCH]
+        for i, result in zip(batch, backend.recognize([crops[i] for i in batch])):
+            results[i] = result
+    return [TextLine(text, box, confidence) for box, (text, confidence) in zip(boxes, results) if text]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from core.paths import CONFIG_DIR
+from core.ocr.backend import OcrBackend, TextLine
+
+
+CACHE_PATH = os.path.join(CONFIG_DIR, "ocr_cache.db")
+CACHE_LIMIT = 64 * 1024 * 1024  # 缓存结果的总字节数上限, 超出后淘汰最久未使用的记录
+PIPELINE_VERSION = 1            # 预处理或版面分析的算法改变时加一, 使旧结果失效
+
+
+def image_key(image: np.ndarray, backend: OcrBackend, clean: bool) -> str:
+    """ 像素内容加上后端名称、版本和预处理方式的 BLAKE2b 摘要 """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((backend.name, backend.version, PIPELINE_VERSION, clean, image.shape, image.dtype.str)).encode())
+    h.update(np.ascontiguousarray(image).data)
+    return h.hexdigest()
+
+
+class OcrCache:
+    """ 识别结果的持久缓存, 以图片内容摘要为主键
+
+    命中时直接返回记录的文本行, 跳过预处理和识别. 记录总大小超过 limit 时按最后使用时间
+    淘汰. 多个工作进程可以同时打开同一个数据库 (WAL 模式); 连接只能在创建它的线程中使用.
+
+    总大小由触发器维护在单行的 stats 表中, 写入时不需要累加整张表; 命中时的使用时间先记在内存中,
+    下次写入或关闭时一次写回, 读取不产生写事务.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, limit: int = CACHE_LIMIT):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.limit = limit
+        self.touched = {}           # 尚未写回的 {key: 使用时间}
+        self.connection = sqlite3.connect(path, timeout=10)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            self.connection.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    lines TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    used REAL NOT NULL
+                )
+            """)
+            self.connection.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+            # 旧版本的数据库没有 stats 表, 创建时按现有记录统计一次
+            self.connection.execute("CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 0), "
+                                    "total INTEGER NOT NULL)")
+            self.connection.execute("INSERT OR IGNORE INTO stats SELECT 0, COALESCE(SUM(size), 0) FROM results")
+            for trigger in (
+                "results_insert AFTER INSERT ON results BEGIN "
+                "UPDATE stats SET total = total + new.size WHERE id = 0; END",
+                "results_update AFTER UPDATE OF size ON results BEGIN "
+                "UPDATE stats SET total = total + new.size - old.size WHERE id = 0; END",
+                "results_delete AFTER DELETE ON results BEGIN "
+                "UPDATE stats SET total = total - old.size WHERE id = 0; END",
+            ):
+                self.connection.execute("CREATE TRIGGER IF NOT EXISTS " + trigger)
+
+    def get(self, key: str) -> Optional[List[TextLine]]:
+        row = self.connection.execute("SELECT lines FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        self.touched[key] = time.time()
+        return [TextLine(text, tuple(box), confidence) for text, box, confidence in json.loads(row[0])]
+
+    def put(self, key: str, lines: List[TextLine]):
+        data = json.dumps([(line.text, line.box, line.confidence) for line in lines], ensure_ascii=False)
+        with self.connection:
+            self.flush_touched()
+            # 用 UPSERT 而不是 INSERT OR REPLACE: REPLACE 隐式删除旧记录时不触发删除触发器
+            self.connection.execute("""
+                INSERT INTO results (key, lines, size, used) VALUES (?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET lines = excluded.lines, size = excluded.size, used = excluded.used
+            """, (key, data, len(data.encode()), time.time()))
+            self.evict()
+
+    def flush_touched(self):
+        if self.touched:
+            self.connection.executemany("UPDATE results SET used = ? WHERE key = ?",
+                                        [(used, key) for key, used in self.touched.items()])
+            self.touched.clear()
+
+    def evict(self):
+        """ 总大小超过上限时沿 used 索引从最久未使用的记录开始删除, 代价只与删除的记录数有关 """
+        total, = self.connection.execute("SELECT total FROM stats WHERE id = 0").fetchone()
+        excess = total - self.limit
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self.connection.execute("SELECT key, size FROM results ORDER BY used"):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.connection.executemany("DELETE FROM results WHERE key = ?", keys)
+
+    def close(self):
+        with self.connection:
+            self.flush_touched()
+        self.connection.close()
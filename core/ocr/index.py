@@ -0,0 +1,240 @@
+import io
+import os
+import re
+import sqlite3
+from collections import defaultdict
+from typing import List, Tuple
+
+import numpy as np
+from PIL import Image
+
+from core.paths import CONFIG_DIR
+
+
+INDEX_PATH = os.path.join(CONFIG_DIR, "ocr_index.db")
+THUMB_SIZE = 160                # 缩略图的最大边长
+THUMB_QUALITY = 80
+COMPACT_RATIO = 0.2             # 已失效的文档超过该比例时重写倒排表
+MAX_VARINT_BYTES = 10           # 64 位整数的 varint 最多 10 字节
+VECTOR_MIN = 64                 # 编号数不少于该值时用数组运算编码, 更短的列表逐个编码更快
+SQL_BATCH = 500                 # 每条查询语句中 IN 列表的长度
+
+# 假名、中日韩统一表意文字 (含扩展 A)、谚文音节、兼容表意文字
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN = re.compile(f"([{_CJK}]+)|([^\\W_{_CJK}]+)")
+
+
+def tokenize(text: str, query: bool = False) -> List[str]:
+    """ 中日韩文字切分为相邻两字组成的二元组, 其余文字按单词切分并转为小写
+
+    索引时每个字还单独作为一元词, 只输入一个字的查询也能命中; 查询时连续两个字以上只用二元组.
+    """
+    terms = []
+    for cjk, word in _TOKEN.findall(text.lower()):
+        if word:
+            terms.append(word)
+            continue
+        if not query or len(cjk) == 1:
+            terms.extend(cjk)
+        terms.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+    return terms
+
+
+def encode_varints(values: np.ndarray) -> bytes:
+    """ 无符号整数的 LEB128 编码, 每字节 7 位, 最高位表示后面还有字节 """
+    values = np.asarray(values, np.uint64)
+    if len(values) == 0:
+        return b""
+    shifts = np.arange(MAX_VARINT_BYTES, dtype=np.uint64) * np.uint64(7)
+    shifted = values[:, None] >> shifts
+    groups = shifted & np.uint64(0x7F)
+    lengths = 1 + (shifted[:, 1:] > 0).sum(axis=1)
+    position = np.arange(MAX_VARINT_BYTES)
+    groups[position < lengths[:, None] - 1] |= np.uint64(0x80)
+    return groups[position < lengths[:, None]].astype(np.uint8).tobytes()
+
+
+def decode_varints(data: bytes) -> np.ndarray:
+    """ encode_varints 的逆运算, 全部为数组运算 """
+    raw = np.frombuffer(data, np.uint8)
+    if len(raw) == 0:
+        return np.zeros(0, np.uint64)
+    last = raw < 0x80
+    starts = np.flatnonzero(np.concatenate([[True], last[:-1]]))
+    position = np.arange(len(raw)) - np.repeat(starts, np.diff(np.append(starts, len(raw))))
+    parts = (raw & 0x7F).astype(np.uint64) << (position.astype(np.uint64) * np.uint64(7))
+    return np.add.reduceat(parts, starts)
+
+
+def encode_postings(ids, previous: int = 0) -> bytes:
+    """ 递增的文档编号按与前一个编号的差值编码 """
+    if len(ids) >= VECTOR_MIN:
+        return encode_varints(np.diff(np.asarray(ids, np.int64), prepend=previous))
+    out = bytearray()
+    for doc in ids:
+        delta, previous = int(doc) - previous, int(doc)
+        while delta >= 0x80:
+            out.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data: bytes) -> np.ndarray:
+    return np.cumsum(decode_varints(data).astype(np.int64))
+
+
+class SearchIndex:
+    """ 识别结果的全文索引, 按文字内容查找图片
+
+    倒排表以词为主键, 文档编号递增分配, 每个词的文档列表天然有序, 按差值的 varint 编码保存,
+    新文档只需在末尾追加. add 先把新词条缓存在内存中, flush 时每个词读写一次. 同一路径重新
+    识别时旧文档只标记为失效, 查询时过滤, 失效过多时 compact 重写倒排表.
+    查询的每个词解码为数组后求交集, 结果按文档从新到旧排列. 缩略图在第一次请求时生成,
+    按文件修改时间缓存在同一个数据库中. 连接只能在创建它的线程中使用.
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                text TEXT NOT NULL,
+                live INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS docs_path ON docs (path) WHERE live = 1;
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT PRIMARY KEY,
+                last INTEGER NOT NULL,
+                postings BLOB NOT NULL
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS thumbs (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                data BLOB NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self.connection.commit()
+        self.pending = defaultdict(list)
+        self.dead = np.array([row[0] for row in self.connection.execute("SELECT id FROM docs WHERE live = 0")],
+                             np.int64)
+
+    def add(self, path: str, text: str):
+        """ 加入或更新一个文档, 文字与已索引的内容相同时不做任何事 """
+        row = self.connection.execute("SELECT id, text FROM docs WHERE path = ? AND live = 1", (path,)).fetchone()
+        if row is not None:
+            if row[1] == text:
+                return
+            self.connection.execute("UPDATE docs SET live = 0 WHERE id = ?", (row[0],))
+            self.dead = np.append(self.dead, row[0])
+        doc = self.connection.execute("INSERT INTO docs (path, text, live) VALUES (?, ?, 1)", (path, text)).lastrowid
+        for term in set(tokenize(text)):
+            self.pending[term].append(doc)
+
+    def flush(self):
+        """ 把缓存的词条追加到倒排表并提交 """
+        terms = list(self.pending)
+        existing = {}
+        for start in range(0, len(terms), SQL_BATCH):
+            chunk = terms[start:start + SQL_BATCH]
+            rows = self.connection.execute(
+                f"SELECT term, last, postings FROM terms WHERE term IN ({','.join('?' * len(chunk))})", chunk)
+            existing.update((term, (last, postings)) for term, last, postings in rows)
+
+        rows = []
+        for term, ids in self.pending.items():
+            last, postings = existing.get(term, (0, b""))
+            rows.append((term, ids[-1], postings + encode_postings(ids, last)))
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO terms (term, last, postings) VALUES (?, ?, ?)", rows)
+        self.pending.clear()
+        live, = self.connection.execute("SELECT COUNT(*) FROM docs WHERE live = 1").fetchone()
+        if len(self.dead) > COMPACT_RATIO * max(live, 1):
+            self.compact()
+
+    def compact(self):
+        """ 从倒排表中去掉失效的文档并删除其记录 """
+        with self.connection:
+            rows = self.connection.execute("SELECT term, postings FROM terms").fetchall()
+            for term, postings in rows:
+                ids = np.setdiff1d(decode_postings(postings), self.dead, assume_unique=True)
+                if len(ids):
+                    self.connection.execute("UPDATE terms SET last = ?, postings = ? WHERE term = ?",
+                                            (int(ids[-1]), encode_postings(ids), term))
+                else:
+                    self.connection.execute("DELETE FROM terms WHERE term = ?", (term,))
+            self.connection.execute("DELETE FROM docs WHERE live = 0")
+        self.dead = np.zeros(0, np.int64)
+
+    def _postings(self, term: str) -> np.ndarray:
+        row = self.connection.execute("SELECT postings FROM terms WHERE term = ?", (term,)).fetchone()
+        return decode_postings(row[0]) if row is not None else np.zeros(0, np.int64)
+
+    def search(self, query: str, limit: int = 100) -> List[Tuple[str, str]]:
+        """ 返回包含查询中所有词的文档 [(路径, 文字)], 从新到旧排列
+
+        三个字以上的中日韩词组由多个二元组求交集, 交集中的文档不一定连续包含这些字,
+        需要再核对原文, 核对后才截取前 limit 个.
+        """
+        if self.pending:
+            self.flush()
+        terms = set(tokenize(query, query=True))
+        if not terms:
+            return []
+        postings = sorted((self._postings(term) for term in terms), key=len)
+        ids = postings[0]
+        for other in postings[1:]:
+            if len(ids) == 0:
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        if len(self.dead):
+            ids = np.setdiff1d(ids, self.dead, assume_unique=True)
+        phrases = [cjk for cjk, _ in _TOKEN.findall(query.lower()) if len(cjk) > 2]
+        ids = ids[::-1] if phrases else ids[::-1][:limit]
+
+        results = []
+        for start in range(0, len(ids), SQL_BATCH):
+            chunk = ids[start:start + SQL_BATCH].tolist()
+            rows = self.connection.execute(
+                f"SELECT id, path, text FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+            found = {doc: (path, text) for doc, path, text in rows}
+            for doc in chunk:
+                path, text = found[doc]
+                if all(phrase in text.lower() for phrase in phrases):
+                    results.append((path, text))
+                    if len(results) == limit:
+                        return results
+        return results
+
+    def thumbnail(self, path: str) -> bytes:
+        """ JPEG 编码的缩略图, 文件未变时直接返回缓存; 文件无法读取时返回空 """
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return b""
+        row = self.connection.execute("SELECT mtime_ns, data FROM thumbs WHERE path = ?", (path,)).fetchone()
+        if row is not None and row[0] == mtime_ns:
+            return row[1]
+        try:
+            with Image.open(path) as im:
+                # JPEG 解码时直接缩小, 不必解码整张图
+                im.draft("RGB", (THUMB_SIZE, THUMB_SIZE))
+                im = im.convert("RGB")
+                im.thumbnail((THUMB_SIZE, THUMB_SIZE))
+                buffer = io.BytesIO()
+                im.save(buffer, "JPEG", quality=THUMB_QUALITY)
+        except OSError:
+            return b""
+        data = buffer.getvalue()
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO thumbs (path, mtime_ns, data) VALUES (?, ?, ?)",
+                                    (path, mtime_ns, data))
+        return data
+
+    def close(self):
+        self.flush()
+        self.connection.close()
@@ -0,0 +1,59 @@
+from typing import List
+
+import numpy as np
+from scipy import ndimage
+
+
+CELL = 4                        # 查找文本块时把二值图缩小为 CELL×CELL 的格子
+BLOCK_GAP = (7, 7)              # 文本块内允许的 (纵向, 横向) 空白格子数, 更大的空白分隔不同的块
+MIN_LINE_HEIGHT = 4             # 低于该高度 (像素) 的行视为噪点或标点残留
+SEGMENT_GAP = 2.0               # 同一行内宽于行高这么多倍的空白把行拆为多段, 例如表格的列
+LINE_PADDING = 3                # 裁剪时在文本行四周保留的像素
+
+
+def _runs(mask: np.ndarray) -> np.ndarray:
+    """ 一维布尔数组中连续 True 段的 [start, stop), 形状为 (n, 2) """
+    edges = np.flatnonzero(np.diff(np.concatenate([[False], mask, [False]]).astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+
+def find_blocks(ink: np.ndarray) -> List[tuple]:
+    """ 文本块的包围盒 [(x0, y0, x1, y1)], 按从上到下、从左到右排列
+
+    在缩小的格子图上按 BLOCK_GAP 膨胀, 使同一段落的字符和行连成一个连通域, 再逐个取包围盒.
+    分栏排版中间的空白大于膨胀范围, 各栏成为不同的块.
+    """
+    height, width = ink.shape
+    padded = np.pad(ink, ((0, -height % CELL), (0, -width % CELL)))
+    cells = padded.reshape(padded.shape[0] // CELL, CELL, padded.shape[1] // CELL, CELL).any(axis=(1, 3))
+    grown = ndimage.binary_dilation(cells, np.ones(BLOCK_GAP, bool))
+    labels, _ = ndimage.label(grown)
+    blocks = []
+    for rows, cols in ndimage.find_objects(labels):
+        blocks.append((cols.start * CELL, rows.start * CELL,
+                       min(cols.stop * CELL, width), min(rows.stop * CELL, height)))
+    blocks.sort(key=lambda box: (box[1], box[0]))
+    return blocks
+
+
+def find_lines(ink: np.ndarray) -> List[tuple]:
+    """ 文本行的包围盒 [(x0, y0, x1, y1)], 按阅读顺序排列
+
+    每个文本块内用水平投影切分文本行, 再用每行的垂直投影去掉两端的空白, 并在过宽的空白处
+    拆分. 包围盒向外扩展 LINE_PADDING 像素.
+    """
+    height, width = ink.shape
+    lines = []
+    for bx0, by0, bx1, by1 in find_blocks(ink):
+        block = ink[by0:by1, bx0:bx1]
+        for y0, y1 in _runs(block.any(axis=1)):
+            if y1 - y0 < MIN_LINE_HEIGHT:
+                continue
+            cols = _runs(block[y0:y1].any(axis=0))
+            # 相邻两段之间的空白超过阈值的位置作为分段点
+            breaks = np.flatnonzero(cols[1:, 0] - cols[:-1, 1] > SEGMENT_GAP * (y1 - y0)) + 1
+            for segment in np.split(cols, breaks):
+                x0, x1 = segment[0, 0], segment[-1, 1]
+                lines.append((max(bx0 + int(x0) - LINE_PADDING, 0), max(by0 + int(y0) - LINE_PADDING, 0),
+                              min(bx0 + int(x1) + LINE_PADDING, width), min(by0 + int(y1) + LINE_PADDING, height)))
+    return lines
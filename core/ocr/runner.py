@@ -0,0 +1,201 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from multiprocessing.util import Finalize
+from typing import List
+
+import numpy as np
+from PIL import Image
+from PySide6.QtCore import QObject, QThread, QTimer, Signal
+
+from core.watermark.engine import run_bounded, chunked
+from core.ocr.backend import BACKENDS, create_backend, default_backend, recognize_image
+from core.ocr.preprocess import preprocess
+from core.ocr.cache import OcrCache, CACHE_PATH, image_key
+
+
+JOB_CHUNK = 4       # 每次提交给工作进程的图片数, 摊薄进程间通信的开销
+
+# 工作进程内的识别后端和结果缓存, 由 _init_worker 在进程启动时创建, 之后的所有任务复用
+_backend = None
+_cache = None
+
+
+def _init_worker(name: str, options: dict, threads: int, cache_path: str):
+    global _backend, _cache
+    _backend = create_backend(name, **options)
+    _backend.threads = threads
+    _backend.load()
+    # 测试后端的结果不是真正的识别结果, 不能写入缓存
+    _cache = OcrCache(cache_path) if cache_path and not _backend.testing else None
+    if _cache is not None:
+        # 进程池关闭时工作进程正常退出, 关闭缓存以写回命中记录的使用时间
+        Finalize(_cache, _cache.close, exitpriority=0)
+
+
+def _ping(_):
+    """ 空任务, 用于提前启动工作进程 """
+    return os.getpid()
+
+
+def recognize(image: np.ndarray, clean: bool):
+    """ clean 为 True 时先校正倾斜、二值化并去噪, 由版面分析定位文本行, 坐标对应校正后的页面
+
+    先按像素内容查询缓存, 命中时不做预处理和识别.
+    """
+    key = None
+    if _cache is not None:
+        key = image_key(image, _backend, clean)
+        lines = _cache.get(key)
+        if lines is not None:
+            return lines
+
+    if clean:
+        page = preprocess(image)
+        lines = recognize_image(_backend, page.rgb(), page.ink)
+    else:
+        lines = recognize_image(_backend, image)
+
+    if key is not None:
+        _cache.put(key, lines)
+    return lines
+
+
+def recognize_arrays(images: List[np.ndarray], clean: bool = False):
+    """ 在工作进程中识别一批图片, 按顺序返回每张图片的 [TextLine] """
+    return [recognize(image, clean) for image in images]
+
+
+def load_image(path: str) -> np.ndarray:
+    with Image.open(path) as im:
+        return np.asarray(im.convert("RGB"))
+
+
+def recognize_files(paths: List[str], clean: bool = False):
+    """ 在工作进程中读取并识别一批图片文件, 按顺序返回 (失败原因, [TextLine]) """
+    results = []
+    for path in paths:
+        try:
+            results.append((None, recognize(load_image(path), clean)))
+        except Exception as e:
+            results.append((str(e) or type(e).__name__, None))
+    return results
+
+
+class OcrRunner(QObject):
+    """ 常驻的识别进程池
+
+    每个工作进程启动时加载一次模型, 之后一直保留, 截图识别的延迟不包含模型加载时间;
+    warm_up 可以在用户真正提交前提前启动进程. 同一轮事件循环内提交的多张图片合并为
+    每批 JOB_CHUNK 张提交给工作进程. max_workers 为 0 时在本进程的线程中运行, 用于测试后端.
+    cache_path 为 None 时不使用结果缓存; 测试后端始终不使用缓存.
+    """
+
+    resultReady = Signal(str, object)   # key, [TextLine]
+    jobFailed = Signal(str, str)        # key, reason
+
+    def __init__(self, backend: str = None, options: dict = None, max_workers: int = None,
+                 cache_path: str = CACHE_PATH, parent=None):
+        super().__init__(parent=parent)
+        self.backend = backend or default_backend()
+        self.options = options or {}
+        self.cache_path = cache_path
+        self.max_workers = max_workers if max_workers is not None else os.cpu_count() or 1
+        self.pool = None
+        self.queue = []
+
+    @property
+    def testing(self) -> bool:
+        """ 使用的是测试后端, 没有安装真正的识别模型 """
+        return BACKENDS[self.backend].testing
+
+    def executor(self):
+        if self.pool is None:
+            # 多个进程同时推理时平分处理器核心, 避免线程数超过核心数
+            threads = max((os.cpu_count() or 1) // max(self.max_workers, 1), 1)
+            initargs = (self.backend, self.options, threads, self.cache_path)
+            if self.max_workers == 0:
+                self.pool = ThreadPoolExecutor(1, initializer=_init_worker, initargs=initargs)
+            else:
+                self.pool = ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=initargs)
+        return self.pool
+
+    def warm_up(self):
+        """ 启动所有工作进程并加载模型, 不等待完成 """
+        pool = self.executor()
+        for _ in range(max(self.max_workers, 1)):
+            pool.submit(_ping, None)
+
+    def recognize(self, key: str, image: np.ndarray):
+        """ 提交一张 RGB 图片, 结果通过 resultReady 或 jobFailed 返回 """
+        self.queue.append((key, image))
+        if len(self.queue) == 1:
+            QTimer.singleShot(0, self._flush)
+
+    def _flush(self):
+        queue, self.queue = self.queue, []
+        for chunk in chunked(queue, JOB_CHUNK):
+            future = self.executor().submit(recognize_arrays, [image for _, image in chunk])
+            keys = [key for key, _ in chunk]
+            # 回调在进程池的管理线程中执行, 信号以队列方式送到界面线程
+            future.add_done_callback(lambda f, keys=keys: self._onDone(keys, f))
+
+    def _onDone(self, keys, future):
+        try:
+            results = future.result()
+        except Exception as e:
+            for key in keys:
+                self.jobFailed.emit(key, str(e) or type(e).__name__)
+            return
+        for key, lines in zip(keys, results):
+            self.resultReady.emit(key, lines)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+class BatchOcrEngine(QThread):
+    """ 批量识别图片文件, 每批 JOB_CHUNK 个文件交给常驻进程池, 在途批数限制为进程数的两倍 """
+
+    progressChanged = Signal(int, int, int, int)    # total, processed, success, failed
+    jobFailed = Signal(str, str)                    # filename, reason
+    resultReady = Signal(str, object)               # path, [TextLine]
+
+    def __init__(self, paths: List[str], runner: OcrRunner, clean: bool = False, parent=None):
+        super().__init__(parent=parent)
+        self.paths = paths
+        self.runner = runner
+        self.clean = clean
+        self.progress_interval = 0.1
+
+    def run(self):
+        total = len(self.paths)
+        processed = success = failed = 0
+        last_emit = 0
+        self.progressChanged.emit(total, 0, 0, 0)
+
+        window = max(self.runner.max_workers, 1) * 2
+        job = partial(recognize_files, clean=self.clean)
+        chunks = run_bounded(self.runner.executor(), job, chunked(self.paths, JOB_CHUNK), window,
+                             self.isInterruptionRequested)
+        for chunk, results, error in chunks:
+            if error is not None:
+                results = [(str(error) or type(error).__name__, None)] * len(chunk)
+            for path, (reason, lines) in zip(chunk, results):
+                processed += 1
+                if reason is None:
+                    success += 1
+                    self.resultReady.emit(path, lines)
+                else:
+                    failed += 1
+                    self.jobFailed.emit(os.path.basename(path), reason)
+
+            now = time.monotonic()
+            if now - last_emit >= self.progress_interval:
+                last_emit = now
+                self.progressChanged.emit(total, processed, success, failed)
+
+        self.progressChanged.emit(total, processed, success, failed)
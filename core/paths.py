@@ -0,0 +1,7 @@
+import os
+
+
+# 程序根目录, 即 app/main.py 加入 sys.path 的目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 配置文件和数据库所在的目录, 不随启动时的工作目录变化
+CONFIG_DIR = os.path.join(ROOT_DIR, "app", "config")
@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+
+import numpy as np
+from PIL import Image
+from scipy import fft, ndimage
+
+
+DEFAULT_SCALES = (0.8, 0.9, 1.0, 1.1, 1.25)
+DETECTION_THRESHOLD = 0.5       # 归一化互相关得分高于该值视为检测到水印
+WORK_SIZE = 1024                # 粗搜索时图片长边缩放到的尺寸
+MIN_TEMPLATE = 8                # 模板缩放后的最小边长, 太小的尺度不参与搜索
+MASK_DILATION = 3               # 掩码向外扩展的像素数, 覆盖抗锯齿边缘
+
+
+@dataclass(frozen=True)
+class Detection:
+    """ 模板在原图中的位置 """
+
+    x: int
+    y: int
+    width: int
+    height: int
+    scale: float
+    score: float
+
+
+def _resize(array: np.ndarray, size) -> np.ndarray:
+    return np.asarray(Image.fromarray(array).resize(size, Image.BILINEAR), np.float32)
+
+
+def _window_sums(array: np.ndarray, height: int, width: int) -> np.ndarray:
+    """ 用积分图计算所有 height×width 窗口的和, 结果形状为 (H - height + 1, W - width + 1) """
+    integral = np.pad(array.cumsum(0, np.float64).cumsum(1), ((1, 0), (1, 0)))
+    return (integral[height:, width:] - integral[:-height, width:]
+            - integral[height:, :-width] + integral[:-height, :-width])
+
+
+class _ScaledTemplate:
+    """ 某一尺度下去均值的模板, 缓存各 FFT 尺寸下的频谱, 同一批尺寸相同的图片只计算一次 """
+
+    def __init__(self, luma: np.ndarray):
+        self.shape = luma.shape
+        zero_mean = luma - luma.mean()
+        self.norm = float(np.sqrt((zero_mean ** 2).sum()))
+        self.kernel = zero_mean[::-1, ::-1]         # 翻转后卷积即互相关
+        self.spectra = {}
+
+    def spectrum(self, fft_shape):
+        if fft_shape not in self.spectra:
+            self.spectra[fft_shape] = fft.rfft2(self.kernel, fft_shape)
+        return self.spectra[fft_shape]
+
+    def score(self, image: np.ndarray, spectrum: np.ndarray, window_std: dict, fft_shape) -> np.ndarray:
+        """ 归一化互相关, 返回每个左上角位置的得分
+
+        模板已去均值, 分子不需要减去窗口均值; FFT 尺寸不小于图片时循环卷积的回绕
+        只影响模板未完全落在图内的位置, 这些位置被裁掉.
+        """
+        th, tw = self.shape
+        height, width = image.shape[0] - th + 1, image.shape[1] - tw + 1
+        numerator = fft.irfft2(spectrum * self.spectrum(fft_shape), fft_shape)[th - 1:, tw - 1:][:height, :width]
+
+        if self.shape not in window_std:
+            count = th * tw
+            sums = _window_sums(image, th, tw)
+            variance = _window_sums(image * image, th, tw) - sums * sums / count
+            window_std[self.shape] = np.sqrt(np.maximum(variance, 0))
+        denominator = window_std[self.shape] * self.norm
+        return np.where(denominator > 1e-6, numerator / np.maximum(denominator, 1e-12), 0)
+
+
+class TemplateDetector:
+    """ 在多尺度下用 FFT 归一化互相关查找固定水印模板
+
+    先在长边 WORK_SIZE 的缩小图上搜索所有尺度, 再在原分辨率的局部窗口内精确定位.
+    带透明通道的模板按 alpha 预乘后参与匹配: 半透明叠加的标志在图中表现为形状而不是颜色,
+    预乘后的模板正好描述这一形状. 输出的掩码只覆盖不透明部分.
+    """
+
+    def __init__(self, template: np.ndarray, alpha: np.ndarray = None, scales=DEFAULT_SCALES,
+                 threshold: float = DETECTION_THRESHOLD):
+        self.alpha = alpha if alpha is not None else np.full(template.shape, 255, np.uint8)
+        self.luma = template.astype(np.float32) * (self.alpha / np.float32(255))
+        self.scales = scales
+        self.threshold = threshold
+        self.templates = {}         # (工作分辨率比例, 尺度) -> _ScaledTemplate
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "TemplateDetector":
+        with Image.open(path) as im:
+            alpha = np.asarray(im.convert("RGBA"))[..., 3]
+            luma = np.asarray(im.convert("L"))
+        return cls(luma, alpha, **kwargs)
+
+    def _template(self, ratio: float, scale: float):
+        key = (round(ratio, 4), scale)
+        if key not in self.templates:
+            height, width = self.luma.shape
+            size = (max(1, round(width * ratio * scale)), max(1, round(height * ratio * scale)))
+            if min(size) < MIN_TEMPLATE:
+                self.templates[key] = None
+            else:
+                self.templates[key] = _ScaledTemplate(_resize(self.luma, size))
+        return self.templates[key]
+
+    def _search(self, image: np.ndarray, ratio: float, scales):
+        """ 在 image 上搜索给定尺度, 返回 (得分, 左上角 x, y, 尺度) """
+        fft_shape = (fft.next_fast_len(image.shape[0], True), fft.next_fast_len(image.shape[1], True))
+        spectrum = fft.rfft2(image, fft_shape)
+        window_std = {}
+
+        best = (-1.0, 0, 0, scales[0])
+        for scale in scales:
+            template = self._template(ratio, scale)
+            if template is None or template.shape[0] > image.shape[0] or template.shape[1] > image.shape[1]:
+                continue
+            score = template.score(image, spectrum, window_std, fft_shape)
+            y, x = np.unravel_index(np.argmax(score), score.shape)
+            if score[y, x] > best[0]:
+                best = (float(score[y, x]), int(x), int(y), scale)
+        return best
+
+    def detect(self, luma: np.ndarray):
+        """ 在亮度图中查找模板, 得分低于阈值时返回 None """
+        height, width = luma.shape
+        ratio = min(1.0, WORK_SIZE / max(height, width))
+        work = _resize(luma, (max(1, round(width * ratio)), max(1, round(height * ratio)))) if ratio < 1 \
+            else luma.astype(np.float32)
+
+        score, x, y, scale = self._search(work, ratio, self.scales)
+        if score < self.threshold:
+            return None
+
+        if ratio < 1:
+            # 缩小图上相邻尺度的模板只差几个像素, 在原分辨率的局部窗口内对相邻尺度重新定位
+            index = self.scales.index(scale)
+            scales = self.scales[max(index - 1, 0):index + 2]
+            pad = int(np.ceil(2 / ratio))
+            th, tw = (round(s * max(scales)) for s in self.luma.shape)
+            x0, y0 = max(round(x / ratio) - pad, 0), max(round(y / ratio) - pad, 0)
+            x1, y1 = min(round(x / ratio) + tw + pad, width), min(round(y / ratio) + th + pad, height)
+            refined = self._search(luma[y0:y1, x0:x1].astype(np.float32), 1.0, scales)
+            if refined[0] >= self.threshold:
+                score, x, y, scale = refined[0], refined[1] + x0, refined[2] + y0, refined[3]
+            else:
+                x, y = round(x / ratio), round(y / ratio)
+
+        th, tw = (max(1, round(s * scale)) for s in self.luma.shape)
+        return Detection(x, y, tw, th, scale, score)
+
+    def mask(self, detection: Detection, shape) -> np.ndarray:
+        """ 生成与原图同尺寸的修复掩码 """
+        mask = np.zeros(shape, bool)
+        alpha = _resize(self.alpha, (detection.width, detection.height)) > 127
+        alpha = ndimage.binary_dilation(np.pad(alpha, MASK_DILATION), iterations=MASK_DILATION)
+
+        x, y = detection.x - MASK_DILATION, detection.y - MASK_DILATION
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + alpha.shape[1], shape[1]), min(y + alpha.shape[0], shape[0])
+        if x0 < x1 and y0 < y1:
+            mask[y0:y1, x0:x1] = alpha[y0 - y:y1 - y, x0 - x:x1 - x]
+        return mask
@@ -0,0 +1,137 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+import numpy as np
+from PIL import Image
+from PySide6.QtCore import QThread, Signal
+
+from core.watermark.engine import WatermarkJob, run_bounded, upright_image
+from core.watermark.encoder import atomic_save, save_options
+from core.removal.inpaint import InpaintMethod, inpaint
+from core.removal.detect import TemplateDetector
+from core.removal.estimate import OverlayEstimate, fit_alpha, unblend
+
+
+def load_mask(path: str) -> np.ndarray:
+    """ 读取掩码图片: 带透明通道时不透明处为修复区域, 否则亮度大于一半处为修复区域 """
+    with Image.open(path) as im:
+        if im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info:
+            return np.asarray(im.convert("RGBA"))[..., 3] > 127
+        return np.asarray(im.convert("L")) > 127
+
+
+def fit_mask(mask: np.ndarray, size) -> np.ndarray:
+    """ 把掩码按最近邻缩放到 (宽, 高), 同一批图片尺寸不一致时按比例对应同一位置 """
+    width, height = size
+    if mask.shape == (height, width):
+        return mask
+    scaled = Image.fromarray(mask).resize((width, height), Image.NEAREST)
+    return np.asarray(scaled)
+
+
+# 子进程内的掩码、模板检测器、叠加层估计和修复参数, 由 _init_worker 在进程启动时设置一次
+# 检测器在每个子进程中只创建一次, 模板频谱在该进程处理的所有图片间复用
+_mask = None
+_detector = None
+_overlay = None
+_method = InpaintMethod.TELEA
+
+
+def _init_worker(mask: np.ndarray, template_path: str, overlay: OverlayEstimate, method: InpaintMethod):
+    global _mask, _detector, _overlay, _method
+    _mask = mask
+    _detector = TemplateDetector.from_file(template_path) if template_path else None
+    _overlay = overlay
+    _method = method
+
+
+def remove_job(job: WatermarkJob):
+    """ 在子进程中修复单张图片, 返回 (失败原因, 检测结果)
+
+    使用模板时先检测水印位置并生成该图片的掩码; 使用叠加层估计时先反向混合, 只修复接近不透明的部分;
+    否则使用固定掩码. 成功时失败原因为 None.
+    """
+    detection = None
+    try:
+        with Image.open(job.src) as im:
+            mode = "RGBA" if im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info else "RGB"
+            # 与预览代理图一样按 EXIF 方向摆正, 画笔掩码的坐标才能对应
+            base = np.array(upright_image(im, mode))
+            luma = np.asarray(im.convert("L")) if _detector else None
+            options = save_options(job.dst, im.info)
+
+        if _detector:
+            detection = _detector.detect(luma)
+            if detection is None:
+                return "未检测到水印", None
+            mask = _detector.mask(detection, luma.shape)
+        elif _overlay:
+            size = (base.shape[1], base.shape[0])
+            mask = unblend(base, fit_alpha(_overlay.alpha, size), _overlay.color)
+        else:
+            mask = fit_mask(_mask, (base.shape[1], base.shape[0]))
+        inpaint(base, mask, _method)
+
+        image = Image.fromarray(base, mode)
+        if job.dst.lower().endswith((".jpg", ".jpeg")) and mode == "RGBA":
+            image = image.convert("RGB")
+        atomic_save(image, job.dst, **options)
+    except Exception as e:
+        return str(e) or type(e).__name__, detection
+
+    return None, detection
+
+
+class BatchRemovalEngine(QThread):
+    """ 批量去水印, 在进程池中并行处理
+
+    给定 template_path 时在每张图片中用模板匹配定位水印并生成各自的掩码; 给定 overlay 时按估计的透明度
+    和颜色反向混合; 否则所有图片使用同一掩码.
+    """
+
+    progressChanged = Signal(int, int, int, int)    # total, processed, success, failed
+    jobFailed = Signal(str, str)                    # filename, reason
+    watermarkDetected = Signal(str, int, int, int, int, float)     # path, x, y, width, height, score
+
+    def __init__(self, jobs: List[WatermarkJob], mask: np.ndarray = None, template_path: str = "",
+                 overlay: OverlayEstimate = None, method: InpaintMethod = InpaintMethod.TELEA,
+                 max_workers: int = None, parent=None):
+        super().__init__(parent=parent)
+        self.jobs = jobs
+        self.mask = mask
+        self.template_path = template_path
+        self.overlay = overlay
+        self.method = method
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress_interval = 0.1
+
+    def run(self):
+        total = len(self.jobs)
+        processed = success = failed = 0
+        last_emit = 0
+        self.progressChanged.emit(total, 0, 0, 0)
+
+        initargs = (self.mask, self.template_path, self.overlay, self.method)
+        with ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = run_bounded(pool, remove_job, self.jobs, self.max_workers * 4, self.isInterruptionRequested)
+            for job, result, error in results:
+                reason, detection = result if error is None else (str(error) or type(error).__name__, None)
+                if detection is not None:
+                    self.watermarkDetected.emit(job.src, detection.x, detection.y,
+                                                detection.width, detection.height, detection.score)
+
+                processed += 1
+                if reason is None:
+                    success += 1
+                else:
+                    failed += 1
+                    self.jobFailed.emit(os.path.basename(job.src), reason)
+
+                now = time.monotonic()
+                if now - last_emit >= self.progress_interval:
+                    last_emit = now
+                    self.progressChanged.emit(total, processed, success, failed)
+
+        self.progressChanged.emit(total, processed, success, failed)
@@ -0,0 +1,241 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import List
+
+import numpy as np
+from PIL import Image
+from PySide6.QtCore import QThread, Signal
+from scipy import fft, ndimage
+
+from core.watermark.engine import run_bounded
+
+
+ESTIMATE_SIZE = 1024            # 统计时图片长边缩放到的尺寸, 内存占用只取决于该尺寸
+ASPECT_TOLERANCE = 0.01         # 宽高比与第一张图片相差超过该比例的图片无法对齐, 跳过
+MEDIAN_STEP = 1.5               # 随机逼近中位数的步长系数, 乘以逐像素的离散度
+EDGE_FACTOR = 4                 # 梯度中位数超过背景噪声水平该倍数视为水印边缘
+EDGE_FLOOR = 2.0                # 边缘阈值下限 (灰度/像素)
+ALPHA_MIN = 0.02                # 估计透明度低于该值视为不属于水印
+ALPHA_OPAQUE = 0.85             # 透明度高于该值时反向混合放大噪声过多, 改用修复算法
+COLOR_ITERATIONS = 8            # 交替求解透明度和颜色的轮数
+MASK_DILATION = 2               # 掩码向外扩展的像素数 (统计分辨率下)
+
+
+@dataclass(frozen=True)
+class OverlayEstimate:
+    """ 多张图片共有的半透明叠加层: I = alpha * color + (1 - alpha) * B """
+
+    mask: np.ndarray            # bool, 统计分辨率下需要处理的区域
+    alpha: np.ndarray           # float32, 统计分辨率下的透明度 0~1
+    color: tuple                # 叠加层颜色 (R, G, B)
+    count: int                  # 参与统计的图片数
+
+
+def load_frame(path: str, size) -> np.ndarray:
+    """ 以统计分辨率读取 RGB 图片, JPEG 通过 draft 在解码时直接缩小 """
+    with Image.open(path) as im:
+        if im.format == "JPEG":
+            im.draft("RGB", size)
+        return np.asarray(im.convert("RGB").resize(size, Image.BILINEAR), np.float32)
+
+
+def load_aligned(path: str, size=None) -> np.ndarray:
+    """ 读取缩放到统计尺寸的图片, size 为 None 时由图片自身确定; 宽高比不同的图片无法对齐 """
+    with Image.open(path) as im:
+        width, height = im.size
+    if size is None:
+        ratio = min(1.0, ESTIMATE_SIZE / max(width, height))
+        size = max(1, round(width * ratio)), max(1, round(height * ratio))
+    elif abs(width / height / (size[0] / size[1]) - 1) > ASPECT_TOLERANCE:
+        raise ValueError("宽高比与其他图片不同, 无法对齐")
+    return load_frame(path, size)
+
+
+def gradients(frame: np.ndarray):
+    """ 前向差分梯度, 最后一列/行为 0, 与 _integrate 的诺伊曼边界一致 """
+    gx = np.zeros_like(frame)
+    gy = np.zeros_like(frame)
+    np.subtract(frame[:, 1:], frame[:, :-1], out=gx[:, :-1])
+    np.subtract(frame[1:], frame[:-1], out=gy[:-1])
+    return gx, gy
+
+
+def _integrate(gx: np.ndarray, gy: np.ndarray) -> np.ndarray:
+    """ 由梯度场重建图像: 用 DCT 求解诺伊曼边界的泊松方程, 结果的常数项为 0 """
+    div = gx.copy()
+    div[:, 1:] -= gx[:, :-1]
+    div += gy
+    div[1:] -= gy[:-1]
+
+    height, width = div.shape
+    eigen = (2 * np.cos(np.pi * np.arange(height) / height) - 2)[:, None] \
+        + (2 * np.cos(np.pi * np.arange(width) / width) - 2)[None, :]
+    eigen[0, 0] = 1
+    spectrum = fft.dctn(div, norm="ortho") / eigen
+    spectrum[0, 0] = 0
+    return fft.idctn(spectrum, norm="ortho")
+
+
+class GradientMedianEstimator:
+    """ 逐张累积图片梯度的逐像素中位数, 估计共有水印的掩码和透明度
+
+    背景在各图片间不同, 梯度的中位数趋近于 0; 水印在所有图片中位置相同, 其边缘梯度保留下来.
+    中位数用随机逼近法维护: 每张图片让估计值向当前梯度方向移动一步, 步长按逐像素离散度
+    和图片数衰减, 无论输入多少张图片都只占用固定的几个数组.
+    图片缩放到同一统计尺寸后对齐, 因此水印应在各图片中处于相同的相对位置.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        width, height = size
+        shape = (2, height, width, 3)
+        self.median = np.zeros(shape, np.float32)       # x/y 方向梯度的中位数估计
+        self.spread = np.zeros(shape, np.float32)       # 与中位数的平均绝对偏差, 决定步长
+        self.mean = np.zeros((height, width, 3), np.float32)
+        self.buffers = np.zeros((2,) + shape, np.float32)   # 梯度偏差和临时结果, 最后一列/行保持为 0
+        self.count = 0
+
+    def add(self, frame: np.ndarray):
+        """ 累积一张统计尺寸的 float32 RGB 图片, 全部在预分配的缓冲区上原地计算 """
+        self.count += 1
+        deviation, scratch = self.buffers
+        np.subtract(frame, self.mean, out=scratch[0])
+        scratch[0] *= 1 / self.count
+        self.mean += scratch[0]
+        np.subtract(frame[:, 1:], frame[:, :-1], out=deviation[0, :, :-1])
+        np.subtract(frame[1:], frame[:-1], out=deviation[1, :-1])
+        if self.count == 1:
+            self.median[:] = deviation
+            np.abs(deviation, out=self.spread)
+            self.spread += 1
+            return
+
+        deviation -= self.median
+        np.abs(deviation, out=scratch)
+        scratch -= self.spread
+        scratch *= 1 / self.count
+        self.spread += scratch
+        np.sign(deviation, out=deviation)
+        deviation *= self.spread
+        deviation *= MEDIAN_STEP / self.count ** 0.75
+        self.median += deviation
+
+    def estimate(self) -> OverlayEstimate:
+        gx, gy = self.median
+        magnitude = np.sqrt((gx ** 2 + gy ** 2).sum(-1))
+        threshold = max(EDGE_FLOOR, EDGE_FACTOR * float(np.median(magnitude)))
+        edges = ndimage.binary_dilation(magnitude > threshold, iterations=2)
+
+        # 只积分边缘附近的梯度, 其余位置的残余噪声不参与重建
+        overlay = np.stack([_integrate(gx[..., c] * edges, gy[..., c] * edges) for c in range(3)], -1)
+        region = ndimage.binary_fill_holes(ndimage.binary_closing(edges, iterations=2))
+        if not region.any():
+            height, width = magnitude.shape
+            return OverlayEstimate(np.zeros((height, width), bool), np.zeros((height, width), np.float32),
+                                   (255, 255, 255), self.count)
+        overlay -= np.median(overlay[~region], axis=0) if (~region).any() else 0
+
+        alpha, color = self._solve_alpha(overlay[region], self.mean[region] - overlay[region])
+        alpha_map = np.zeros(magnitude.shape, np.float32)
+        alpha_map[region] = alpha
+        mask = ndimage.binary_dilation(alpha_map > ALPHA_MIN, iterations=MASK_DILATION)
+        return OverlayEstimate(mask, alpha_map, tuple(int(round(v)) for v in color), self.count)
+
+    @staticmethod
+    def _solve_alpha(overlay: np.ndarray, background: np.ndarray):
+        """ 重建结果 overlay = alpha * (color - background), 交替求解逐像素 alpha 和统一的 color
+
+        color 从与重建符号一致的极值 (白或黑) 出发, 每轮都限制在 0~255, alpha 限制在 0~1.
+        """
+        color = np.where(overlay.sum(0) >= 0, 255.0, 0.0)
+        alpha = np.zeros(len(overlay))
+        for _ in range(COLOR_ITERATIONS):
+            difference = color - background
+            alpha = np.clip((overlay * difference).sum(1) / np.maximum((difference ** 2).sum(1), 1e-6), 0, 1)
+            weight = alpha ** 2
+            if weight.sum() <= 0:
+                break
+            color = np.clip((alpha[:, None] * (overlay + alpha[:, None] * background)).sum(0) / weight.sum(), 0, 255)
+        return alpha.astype(np.float32), color
+
+
+def fit_alpha(alpha: np.ndarray, size) -> np.ndarray:
+    """ 把统计分辨率的透明度双线性缩放到 (宽, 高) """
+    width, height = size
+    if alpha.shape == (height, width):
+        return alpha
+    return np.asarray(Image.fromarray(alpha, "F").resize((width, height), Image.BILINEAR))
+
+
+def unblend(image: np.ndarray, alpha: np.ndarray, color) -> np.ndarray:
+    """ 原地反向混合 uint8 RGB(A) 图像: B = (I - alpha * color) / (1 - alpha)
+
+    只处理 ALPHA_MIN 到 ALPHA_OPAQUE 之间的像素, 返回透明度过高需要修复的掩码.
+    """
+    blend = (alpha > ALPHA_MIN) & (alpha < ALPHA_OPAQUE)
+    a = alpha[blend][:, None]
+    rgb = image[..., :3]
+    rgb[blend] = np.clip(np.rint((rgb[blend] - a * np.float32(color)) / (1 - a)), 0, 255).astype(np.uint8)
+    return alpha >= ALPHA_OPAQUE
+
+
+class MaskEstimationEngine(QThread):
+    """ 从一批图片中估计共有的水印, 解码在线程池中预读, 统计在本线程中逐张进行 """
+
+    progressChanged = Signal(int, int, int, int)    # total, processed, success, failed
+    jobFailed = Signal(str, str)                    # filename, reason
+    estimateReady = Signal(object)                  # OverlayEstimate, 可用图片不足两张时为 None
+
+    def __init__(self, paths: List[str], max_workers: int = None, parent=None):
+        super().__init__(parent=parent)
+        self.paths = paths
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.progress_interval = 0.1
+
+    def run(self):
+        total = len(self.paths)
+        processed = success = failed = 0
+        last_emit = 0
+        self.progressChanged.emit(total, 0, 0, 0)
+
+        # 第一张可读的图片确定统计尺寸, 之后的图片在线程池中预读
+        estimator = None
+        paths = iter(self.paths)
+        for path in paths:
+            processed += 1
+            try:
+                frame = load_aligned(path)
+            except Exception as e:
+                failed += 1
+                self.jobFailed.emit(os.path.basename(path), str(e) or type(e).__name__)
+                continue
+            estimator = GradientMedianEstimator((frame.shape[1], frame.shape[0]))
+            estimator.add(frame)
+            success += 1
+            break
+
+        with ThreadPoolExecutor(self.max_workers) as pool:
+            read = partial(load_aligned, size=estimator.size if estimator else None)
+            results = run_bounded(pool, read, paths, self.max_workers * 2, self.isInterruptionRequested)
+            for path, frame, error in results:
+                processed += 1
+                if error is None:
+                    estimator.add(frame)
+                    success += 1
+                else:
+                    failed += 1
+                    self.jobFailed.emit(os.path.basename(path), str(error) or type(error).__name__)
+
+                now = time.monotonic()
+                if now - last_emit >= self.progress_interval:
+                    last_emit = now
+                    self.progressChanged.emit(total, processed, success, failed)
+
+        self.progressChanged.emit(total, processed, success, failed)
+        if estimator and estimator.count >= 2 and not self.isInterruptionRequested():
+            self.estimateReady.emit(estimator.estimate())
+        else:
+            self.estimateReady.emit(None)
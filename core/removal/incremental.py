@@ -0,0 +1,181 @@
+import numpy as np
+from PySide6.QtCore import QObject, QThread, Signal
+
+from core.removal.inpaint import InpaintMethod, inpaint
+
+
+TILE_SIZE = 64                  # 更新区域按该大小的网格对齐, 合成回预览时以图块为单位
+UPDATE_MARGIN = 16              # 掩码连通域外保留的上下文宽度
+
+
+def paint_segment(mask: np.ndarray, p0, p1, radius: float, value: bool = True):
+    """ 在掩码上画一段圆头线段 (x, y 坐标), 返回受影响的矩形 (x0, y0, x1, y1), 完全在图外时返回 None """
+    height, width = mask.shape
+    (ax, ay), (bx, by) = p0, p1
+    x0, x1 = max(int(min(ax, bx) - radius), 0), min(int(max(ax, bx) + radius) + 1, width)
+    y0, y1 = max(int(min(ay, by) - radius), 0), min(int(max(ay, by) + radius) + 1, height)
+    if x0 >= x1 or y0 >= y1:
+        return None
+
+    # 像素中心到线段的距离
+    ys, xs = np.mgrid[y0:y1, x0:x1] + 0.5
+    dx, dy = bx - ax, by - ay
+    t = np.clip(((xs - ax) * dx + (ys - ay) * dy) / max(dx * dx + dy * dy, 1e-9), 0, 1)
+    inside = (xs - ax - t * dx) ** 2 + (ys - ay - t * dy) ** 2 <= radius * radius
+    mask[y0:y1, x0:x1][inside] = value
+    return x0, y0, x1, y1
+
+
+def union_rect(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
+
+
+class IncrementalInpainter:
+    """ 交互涂抹的掩码和修复结果
+
+    每次涂抹只重新修复受影响的区域: 脏矩形外扩上下文并对齐到图块网格, 再继续扩展直到边界上
+    没有掩码像素, 保证区域内的连通域都是完整的且周围留有上下文, 与其他区域之间没有接缝.
+    区域外的修复结果保持不变.
+    """
+
+    def __init__(self, image: np.ndarray, method: InpaintMethod = InpaintMethod.TELEA):
+        self.image = image
+        self.mask = np.zeros(image.shape[:2], bool)
+        self.result = image.copy()
+        self.method = method
+
+    def paint(self, p0, p1, radius: float, erase: bool = False):
+        return paint_segment(self.mask, p0, p1, radius, not erase)
+
+    def clear(self):
+        self.mask[:] = False
+        self.result[:] = self.image
+
+    def region(self, rect):
+        """ 脏矩形对应的更新区域 (y 切片, x 切片) """
+        height, width = self.mask.shape
+        x0, y0, x1, y1 = rect
+        x0, y0 = max(x0 - UPDATE_MARGIN, 0) // TILE_SIZE * TILE_SIZE, max(y0 - UPDATE_MARGIN, 0) // TILE_SIZE * TILE_SIZE
+        x1, y1 = min(-(-(x1 + UPDATE_MARGIN) // TILE_SIZE) * TILE_SIZE, width), \
+            min(-(-(y1 + UPDATE_MARGIN) // TILE_SIZE) * TILE_SIZE, height)
+
+        # 边界 UPDATE_MARGIN 宽的环带内有掩码时向该方向扩展一个图块
+        while True:
+            band = min(UPDATE_MARGIN, y1 - y0, x1 - x0)
+            grow = (x0 > 0 and self.mask[y0:y1, x0:x0 + band].any(),
+                    y0 > 0 and self.mask[y0:y0 + band, x0:x1].any(),
+                    x1 < width and self.mask[y0:y1, x1 - band:x1].any(),
+                    y1 < height and self.mask[y1 - band:y1, x0:x1].any())
+            if not any(grow):
+                return slice(y0, y1), slice(x0, x1)
+            x0 = max(x0 - TILE_SIZE, 0) if grow[0] else x0
+            y0 = max(y0 - TILE_SIZE, 0) if grow[1] else y0
+            x1 = min(x1 + TILE_SIZE, width) if grow[2] else x1
+            y1 = min(y1 + TILE_SIZE, height) if grow[3] else y1
+
+    def job(self, rect, method: InpaintMethod = None):
+        """ 在界面线程中取出更新区域的快照, 工作线程只读这份快照 """
+        region = self.region(rect)
+        return region, self.image[region].copy(), self.mask[region].copy(), method or self.method
+
+    @staticmethod
+    def run(job):
+        region, patch, hole, method = job
+        if hole.any():
+            inpaint(patch, hole, method)
+        return region, patch
+
+    def apply(self, region, patch):
+        self.result[region] = patch
+
+
+class MaskInpaintThread(QThread):
+    """ 修复一个更新区域 """
+
+    patchReady = Signal(object, object)     # 区域切片, 修复后的像素
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent=parent)
+        self.job = job
+
+    def run(self):
+        self.patchReady.emit(*IncrementalInpainter.run(self.job))
+
+
+class MaskInpaintUpdater(QObject):
+    """ 涂抹预览调度
+
+    同一时间最多一个修复线程在运行; 运行期间的涂抹累积为一个脏矩形, 线程结束后一次补算.
+    结果写回 inpainter.result 后发出 patchReady, 界面只需重绘该区域.
+    拖动过程中总是用快速行进法预览; 选择了较慢的修复方式时, 在笔画结束后对整笔重新修复一次.
+    """
+
+    patchReady = Signal(int, int, int, int)    # x, y, width, height
+
+    def __init__(self, inpainter: IncrementalInpainter, parent=None):
+        super().__init__(parent=parent)
+        self.inpainter = inpainter
+        self.dirty = None           # 待快速预览的矩形
+        self.stroke = None          # 当前笔画覆盖的矩形
+        self.refine = None          # 待按所选方式重新修复的矩形
+        self.thread = None
+        self.closed = False
+
+    def paint(self, p0, p1, radius: float, erase: bool = False):
+        rect = self.inpainter.paint(p0, p1, radius, erase)
+        self.stroke = union_rect(self.stroke, rect)
+        self.dirty = union_rect(self.dirty, rect)
+        self._schedule()
+
+    def end_stroke(self):
+        if self.inpainter.method != InpaintMethod.TELEA:
+            self.refine = union_rect(self.refine, self.stroke)
+        self.stroke = None
+        self._schedule()
+
+    def update(self, rect):
+        """ 掩码被外部修改后重新修复 rect 内的区域 """
+        self.dirty = union_rect(self.dirty, rect)
+        self.end_stroke()
+
+    def close(self):
+        """ 放弃尚未开始的更新, 正在运行的线程结束后释放自身 """
+        self.closed = True
+        self.dirty = self.stroke = self.refine = None
+        if self.thread is None:
+            self.deleteLater()
+
+    def _schedule(self):
+        if self.thread is not None:
+            return
+        if self.dirty is not None:
+            job = self.inpainter.job(self.dirty, InpaintMethod.TELEA)
+            self.dirty = None
+        elif self.refine is not None:
+            job = self.inpainter.job(self.refine)
+            self.refine = None
+        else:
+            return
+        self.thread = MaskInpaintThread(job, self)
+        self.thread.patchReady.connect(self._onPatchReady)
+        self.thread.finished.connect(self._onFinished)
+        self.thread.start()
+
+    def _onPatchReady(self, region, patch):
+        if self.closed:
+            return
+        self.inpainter.apply(region, patch)
+        sy, sx = region
+        self.patchReady.emit(sx.start, sy.start, sx.stop - sx.start, sy.stop - sy.start)
+
+    def _onFinished(self):
+        self.thread.deleteLater()
+        self.thread = None
+        if self.closed:
+            self.deleteLater()
+        else:
+            self._schedule()
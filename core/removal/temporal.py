@@ -0,0 +1,169 @@
+from collections import deque
+
+import numpy as np
+from scipy import fft, ndimage
+
+from core.removal.inpaint import InpaintMethod, inpaint
+
+
+HISTORY_FRAMES = 48             # 环形缓冲区保留的已输出帧数, 只保存裁剪区域, 占用很小
+LOOKAHEAD_FRAMES = 8            # 向后参考的帧数, 输出比输入延迟这么多帧
+SEARCH_RADIUS = 64              # 相邻帧之间可估计的最大位移 (像素)
+CONTEXT_MARGIN = 128            # 裁剪区域在掩码包围盒外扩展的宽度, 决定能从多远处取到背景
+BAND_WIDTH = 8                  # 水印外围用于一致性检查的环带宽度
+EDGE_GUARD = 2                  # 水印掩码外扩的像素数, 抗锯齿边缘不作为取样来源
+CONSISTENCY_THRESHOLD = 12.0    # 对齐后环带的平均绝对差超过该值 (灰度) 视为运动估计失败或镜头切换
+MEDIAN_SAMPLES = 9              # 每个像素最多取这么多帧做中位数, 从位移不同的帧中均匀抽取
+STATIC_THRESHOLD = 3.0          # 环带的平均绝对差低于该值视为背景静止, 沿用上一次的空间修复结果
+
+
+def roi_slices(mask: np.ndarray, margin: int = CONTEXT_MARGIN):
+    """ 掩码包围盒向外扩展 margin 后的切片, 时域填充只在这个区域内进行 """
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    height, width = mask.shape
+    return (slice(max(rows[0] - margin, 0), min(rows[-1] + 1 + margin, height)),
+            slice(max(cols[0] - margin, 0), min(cols[-1] + 1 + margin, width)))
+
+
+def _luma(crop: np.ndarray) -> np.ndarray:
+    return crop[..., :3].astype(np.float32) @ np.float32([0.299, 0.587, 0.114])
+
+
+class TemporalFiller:
+    """ 用相邻帧中露出的背景填充视频中静止的水印区域
+
+    环形缓冲区保存前后若干帧水印附近的裁剪区域 (uint8), 不保存整帧. 相邻帧之间的整体平移
+    用相位相关估计 (水印区域用均值遮住, 避免静止的水印把结果拉向零位移), 累积得到每帧相对
+    第一帧的位置. 填充第 t 帧时, 把缓冲区内其他帧按位移对齐, 对水印下每个像素取所有露出背景
+    的帧的中位数. 背景静止或运动不足时没有帧能露出这些像素, 这部分退回空间修复; 背景持续
+    静止时直接沿用上一次的修复结果, 既省去计算也避免逐帧闪烁.
+    """
+
+    def __init__(self, mask: np.ndarray, history: int = HISTORY_FRAMES, lookahead: int = LOOKAHEAD_FRAMES,
+                 method: InpaintMethod = InpaintMethod.TELEA):
+        self.roi = roi_slices(mask)
+        self.hole = mask[self.roi]
+        self.avoid = ndimage.binary_dilation(self.hole, iterations=EDGE_GUARD)
+        self.band = ndimage.binary_dilation(self.avoid, iterations=BAND_WIDTH) & ~self.avoid
+        self.hole_ys, self.hole_xs = np.nonzero(self.hole)
+        self.band_ys, self.band_xs = np.nonzero(self.band)
+        self.method = method
+
+        self.lookahead = lookahead
+        self.frames = deque(maxlen=history + lookahead + 1)     # (裁剪区域, 亮度, 累积位移 (dy, dx))
+        self.pending = deque()                                  # 尚未输出的帧的附带数据
+        self.previous = None                                    # 上一帧的亮度谱, 用于估计位移
+        self.position = np.zeros(2, np.int64)
+        self.reference = None                                   # (环带亮度, 空间修复的像素, 修复值)
+
+        height, width = self.hole.shape
+        self.hann = np.outer(np.hanning(height), np.hanning(width)).astype(np.float32)
+
+    def _spectrum(self, luma: np.ndarray):
+        luma = luma.copy()
+        luma[self.avoid] = luma[~self.avoid].mean()
+        return fft.rfft2((luma - luma.mean()) * self.hann)
+
+    def _shift(self, spectrum) -> np.ndarray:
+        """ 相位相关估计内容从上一帧到当前帧的整数位移 (dy, dx) """
+        cross = spectrum * np.conj(self.previous)
+        cross /= np.maximum(np.abs(cross), 1e-6)
+        correlation = fft.irfft2(cross, self.hole.shape)
+        dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+        height, width = correlation.shape
+        dy = dy - height if dy > height // 2 else dy
+        dx = dx - width if dx > width // 2 else dx
+        if max(abs(dy), abs(dx)) > SEARCH_RADIUS:
+            return np.zeros(2, np.int64)
+        return np.array([dy, dx], np.int64)
+
+    def push(self, crop: np.ndarray, token=None):
+        """ 加入下一帧的裁剪区域, 返回已经可以输出的 [(token, 填充后的裁剪区域)] """
+        luma = _luma(crop)
+        spectrum = self._spectrum(luma)
+        if self.previous is not None:
+            self.position = self.position + self._shift(spectrum)
+        self.previous = spectrum
+        self.frames.append((crop, luma, self.position))
+        self.pending.append(token)
+
+        # 最早的待输出帧之后已有 lookahead 帧时输出它
+        ready = []
+        while len(self.pending) > self.lookahead:
+            ready.append(self._pop())
+        return ready
+
+    def flush(self):
+        """ 输入结束, 输出剩余的帧 """
+        return [self._pop() for _ in range(len(self.pending))]
+
+    def _pop(self):
+        index = len(self.frames) - len(self.pending)
+        return self.pending.popleft(), self._fill(index)
+
+    def _fill(self, index: int) -> np.ndarray:
+        crop, luma, position = self.frames[index]
+        target = crop.copy()
+        height, width = self.hole.shape
+        band = luma[self.band_ys, self.band_xs]
+
+        # 位移相同的帧露出的是同一批像素, 每种位移只取时间上最近的一帧, 再在时间轴上均匀抽取
+        candidates = {}
+        for k in sorted(range(len(self.frames)), key=lambda k: abs(k - index)):
+            offset = tuple(self.frames[k][2] - position)
+            if offset != (0, 0) and offset not in candidates:
+                candidates[offset] = k
+        candidates = sorted(candidates.values())
+        if len(candidates) > MEDIAN_SAMPLES:
+            candidates = [candidates[i] for i in np.linspace(0, len(candidates) - 1, MEDIAN_SAMPLES).round().astype(int)]
+
+        # 收集其他帧中同一场景点的像素, 落在水印附近或裁剪区域外的不算
+        samples = []
+        for k in candidates:
+            other, other_luma, other_position = self.frames[k]
+            dy, dx = other_position - position
+            # 一致性检查只比较对齐后在另一帧中同样露出背景的环带像素
+            by, bx = self.band_ys + dy, self.band_xs + dx
+            inside = (by >= 0) & (by < height) & (bx >= 0) & (bx < width)
+            inside[inside] = ~self.avoid[by[inside], bx[inside]]
+            if inside.sum() < inside.size // 4:
+                continue
+            difference = np.abs(other_luma[by[inside], bx[inside]] - band[inside]).mean()
+            if difference > CONSISTENCY_THRESHOLD:
+                continue
+
+            ys, xs = self.hole_ys + dy, self.hole_xs + dx
+            valid = (ys >= 0) & (ys < height) & (xs >= 0) & (xs < width)
+            valid[valid] = ~self.avoid[ys[valid], xs[valid]]
+            values = np.full((len(ys), crop.shape[2]), np.nan, np.float32)
+            values[valid] = other[ys[valid], xs[valid]]
+            samples.append(values)
+
+        unresolved = self.hole.copy()
+        if samples:
+            # 排序后 NaN 在末尾, 按每个像素的有效样本数取中间的一个或两个
+            samples = np.sort(np.stack(samples), axis=0)
+            count = (~np.isnan(samples[..., 0])).sum(0)
+            seen = count > 0
+            samples, count = samples[:, seen], count[seen][None, :, None]
+            median = (np.take_along_axis(samples, (count - 1) // 2, 0)
+                      + np.take_along_axis(samples, count // 2, 0))[0] / 2
+            target[self.hole_ys[seen], self.hole_xs[seen]] = np.rint(median).astype(np.uint8)
+            unresolved[self.hole_ys[seen], self.hole_xs[seen]] = False
+
+        if unresolved.any():
+            self._fill_spatial(target, unresolved, band)
+        return target
+
+    def _fill_spatial(self, target: np.ndarray, unresolved: np.ndarray, band: np.ndarray):
+        """ 时域无法填充的像素做空间修复, 背景静止时沿用上一次的结果 """
+        if self.reference is not None:
+            reference_band, reference_hole, values = self.reference
+            if np.array_equal(reference_hole, unresolved) \
+                    and np.abs(reference_band - band).mean() < STATIC_THRESHOLD:
+                target[unresolved] = values
+                return
+
+        inpaint(target, unresolved, self.method)
+        self.reference = (band, unresolved, target[unresolved])
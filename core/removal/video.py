@@ -0,0 +1,63 @@
+import numpy as np
+from PySide6.QtGui import QImage
+from PySide6.QtMultimedia import QVideoFrame
+
+from core.watermark.render import qimage_view
+from core.watermark.video import VideoPipeline, image_frame
+from core.removal.inpaint import InpaintMethod
+from core.removal.detect import TemplateDetector
+from core.removal.engine import fit_mask
+from core.removal.temporal import TemporalFiller
+
+
+class VideoRemovalPipeline(VideoPipeline):
+    """ 流式去除视频中位置固定的水印
+
+    掩码由模板在第一帧中检测得到, 或使用给定的固定掩码. 每帧只取出水印附近的裁剪区域交给
+    TemporalFiller, 整帧在等待后续参考帧期间保留在填充器中, 数量不超过 lookahead.
+    填充器按帧顺序维护运动状态, 因此只使用一个工作线程.
+    """
+
+    def __init__(self, src: str, dst: str, mask: np.ndarray = None, template_path: str = "",
+                 method: InpaintMethod = InpaintMethod.TELEA, queue_size: int = 8, parent=None):
+        super().__init__(src, dst, workers=1, queue_size=queue_size, parent=parent)
+        self.mask = mask
+        self.template_path = template_path
+        self.method = method
+        self.filler = None
+
+    def _create_filler(self, pixels: np.ndarray):
+        height, width = pixels.shape[:2]
+        if self.template_path:
+            detector = TemplateDetector.from_file(self.template_path)
+            luma = pixels[..., :3].astype(np.float32) @ np.float32([0.299, 0.587, 0.114])
+            detection = detector.detect(luma)
+            if detection is None:
+                raise ValueError("未检测到水印")
+            mask = detector.mask(detection, (height, width))
+        else:
+            mask = fit_mask(self.mask, (width, height))
+        if not mask.any():
+            raise ValueError("水印区域为空")
+        self.filler = TemporalFiller(mask, method=self.method)
+
+    def process_frame(self, frame: QVideoFrame) -> list:
+        image = frame.toImage().convertToFormat(QImage.Format_RGBX8888)
+        pixels = qimage_view(image)
+        if self.filler is None:
+            self._create_filler(pixels)
+
+        # 等待参考帧期间只保留转换后的图片和时间戳, 不占用解码器的帧
+        crop = pixels[self.filler.roi][..., :3].copy()
+        token = (image, frame.startTime(), frame.endTime())
+        return [self._output(token, filled) for token, filled in self.filler.push(crop, token)]
+
+    def flush(self) -> list:
+        if self.filler is None:
+            return []
+        return [self._output(token, filled) for token, filled in self.filler.flush()]
+
+    def _output(self, token, filled: np.ndarray) -> QVideoFrame:
+        image, start_time, end_time = token
+        qimage_view(image)[self.filler.roi][..., :3] = filled
+        return image_frame(image, start_time, end_time)
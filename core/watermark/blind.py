@@ -0,0 +1,171 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+from scipy import fft
+
+
+PAYLOAD_BYTES = 32                  # 1 字节长度 + 最多 31 字节 UTF-8 文本
+PAYLOAD_BITS = PAYLOAD_BYTES * 8
+STRIP_BLOCKS = 32                   # 每个条带包含的块行数
+
+# ITU-R BT.601 亮度权重
+LUMA_WEIGHTS = np.array([0.299, 0.587, 0.114], np.float32)
+
+
+def encode_payload(text: str) -> np.ndarray:
+    """ 将文本编码为固定长度的比特序列, 超长文本在 UTF-8 字符边界处截断 """
+    data = text.encode("utf-8")[:PAYLOAD_BYTES - 1]
+    data = data.decode("utf-8", "ignore").encode("utf-8")
+    raw = bytes([len(data)]) + data.ljust(PAYLOAD_BYTES - 1, b"\0")
+    return np.unpackbits(np.frombuffer(raw, np.uint8))
+
+
+def decode_payload(bits: np.ndarray) -> str:
+    """ encode_payload 的逆过程 """
+    raw = np.packbits(bits.astype(np.uint8)).tobytes()
+    length = min(raw[0], PAYLOAD_BYTES - 1)
+    return raw[1:1 + length].decode("utf-8", "replace")
+
+
+class BlindPlan:
+    """ 盲水印的嵌入参数: 分块大小、选用的中频系数位置, 以及由密钥生成的 ±1 扩频序列和抖动 """
+
+    def __init__(self, key: int, strength: float, block: int = 8):
+        self.key = key
+        self.strength = strength
+        self.block = block
+
+        # 中频带: b/2 - 1 <= u + v <= b/2, 避开直流和易被压缩抹掉的高频
+        u, v = np.indices((block, block))
+        band = (u + v >= block // 2 - 1) & (u + v <= block // 2)
+        self.rows, self.cols = np.nonzero(band)
+
+        rng = np.random.default_rng(key)
+        self.pattern = rng.choice(np.array([-1, 1], np.float32), self.rows.size)
+        self.phase = rng.random()
+
+        # DCT 是线性的, 只改选中系数时逆变换等于 "投影增量 × 空域基图案"
+        coeffs = np.zeros((block, block), np.float32)
+        coeffs[self.rows, self.cols] = self.pattern
+        self.basis = fft.idctn(coeffs, norm="ortho")
+
+    def dither(self, index: np.ndarray) -> np.ndarray:
+        """ 每个块的量化抖动 (以 Δ 为单位), 使未加水印图片的投影相位近似均匀分布 """
+        return (index * 0.6180339887 + self.phase) % 1.0
+
+    def project(self, coeffs: np.ndarray) -> np.ndarray:
+        """ 批量计算每个块中频系数在扩频序列上的投影, coeffs 形状为 (..., b, b) """
+        return coeffs[..., self.rows, self.cols] @ self.pattern / self.rows.size
+
+
+@lru_cache(maxsize=4)
+def get_plan(key: int, strength: float, block: int) -> BlindPlan:
+    return BlindPlan(key, strength, block)
+
+
+def luminance(rgb: np.ndarray) -> np.ndarray:
+    """ 计算 uint8 RGB(A) 图像的 float32 亮度通道 """
+    return rgb[..., :3] @ LUMA_WEIGHTS
+
+
+def block_dct(luma: np.ndarray, block: int) -> np.ndarray:
+    """ 将 (h, w) 亮度按 block×block 分块, 一次批量 DCT, 返回 (h/b, w/b, b, b) 系数 """
+    h, w = luma.shape
+    blocks = luma.reshape(h // block, block, w // block, block).swapaxes(1, 2)
+    return fft.dctn(blocks, axes=(-2, -1), norm="ortho")
+
+
+def block_index(first_row: int, rows: int, cols: int) -> np.ndarray:
+    """ 块在整幅图中按行优先顺序的序号, 第 i 个块承载第 i % PAYLOAD_BITS 个比特 """
+    return np.arange(first_row, first_row + rows)[:, None] * cols + np.arange(cols)[None, :]
+
+
+def _embed_strip(rgb: np.ndarray, first_row: int, bits: np.ndarray, plan: BlindPlan):
+    """ 对一个条带 (高度为 block 整数倍) 原地嵌入水印 """
+    block = plan.block
+    h, w = rgb.shape[0], rgb.shape[1] // block * block
+    coeffs = block_dct(luminance(rgb[:, :w]), block)
+
+    # 抖动调制: 比特 0 量化到 (k + d)Δ, 比特 1 量化到 (k + d + 1/2)Δ
+    step = plan.strength
+    projection = plan.project(coeffs)
+    index = block_index(first_row, *projection.shape)
+    offset = (bits[index % PAYLOAD_BITS] * 0.5 + plan.dither(index)) * step
+    target = np.round((projection - offset) / step) * step + offset
+
+    # 只修改选中的系数, 等价于每个块叠加 (target - projection) 倍的空域基图案
+    delta = (target - projection)[..., None, None] * plan.basis
+    delta = np.rint(delta.swapaxes(1, 2).reshape(h, w)).astype(np.int16)
+
+    # RGB 三个通道加相同的增量, 亮度改变 delta, 色度不变
+    channels = rgb[:, :w, :3]
+    result = channels.astype(np.int16)
+    result += delta[..., None]
+    np.clip(result, 0, 255, out=result)
+    channels[...] = result
+
+
+def embed(rgb: np.ndarray, text: str, plan: BlindPlan, workers: int = 1, row_offset: int = 0):
+    """ 在 uint8 RGB(A) 图像的亮度通道中原地嵌入文本盲水印
+
+    图像按 STRIP_BLOCKS 个块行切成条带, 每个条带内所有块一次完成批量 DCT,
+    workers > 1 时条带在线程池中并行处理 (scipy.fft 与 numpy 运算会释放 GIL).
+    不足一个块的右侧和底部边缘保持不变. 按条带处理大图时 row_offset 为条带首行
+    在整张图片中的行号, 必须是分块大小的整数倍.
+    """
+    bits = encode_payload(text)
+    block = plan.block
+    height = rgb.shape[0] // block * block
+    strip = STRIP_BLOCKS * block
+
+    def run(y):
+        _embed_strip(rgb[y:min(y + strip, height)], (row_offset + y) // block, bits, plan)
+
+    starts = range(0, height, strip)
+    if workers > 1:
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(run, starts))
+    else:
+        for y in starts:
+            run(y)
+
+
+def extract(luma: np.ndarray, plan: BlindPlan):
+    """ 从亮度通道提取盲水印, 返回 (文本, 置信度)
+
+    每个块的投影相对嵌入格点的相位取余弦作为软判决 (+1 表示比特 0, -1 表示比特 1),
+    同一比特的所有块按条带批量 DCT 后用 bincount 一次累加. 置信度是各比特平均软判决
+    绝对值的均值: 完整嵌入接近 1, 未加水印的图片接近 0.
+    """
+    strip = STRIP_BLOCKS * plan.block
+    return extract_strips(((y, luma[y:y + strip]) for y in range(0, luma.shape[0], strip)), plan)
+
+
+def extract_strips(strips, plan: BlindPlan):
+    """ 从按顺序给出的 (首行行号, 亮度条带) 中提取盲水印, 返回值与 extract 相同
+
+    首行行号必须是分块大小的整数倍; 条带高度任意, 不足一个块的部分 (只允许出现在最后一个条带)
+    被忽略. 内存中只有当前条带, 用于不能整图解码的大图.
+    """
+    block = plan.block
+    sums = np.zeros(PAYLOAD_BITS)
+    counts = np.zeros(PAYLOAD_BITS)
+
+    for y, luma in strips:
+        height, width = luma.shape[0] // block * block, luma.shape[1] // block * block
+        if height == 0:
+            continue
+        coeffs = block_dct(luma[:height, :width].astype(np.float32), block)
+        projection = plan.project(coeffs)
+        index = block_index(y // block, *projection.shape)
+        soft = np.cos(2 * np.pi * (projection / plan.strength - plan.dither(index)))
+        bit_index = (index % PAYLOAD_BITS).ravel()
+        sums += np.bincount(bit_index, soft.ravel(), PAYLOAD_BITS)
+        counts += np.bincount(bit_index, minlength=PAYLOAD_BITS)
+
+    if not counts.any():
+        return "", 0.0
+
+    mean = sums / np.maximum(counts, 1)
+    return decode_payload(mean < 0), float(np.abs(mean).mean())
@@ -0,0 +1,113 @@
+import numpy as np
+
+from core.watermark.settings import Location
+
+
+def anchor_position(size, layer_size, location: Location, margin: int):
+    """ 按九宫格位置计算水印图层左上角坐标 """
+    width, height = size
+    layer_width, layer_height = layer_size
+    col, row = location.value % 3, location.value // 3
+    x = (margin, (width - layer_width) // 2, width - layer_width - margin)[col]
+    y = (margin, (height - layer_height) // 2, height - layer_height - margin)[row]
+    return x, y
+
+
+def layer_positions(size, layer_size, location: Location, margin: int):
+    """ 返回水印图块的所有左上角坐标, 平铺时按 margin 间隔铺满整张图片 """
+    if location != Location.TILE:
+        return [anchor_position(size, layer_size, location, margin)]
+
+    width, height = size
+    step_x = layer_size[0] + 2 * margin
+    step_y = layer_size[1] + 2 * margin
+    return [(x, y) for y in range(margin, max(height, 1), step_y)
+                   for x in range(margin, max(width, 1), step_x)]
+
+
+def trim_tile(tile: np.ndarray):
+    """ 裁掉图块四周完全透明的像素, 返回 (裁剪后的图块, x 偏移, y 偏移) """
+    alpha = tile[..., 3]
+    rows = np.flatnonzero(alpha.any(axis=1))
+    cols = np.flatnonzero(alpha.any(axis=0))
+    if rows.size == 0:
+        return tile[:0, :0], 0, 0
+    return tile[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1], int(cols[0]), int(rows[0])
+
+
+def _div255(v: np.ndarray) -> np.ndarray:
+    """ 原地计算 round(v / 255), v 为 uint16 且不超过 255 * 255 """
+    v += 128
+    v += v >> 8
+    v >>= 8
+    return v
+
+
+def composite_over(dst: np.ndarray, tile: np.ndarray, x: int, y: int):
+    """ 将预乘 alpha 的 RGBA 图块原地混合到 uint8 的 RGB/RGBA 目标图像 (x, y) 处
+
+    只对两者相交的区域切片计算, 临时数组与图块同尺寸, 不会复制整张图片.
+    RGBA 目标按非预乘 alpha 处理, 与 PIL 的 RGBA 模式一致.
+    """
+    height, width = dst.shape[:2]
+    tile_height, tile_width = tile.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + tile_width, width), min(y + tile_height, height)
+    if x0 >= x1 or y0 >= y1:
+        return
+
+    region = dst[y0:y1, x0:x1]
+    src = tile[y0 - y:y1 - y, x0 - x:x1 - x]
+    inv = 255 - src[..., 3:4].astype(np.uint16)
+
+    if dst.shape[2] == 3:
+        # 不透明目标: out = src + dst * (1 - a)
+        rgb = region * inv
+        rgb = _div255(rgb)
+        rgb += src[..., :3]
+        region[...] = rgb
+        return
+
+    # 半透明目标: out = (S * 255² + D * Da * (255 - Sa)) / (Sa * 255 + Da * (255 - Sa))
+    # 分子分母同乘 255², 用 uint32 整数运算避免低 alpha 处的量化误差
+    weight = region[..., 3:4] * inv                     # Da * (255 - Sa), uint16
+    denominator = src[..., 3:4] * np.uint16(255)
+    denominator += weight
+
+    rgb = region[..., :3] * weight.astype(np.uint32)
+    rgb += src[..., :3] * np.uint32(255 * 255)
+    rgb += denominator >> 1
+    np.floor_divide(rgb, denominator, out=rgb, where=denominator > 0)
+
+    region[..., :3] = np.minimum(rgb, 255)
+    region[..., 3:4] = _div255(denominator)
+
+
+def composite_layer(dst: np.ndarray, tile: np.ndarray, location: Location, margin: int,
+                    size=None, row_offset: int = 0):
+    """ 按位置设置把图块混合到目标图像上, 平铺时同一图块重复混合多次
+
+    条带处理时 dst 只是整张图片的一部分: size 为整张图片的 (宽, 高), row_offset 为条带首行在整张图片中的行号.
+    """
+    height, width = dst.shape[:2]
+    trimmed, offset_x, offset_y = trim_tile(tile)
+    for x, y in layer_positions(size or (width, height), (tile.shape[1], tile.shape[0]), location, margin):
+        if y + offset_y + trimmed.shape[0] > row_offset and y + offset_y < row_offset + height:
+            composite_over(dst, trimmed, x + offset_x, y + offset_y - row_offset)
+
+
+if __name__ == "__main__":
+    # 粗略的性能基准: python -m core.watermark.composite
+    # 图块每个像素的 alpha 都是随机值, 没有可跳过的透明区域, 是平铺模式的最坏情况
+    import timeit
+
+    rng = np.random.default_rng(0)
+    tile = rng.integers(0, 256, (400, 1200, 4), np.uint8)
+    tile[..., :3] = np.minimum(tile[..., :3], tile[..., 3:4])
+
+    for channels in (3, 4):
+        image = rng.integers(0, 256, (4000, 6000, channels), np.uint8)
+        for location in (Location.BOTTOM_RIGHT, Location.TILE):
+            n = 10
+            seconds = timeit.timeit(lambda: composite_layer(image, tile, location, 20), number=n) / n
+            print(f"24MP {'RGBA' if channels == 4 else 'RGB '} {location.name:<12} {seconds * 1000:8.2f} ms")
@@ -0,0 +1,76 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from PIL import Image
+
+
+JPEG_QUALITY = 95
+
+
+def rgb_profile(icc: bytes) -> bool:
+    """ ICC 配置头第 16~19 字节为数据色彩空间, 只有 RGB 配置适用于输出的 RGB(A) 像素 """
+    return icc[16:20] == b"RGB "
+
+
+def save_options(dst: str, info: dict) -> dict:
+    """ 按输出格式生成 PIL 保存参数, 原样带上源文件中的 EXIF 和 RGB 的 ICC 字节, 不重新解析
+
+    CMYK、灰度等配置描述的是转换前的像素, 不能用于输出, 丢弃.
+    """
+    options = {}
+    if dst.lower().endswith((".jpg", ".jpeg")):
+        options["quality"] = JPEG_QUALITY
+    if info.get("exif"):
+        options["exif"] = info["exif"]
+    if info.get("icc_profile") and rgb_profile(info["icc_profile"]):
+        options["icc_profile"] = info["icc_profile"]
+    return options
+
+
+def temp_path(dst: str) -> str:
+    """ dst 同目录下的隐藏临时文件名, 进程号和线程号保证唯一, 扩展名与目标相同 """
+    directory, name = os.path.split(dst)
+    base, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{base}.{os.getpid()}-{threading.get_ident()}.tmp{ext}")
+
+
+def atomic_save(image: Image.Image, dst: str, **options):
+    """ 先写入同目录下的临时文件再重命名, 中途崩溃或取消不会留下半个输出文件 """
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    tmp_path = temp_path(dst)
+    try:
+        # PIL 根据临时文件的扩展名选择编码格式
+        image.save(tmp_path, **options)
+        os.replace(tmp_path, dst)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+class EncoderPool:
+    """ 输出编码阶段, 与计算阶段分离
+
+    编码在独立线程中进行 (PIL 的 zlib/libjpeg 编码会释放 GIL), 调用方可以立即开始处理
+    下一张图片. 在途的编码任务数超过 max_pending 时 submit 阻塞, 避免解码好的大图在内存中堆积.
+    """
+
+    def __init__(self, threads: int = 1, max_pending: int = 2):
+        self.executor = ThreadPoolExecutor(threads)
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, image: Image.Image, dst: str, **options) -> Future:
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(atomic_save, image, dst, **options)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,374 @@
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from multiprocessing import Manager
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, List
+
+import numpy as np
+from PIL import Image, ImageCms, ImageOps, UnidentifiedImageError
+from PySide6.QtCore import QThread, Signal
+
+from core.watermark.settings import (WatermarkSettings, WatermarkType, OutputFormat, IMAGE_EXTENSIONS,
+                                     VIDEO_EXTENSIONS)
+from core.watermark.composite import composite_layer
+from core.watermark import blind
+from core.watermark.journal import JobJournal, plan_hash, file_digest, JOURNAL_PATH
+from core.watermark.encoder import EncoderPool, save_options, temp_path, rgb_profile
+from core.watermark.tiled import (open_raw_strips, open_strip_writer, strip_rows, strip_writable, check_decode_budget,
+                                  MemoryShares, PEAK_BYTES_PER_PIXEL, DECODE_BYTES_PER_PIXEL)
+
+
+DEFAULT_OUTPUT_FOLDER = "watermark_output"
+DEFAULT_MEMORY_BUDGET = 1 << 30     # 所有子进程合计的像素处理内存预算 (字节)
+
+
+@dataclass(frozen=True)
+class WatermarkJob:
+    """ 单个文件的水印任务 """
+
+    src: str
+    dst: str
+
+
+def output_path(src: str, root: str, settings: WatermarkSettings) -> str:
+    """ 计算输出路径, 目录输入会保留相对 root 的子目录结构 """
+    output_dir = settings.output_dir or os.path.join(root, DEFAULT_OUTPUT_FOLDER)
+    rel_path = os.path.relpath(src, root)
+    base, ext = os.path.splitext(rel_path)
+    if settings.output_format != OutputFormat.KEEP:
+        ext = "." + settings.output_format.value
+    return os.path.join(output_dir, base + ext)
+
+
+def scan_images(directory: str) -> Iterator[str]:
+    """ 递归扫描目录下的图片, 跳过默认输出目录 """
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != DEFAULT_OUTPUT_FOLDER:
+                        stack.append(entry.path)
+                elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield entry.path
+
+
+def unique_path(path: str, taken: set) -> str:
+    """ 输出路径已被同一批的其他任务占用时追加序号, 如 img (1).jpg, 避免后写的文件覆盖先写的 """
+    base, ext = os.path.splitext(path)
+    candidate, index = path, 0
+    while os.path.normcase(candidate) in taken:
+        index += 1
+        candidate = f"{base} ({index}){ext}"
+    taken.add(os.path.normcase(candidate))
+    return candidate
+
+
+def collect_jobs(files: Iterable[str], dirs: Iterable[str], settings: WatermarkSettings) -> List[WatermarkJob]:
+    """ 将文件选择和目录选择的输入转换为水印任务列表, 输出路径在列表内唯一 """
+    jobs = []
+    taken = set()
+    for path in files:
+        if path.lower().endswith(IMAGE_EXTENSIONS):
+            dst = output_path(path, os.path.dirname(path), settings)
+            jobs.append(WatermarkJob(path, unique_path(dst, taken)))
+
+    for directory in dirs:
+        for path in scan_images(directory):
+            jobs.append(WatermarkJob(path, unique_path(output_path(path, directory, settings), taken)))
+
+    return jobs
+
+
+def collect_video_jobs(files: Iterable[str], settings: WatermarkSettings) -> List[WatermarkJob]:
+    """ 将文件选择中的视频转换为任务列表, 视频输出保持原容器格式, 输出路径在列表内唯一 """
+    video_settings = replace(settings, output_format=OutputFormat.KEEP)
+    jobs = []
+    taken = set()
+    for path in files:
+        if path.lower().endswith(VIDEO_EXTENSIONS):
+            dst = output_path(path, os.path.dirname(path), video_settings)
+            jobs.append(WatermarkJob(path, unique_path(dst, taken)))
+    return jobs
+
+
+def run_bounded(pool, fn, items, window: int, is_cancelled=lambda: False):
+    """ 以有限的在途任务数把 items 提交到进程池, 按完成顺序产出 (item, 结果, 异常)
+
+    避免五万个 future 同时驻留内存; is_cancelled 返回 True 后不再提交新任务.
+    """
+    pending = {}
+    items = iter(items)
+    while True:
+        while len(pending) < window and not is_cancelled():
+            item = next(items, None)
+            if item is None:
+                break
+            pending[pool.submit(fn, item)] = item
+
+        if not pending:
+            return
+
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            item = pending.pop(future)
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+# 子进程内的水印图块、参数、编码线程和内存预算, 由 _init_worker 在进程启动时设置一次.
+# 条带处理使用一份预算; 只能整图解码的大图先从 _shares 取得足够的份数, 所有进程合计不超过总预算
+_layer = None
+_settings = None
+_encoder = None
+_shares = None
+
+JOB_CHUNK = 4       # 每次提交给子进程的任务数, 子进程内计算与编码在块内流水线执行
+
+
+def _init_worker(settings: WatermarkSettings, layer: np.ndarray, shares: MemoryShares):
+    global _layer, _settings, _encoder, _shares
+    _settings = settings
+    _layer = layer
+    _encoder = EncoderPool()
+    _shares = shares
+
+
+def _error_reason(e: Exception, job: WatermarkJob) -> str:
+    if isinstance(e, UnidentifiedImageError):
+        return f"cannot identify image file {job.src!r}"
+    return str(e) or type(e).__name__
+
+
+def job_memory(job: WatermarkJob) -> int:
+    """ 按文件头估计任务需要的内存: 可以按条带处理的未压缩图片只需要一份预算, 其他图片需要整图解码 """
+    reader = open_raw_strips(job.src)
+    if reader is not None:
+        width, height, channels = reader.width, reader.height, reader.channels
+        reader.close()
+        if strip_writable(job.dst, channels):
+            return 0
+    else:
+        with Image.open(job.src) as im:
+            width, height = im.size
+    return width * height * DECODE_BYTES_PER_PIXEL
+
+
+def upright_image(im: Image.Image, mode: str) -> Image.Image:
+    """ 按 EXIF 方向摆正并转换到 mode, 水印按照片的显示方向叠加
+
+    摆正后 im.info 中 EXIF 的方向标签随之删除 (等同于 1). 源文件带有 CMYK、灰度等非 RGB 的
+    ICC 配置时按配置把像素转换到 sRGB, 该配置不再随输出保存.
+    """
+    ImageOps.exif_transpose(im, in_place=True)
+    icc = im.info.get("icc_profile")
+    if icc and not rgb_profile(icc) and im.mode in ("CMYK", "L"):
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(icc))
+            return ImageCms.profileToProfile(im, source, ImageCms.createProfile("sRGB"), outputMode=mode)
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            pass
+    return im.convert(mode)
+
+
+def watermark_image(job: WatermarkJob, budget: int):
+    """ 读取并处理单张图片, 返回 (待编码图像, 保存参数, 源文件指纹)
+
+    源文件只读取一次, 摘要和解码共用同一份字节; 指纹为 (内容摘要, 大小, 修改时间), 供任务日志记录.
+    估计的解码内存超出 budget 时抛出 MemoryError.
+    """
+    with open(job.src, "rb") as f:
+        stat = os.fstat(f.fileno())
+        data = f.read()
+    fingerprint = (hashlib.blake2b(data).hexdigest(), stat.st_size, stat.st_mtime_ns)
+
+    with Image.open(io.BytesIO(data)) as im:
+        check_decode_budget(im.size, budget)
+        mode = "RGBA" if im.mode in ("RGBA", "LA", "PA") or "transparency" in im.info else "RGB"
+        base = np.array(upright_image(im, mode))
+        options = save_options(job.dst, im.info)
+
+    _apply_watermark(base)
+
+    image = Image.fromarray(base, mode)
+    if job.dst.lower().endswith((".jpg", ".jpeg")) and mode == "RGBA":
+        image = image.convert("RGB")
+    return image, options, fingerprint
+
+
+def _apply_watermark(pixels: np.ndarray, size=None, row_offset: int = 0):
+    if _settings.watermark_type == WatermarkType.BLIND:
+        plan = blind.get_plan(_settings.blind_key, _settings.blind_strength, _settings.blind_block)
+        blind.embed(pixels, _settings.text, plan, row_offset=row_offset)
+    else:
+        composite_layer(pixels, _layer, _settings.location, _settings.margin, size, row_offset)
+
+
+def watermark_tiled(job: WatermarkJob):
+    """ 按条带处理超出内存预算的大图, 返回源文件指纹; 不满足条件时返回 None, 由调用方整图处理
+
+    源文件必须是未压缩存储 (BMP、无压缩 TIFF), 输出必须是可逐条带写出的 PNG/TIFF/BMP.
+    条带高度按预算计算并对齐到盲水印分块, 分块不会跨越条带, 因此条带之间不需要重叠.
+    峰值内存只与图片宽度和预算有关, 与高度无关. 源文件头中的 EXIF 和 ICC 随写出器保留.
+    """
+    reader = open_raw_strips(job.src)
+    if reader is None:
+        return None
+    try:
+        width, height = reader.width, reader.height
+        if width * height * PEAK_BYTES_PER_PIXEL <= _shares.share:
+            return None
+
+        rows = strip_rows(width, _shares.share, _settings.blind_block)
+        os.makedirs(os.path.dirname(job.dst), exist_ok=True)
+        tmp_path = temp_path(job.dst)
+        writer = open_strip_writer(tmp_path, width, height, reader.channels, rows, reader.info)
+        if writer is None:
+            return None
+
+        stat = os.stat(job.src)
+        fingerprint = (file_digest(job.src), stat.st_size, stat.st_mtime_ns)
+        try:
+            for y in range(0, height, rows):
+                strip = reader.read(y, min(y + rows, height))
+                _apply_watermark(strip, (width, height), y)
+                writer.write(strip)
+            writer.close()
+            os.replace(tmp_path, job.dst)
+        except BaseException:
+            writer.file.close()
+            os.remove(tmp_path)
+            raise
+        return fingerprint
+    finally:
+        reader.close()
+
+
+def process_jobs(jobs: List[WatermarkJob]):
+    """ 在子进程中处理一组任务, 按顺序返回每个任务的 (失败原因, 源文件指纹)
+
+    计算完一张图片后交给编码线程写盘, 随即开始计算下一张, 计算与编码/写盘重叠;
+    超出内存预算的大图按条带同步处理. 每个任务从开始解码到编码完成都持有它所需的预算份数.
+    成功时失败原因为 None.
+    """
+    pending = []        # (任务, 编码 future, 失败原因, 源文件指纹)
+    for job in jobs:
+        shares = 0
+        try:
+            shares = _shares.acquire(job_memory(job))
+            fingerprint = watermark_tiled(job)
+            if fingerprint is not None:
+                pending.append((job, None, None, fingerprint))
+                continue
+            image, options, fingerprint = watermark_image(job, shares * _shares.share)
+            future = _encoder.submit(image, job.dst, **options)
+            # 待编码的图像仍占用内存, 编码完成后才归还预算
+            future.add_done_callback(lambda _, count=shares: _shares.release(count))
+            shares = 0
+            pending.append((job, future, None, fingerprint))
+        except Exception as e:
+            pending.append((job, None, _error_reason(e, job), None))
+        finally:
+            if shares:
+                _shares.release(shares)
+
+    results = []
+    for job, future, reason, fingerprint in pending:
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                reason, fingerprint = _error_reason(e, job), None
+        results.append((reason, fingerprint))
+    return results
+
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class BatchWatermarkEngine(QThread):
+    """ 批量水印引擎, 在后台线程中把任务分发到进程池, 不阻塞 Qt 事件循环
+
+    journal_path 不为空时, 相同参数下已完成且输出仍存在的文件直接计为成功,
+    中断或崩溃后重新运行同一批任务会从上次的进度继续.
+    """
+
+    progressChanged = Signal(int, int, int, int)    # total, processed, success, failed
+    jobFailed = Signal(str, str)                    # filename, reason
+
+    def __init__(self, jobs: List[WatermarkJob], settings: WatermarkSettings, layer: np.ndarray = None,
+                 max_workers: int = None, journal_path: str = JOURNAL_PATH,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET, parent=None):
+        super().__init__(parent=parent)
+        self.jobs = jobs
+        self.settings = settings
+        self.layer = layer
+        self.journal_path = journal_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memory_budget = memory_budget
+        self.progress_interval = 0.1    # 进度信号的最小发送间隔 (秒)
+
+    def run(self):
+        total = len(self.jobs)
+        processed = success = failed = 0
+        last_emit = 0
+        self.progressChanged.emit(total, 0, 0, 0)
+
+        journal = JobJournal(self.journal_path) if self.journal_path else None
+        plan = plan_hash(self.settings, self.layer) if journal else ""
+        skipped = 0
+
+        def pending_jobs():
+            # 在提交时才逐个查询日志, 跳过的文件不进入进程池
+            nonlocal skipped
+            for job in self.jobs:
+                if journal and journal.is_done(job.src, job.dst, plan):
+                    skipped += 1
+                else:
+                    yield job
+
+        # 预算份数由单独的管理进程维护, 所有子进程共享
+        manager = Manager()
+        initargs = (self.settings, self.layer, MemoryShares(manager, self.memory_budget, self.max_workers))
+        try:
+            with ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=initargs) as pool:
+                chunks = run_bounded(pool, process_jobs, chunked(pending_jobs(), JOB_CHUNK), self.max_workers * 2,
+                                     self.isInterruptionRequested)
+                for chunk, results, error in chunks:
+                    if error is not None:
+                        results = [(str(error) or type(error).__name__, None)] * len(chunk)
+                    for job, (reason, fingerprint) in zip(chunk, results):
+                        processed += 1
+                        if reason is None:
+                            success += 1
+                            if journal:
+                                journal.record(job.src, job.dst, plan, *fingerprint)
+                        else:
+                            failed += 1
+                            self.jobFailed.emit(os.path.basename(job.src), reason)
+
+                    now = time.monotonic()
+                    if now - last_emit >= self.progress_interval:
+                        last_emit = now
+                        if journal:
+                            journal.commit()
+                        self.progressChanged.emit(total, processed + skipped, success + skipped, failed)
+        finally:
+            manager.shutdown()
+            if journal:
+                journal.close()
+
+        self.progressChanged.emit(total, processed + skipped, success + skipped, failed)
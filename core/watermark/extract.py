@@ -0,0 +1,204 @@
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from typing import Iterable, List
+
+import numpy as np
+from PIL import Image, ImageOps
+from PySide6.QtCore import QThread, Signal
+
+from core.watermark import blind
+from core.watermark.engine import run_bounded, scan_images, DEFAULT_MEMORY_BUDGET
+from core.watermark.tiled import open_raw_strips, strip_rows, check_decode_budget, MemoryShares, PEAK_BYTES_PER_PIXEL
+
+
+DETECTION_THRESHOLD = 0.3       # 置信度高于该值视为检测到水印
+REPORT_NAME = "blind_watermark_report.jsonl"
+LUMA_BYTES_PER_PIXEL = 5        # 整图读取亮度时每个像素的内存估计 (字节): 4 通道的解码结果和亮度各一份
+
+
+def load_luminance(path: str, budget: int = DEFAULT_MEMORY_BUDGET) -> np.ndarray:
+    """ 读取图片的亮度通道, 估计的解码内存超出 budget 时抛出 MemoryError
+
+    JPEG 通过 draft 让解码器直接输出 Y 分量, 跳过色度上采样和颜色转换;
+    其他格式由 PIL 按 ITU-R 601 权重转换, 与嵌入时使用的亮度一致. 与嵌入时一样按 EXIF 方向摆正.
+    """
+    with Image.open(path) as im:
+        check_decode_budget(im.size, budget, LUMA_BYTES_PER_PIXEL)
+        if im.format == "JPEG":
+            im.draft("L", im.size)
+        ImageOps.exif_transpose(im, in_place=True)
+        return np.asarray(im.convert("L"))
+
+
+def luminance_memory(path: str) -> int:
+    """ 按文件头估计整图读取亮度需要的内存; 未压缩的图片可以按条带读取, 返回 0 """
+    reader = open_raw_strips(path)
+    if reader is not None:
+        reader.close()
+        return 0
+    with Image.open(path) as im:
+        width, height = im.size
+    return width * height * LUMA_BYTES_PER_PIXEL
+
+
+def extract_image(path: str, plan: blind.BlindPlan, memory_budget: int, decode_budget: int):
+    """ 提取单张图片的盲水印, 返回 (文本, 置信度)
+
+    未压缩存储 (BMP、无压缩 TIFF) 且超出 memory_budget 的大图按条带读取像素, 逐条带计算亮度和
+    分块 DCT, 峰值内存只与图片宽度和预算有关; 其他图片整图解码亮度通道, 估计的内存超出
+    decode_budget 时失败.
+    """
+    reader = open_raw_strips(path)
+    if reader is not None:
+        try:
+            width, height = reader.width, reader.height
+            if width * height * PEAK_BYTES_PER_PIXEL > memory_budget:
+                rows = strip_rows(width, memory_budget, plan.block)
+                strips = ((y, blind.luminance(reader.read(y, min(y + rows, height)))) for y in range(0, height, rows))
+                return blind.extract_strips(strips, plan)
+        finally:
+            reader.close()
+    return blind.extract(load_luminance(path, decode_budget), plan)
+
+
+def extract_file(path: str, key: int, strength: float, block: int, shares: MemoryShares = None) -> dict:
+    """ 提取单个文件的盲水印, 返回可直接写入 JSONL 的结果
+
+    给出 shares 时先取得所需的预算份数, 提取完成后归还; 否则使用整个默认预算.
+    """
+    count = 0
+    try:
+        if shares is None:
+            memory_budget = decode_budget = DEFAULT_MEMORY_BUDGET
+        else:
+            count = shares.acquire(luminance_memory(path))
+            memory_budget, decode_budget = shares.share, count * shares.share
+        text, confidence = extract_image(path, blind.get_plan(key, strength, block), memory_budget, decode_budget)
+    except Exception as e:
+        return {"path": path, "error": str(e) or type(e).__name__}
+    finally:
+        if count:
+            shares.release(count)
+
+    detected = confidence >= DETECTION_THRESHOLD
+    return {
+        "path": path,
+        "detected": detected,
+        "text": text if detected else "",
+        "confidence": round(confidence, 4),
+    }
+
+
+def collect_images(files: Iterable[str], dirs: Iterable[str]) -> List[str]:
+    """ 合并文件和目录输入, 目录递归扫描其中的图片 """
+    paths = list(files)
+    for directory in dirs:
+        paths.extend(scan_images(directory))
+    return paths
+
+
+# 子进程内共享的内存预算份数, 由 _init_worker 在进程启动时设置
+_shares = None
+
+
+def _init_worker(shares: MemoryShares):
+    global _shares
+    _shares = shares
+
+
+def _extract_job(args):
+    return extract_file(*args, _shares)
+
+
+class BatchExtractEngine(QThread):
+    """ 批量盲水印提取, 在进程池中并行解码和提取, 结果按完成顺序写入 JSONL 报告
+
+    memory_budget 为所有子进程合计的像素处理内存预算, 与批量加水印相同: 均分为与进程数相同的份数,
+    条带读取使用一份, 只能整图解码的大图取得足够的份数后才解码, 所有进程合计不超过该预算.
+    """
+
+    progressChanged = Signal(int, int, int, int)    # total, processed, detected, failed
+    jobFailed = Signal(str, str)                    # filename, reason
+    resultReady = Signal(str, str, float)           # path, text, confidence
+
+    def __init__(self, paths: List[str], key: int, strength: float, block: int,
+                 report_path: str = None, max_workers: int = None,
+                 memory_budget: int = DEFAULT_MEMORY_BUDGET, parent=None):
+        super().__init__(parent=parent)
+        self.paths = paths
+        self.report_path = report_path
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.plan_args = (key, strength, block)
+        self.memory_budget = memory_budget
+        self.progress_interval = 0.1
+
+    def run(self):
+        total = len(self.paths)
+        processed = detected = failed = 0
+        last_emit = 0
+        self.progressChanged.emit(total, 0, 0, 0)
+
+        report = None
+        if self.report_path:
+            os.makedirs(os.path.dirname(self.report_path) or ".", exist_ok=True)
+            report = open(self.report_path, "w", encoding="utf-8")
+
+        # 预算份数由单独的管理进程维护, 所有子进程共享
+        manager = Manager()
+        initargs = (MemoryShares(manager, self.memory_budget, self.max_workers),)
+        try:
+            with ProcessPoolExecutor(self.max_workers, initializer=_init_worker, initargs=initargs) as pool:
+                jobs = ((path, *self.plan_args) for path in self.paths)
+                results = run_bounded(pool, _extract_job, jobs, self.max_workers * 4, self.isInterruptionRequested)
+                for job, result, error in results:
+                    if error is not None:
+                        result = {"path": job[0], "error": str(error) or type(error).__name__}
+
+                    processed += 1
+                    if "error" in result:
+                        failed += 1
+                        self.jobFailed.emit(os.path.basename(result["path"]), result["error"])
+                    else:
+                        detected += result["detected"]
+                        self.resultReady.emit(result["path"], result["text"], result["confidence"])
+
+                    if report:
+                        report.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+                    now = time.monotonic()
+                    if now - last_emit >= self.progress_interval:
+                        last_emit = now
+                        self.progressChanged.emit(total, processed, detected, failed)
+        finally:
+            manager.shutdown()
+            if report:
+                report.close()
+
+        self.progressChanged.emit(total, processed, detected, failed)
+
+
+if __name__ == "__main__":
+    # 命令行审计模式: python -m core.watermark.extract DIR [DIR ...] -o report.jsonl
+    import argparse
+
+    from core.watermark.settings import WatermarkSettings
+
+    defaults = WatermarkSettings()
+    parser = argparse.ArgumentParser(description="批量提取盲水印并输出 JSONL 报告")
+    parser.add_argument("dirs", nargs="+")
+    parser.add_argument("-o", "--output", default=REPORT_NAME)
+    parser.add_argument("--key", type=int, default=defaults.blind_key)
+    parser.add_argument("--strength", type=float, default=defaults.blind_strength)
+    parser.add_argument("--block", type=int, default=defaults.blind_block)
+    parser.add_argument("-j", "--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    paths = collect_images([], args.dirs)
+    engine = BatchExtractEngine(paths, args.key, args.strength, args.block, args.output, args.workers)
+    start = time.perf_counter()
+    engine.run()
+    elapsed = time.perf_counter() - start
+    print(f"{len(paths)} images in {elapsed:.1f}s ({len(paths) / max(elapsed, 1e-9):.1f} images/s) -> {args.output}")
@@ -0,0 +1,97 @@
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+from core.paths import CONFIG_DIR
+from core.watermark.settings import WatermarkSettings, WatermarkType
+
+
+JOURNAL_PATH = os.path.join(CONFIG_DIR, "watermark_journal.db")
+
+
+def file_digest(path: str) -> str:
+    """ 文件内容的 BLAKE2b 摘要 """
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "blake2b").hexdigest()
+
+
+def plan_hash(settings: WatermarkSettings, layer: np.ndarray = None) -> str:
+    """ 只包含影响输出像素和编码的参数
+
+    可见水印直接对栅格化后的图块求摘要, 文字、字体、颜色、图片、透明度、旋转和缩放
+    都已体现在图块中; 输出目录不参与计算, 它通过输出路径单独比较.
+    """
+    h = hashlib.blake2b()
+    h.update(repr((settings.watermark_type.value, settings.output_format.value)).encode())
+    if settings.watermark_type == WatermarkType.BLIND:
+        h.update(repr((settings.text, settings.blind_key, settings.blind_strength, settings.blind_block)).encode())
+    else:
+        h.update(repr((settings.location.value, settings.margin, layer.shape)).encode())
+        h.update(np.ascontiguousarray(layer).data)
+    return h.hexdigest()
+
+
+class JobJournal:
+    """ 批处理任务日志, 记录每个输入文件已完成时的状态, 用于中断后续跑
+
+    以源文件路径为主键, 查询是一次索引查找. 文件大小和修改时间未变时直接信任已记录的
+    内容摘要; 变化时重新计算摘要, 内容相同 (例如只是被 touch) 仍可跳过.
+    SQLite 连接只能在创建它的线程中使用.
+    """
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                src TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                plan_hash TEXT NOT NULL,
+                dst TEXT NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    def is_done(self, src: str, dst: str, plan: str) -> bool:
+        """ 源文件在相同参数下已输出到 dst 且输出仍存在时返回 True """
+        row = self.connection.execute(
+            "SELECT size, mtime_ns, content_hash, plan_hash, dst FROM jobs WHERE src = ?", (src,)).fetchone()
+        if row is None:
+            return False
+
+        size, mtime_ns, content_hash, done_plan, done_dst = row
+        if done_plan != plan or done_dst != dst or not os.path.exists(dst):
+            return False
+
+        try:
+            stat = os.stat(src)
+            if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                return True
+            if file_digest(src) != content_hash:
+                return False
+        except OSError:
+            return False
+
+        # 内容未变, 更新记录的文件状态, 下次无需再计算摘要
+        self.connection.execute("UPDATE jobs SET size = ?, mtime_ns = ? WHERE src = ?",
+                                (stat.st_size, stat.st_mtime_ns, src))
+        return True
+
+    def record(self, src: str, dst: str, plan: str, content_hash: str, size: int, mtime_ns: int):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO jobs (src, size, mtime_ns, content_hash, plan_hash, dst) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (src, size, mtime_ns, content_hash, plan, dst))
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
@@ -0,0 +1,139 @@
+import os
+from dataclasses import replace
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image, ImageOps, ExifTags
+from PySide6.QtCore import QObject, QThread, QTimer, Signal
+from PySide6.QtGui import QImage
+
+from core.watermark.settings import WatermarkSettings, WatermarkType
+from core.watermark.composite import composite_layer
+from core.watermark.render import render_layer
+
+
+PREVIEW_MAX_SIZE = 1600         # 代理图长边上限, 与预览区域的屏幕尺寸相当
+PREVIEW_INTERVAL = 16           # 合并一帧 (约 60 fps) 内的设置变化, 单位毫秒
+
+
+@lru_cache(maxsize=2)
+def load_proxy(path: str, mtime: float, max_size: int = PREVIEW_MAX_SIZE):
+    """ 读取缩小后的预览代理图, 返回 (RGB 数组, 相对原图的缩放比例)
+
+    JPEG 通过 draft 在解码时按 1/2、1/4、1/8 缩小, 大图不会完整解码到内存.
+    同一文件只读取一次, mtime 用于在文件被修改后让缓存失效. 与批量处理一样按 EXIF 方向摆正.
+    """
+    with Image.open(path) as im:
+        # 方向 5~8 需要转置, 摆正后的宽度为原图的高度
+        transposed = im.getexif().get(ExifTags.Base.Orientation, 1) > 4
+        full_width = im.height if transposed else im.width
+        im.draft("RGB", (max_size, max_size))
+        ImageOps.exif_transpose(im, in_place=True)
+        proxy = im.convert("RGB")
+    proxy.thumbnail((max_size, max_size), Image.BILINEAR)
+
+    array = np.asarray(proxy)
+    array.flags.writeable = False
+    return array, proxy.width / full_width
+
+
+def array_to_qimage(rgb: np.ndarray) -> QImage:
+    """ 将 uint8 RGB 数组复制为 QImage """
+    height, width = rgb.shape[:2]
+    return QImage(rgb.data, width, height, rgb.strides[0], QImage.Format_RGB888).copy()
+
+
+def render_preview(proxy: np.ndarray, ratio: float, settings: WatermarkSettings) -> np.ndarray:
+    """ 在代理图的副本上叠加按比例缩小的水印图层, 原图始终不参与计算
+
+    盲水印肉眼不可见, 直接返回代理图. 缩放比例保留小数, 取整到整数百分比会让小代理图上的水印
+    明显偏大或偏小.
+    """
+    if settings.watermark_type == WatermarkType.BLIND:
+        return proxy
+
+    scaled = replace(settings, scale=settings.scale * ratio, margin=round(settings.margin * ratio))
+    layer = render_layer(scaled)
+    result = proxy.copy()
+    composite_layer(result, layer, scaled.location, scaled.margin)
+    return result
+
+
+class PreviewRenderThread(QThread):
+    """ 渲染一次预览, 首次读取某个文件时同时发出代理原图 """
+
+    sourceReady = Signal(QImage)
+    previewReady = Signal(QImage)
+
+    def __init__(self, path: str, settings: WatermarkSettings, emit_source: bool, parent=None):
+        super().__init__(parent=parent)
+        self.path = path
+        self.settings = settings
+        self.emit_source = emit_source
+
+    def run(self):
+        try:
+            proxy, ratio = load_proxy(self.path, os.path.getmtime(self.path))
+        except OSError:
+            return
+        if self.emit_source:
+            self.sourceReady.emit(array_to_qimage(proxy))
+
+        try:
+            result = render_preview(proxy, ratio, self.settings)
+        except OSError:
+            # 水印图片尚未选择或无法读取时显示不带水印的代理图
+            result = proxy
+        self.previewReady.emit(array_to_qimage(result))
+
+
+class PreviewRenderer(QObject):
+    """ 实时预览调度
+
+    一帧内的多次设置变化只保留最后一次, 同一时间最多一个渲染线程在运行;
+    渲染期间到达的请求在线程结束后以最新设置补渲染一次, 拖动滑条时不会堆积任务.
+    """
+
+    sourceReady = Signal(QImage)
+    previewReady = Signal(QImage)
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+        self.path = ""
+        self.settings = None
+        self.source_path = ""       # 已发出代理原图的文件
+        self.thread = None
+        self.pending = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(PREVIEW_INTERVAL)
+        self.timer.timeout.connect(self._render)
+
+    def request(self, path: str, settings: WatermarkSettings):
+        self.path = path
+        self.settings = settings
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def _render(self):
+        if not self.path:
+            return
+        if self.thread is not None:
+            self.pending = True
+            return
+
+        emit_source = self.path != self.source_path
+        self.source_path = self.path
+        self.thread = PreviewRenderThread(self.path, self.settings, emit_source, self)
+        self.thread.sourceReady.connect(self.sourceReady)
+        self.thread.previewReady.connect(self.previewReady)
+        self.thread.finished.connect(self._onFinished)
+        self.thread.start()
+
+    def _onFinished(self):
+        self.thread.deleteLater()
+        self.thread = None
+        if self.pending:
+            self.pending = False
+            self._render()
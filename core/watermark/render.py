@@ -0,0 +1,102 @@
+import math
+import os
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+from PySide6.QtCore import Qt, QRectF
+from PySide6.QtGui import QImage, QPainter, QFont, QFontMetricsF, QColor, QTransform
+
+from core.watermark.settings import WatermarkSettings, ContentType
+
+
+def qimage_to_array(image: QImage) -> np.ndarray:
+    """ 将 QImage 转为预乘 alpha 的只读 RGBA uint8 数组, 形状为 (h, w, 4) """
+    image = image.convertToFormat(QImage.Format_RGBA8888_Premultiplied)
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    buffer = np.frombuffer(image.constBits(), np.uint8, count=stride * height).reshape(height, stride)
+    array = buffer[:, :width * 4].reshape(height, width, 4).copy()
+    array.flags.writeable = False
+    return array
+
+
+def qimage_view(image: QImage) -> np.ndarray:
+    """ 返回与 32 位 QImage 共享内存的可写 uint8 数组, 形状为 (h, w, 4) """
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    buffer = np.frombuffer(image.bits(), np.uint8, count=stride * height).reshape(height, stride)
+    return buffer[:, :width * 4].reshape(height, width, 4)
+
+
+def premultiply(rgba: np.ndarray) -> np.ndarray:
+    """ 将非预乘的 RGBA 数组转为预乘 alpha """
+    out = rgba.copy()
+    alpha = rgba[..., 3:4].astype(np.uint16)
+    out[..., :3] = (rgba[..., :3] * alpha + 127) // 255
+    return out
+
+
+@lru_cache(maxsize=32)
+def render_text_tile(text: str, font_family: str, font_size: int, color: str,
+                     rotation: int, scale: float) -> np.ndarray:
+    """ 栅格化旋转、抗锯齿后的文字图块, scale 为百分比, 预览时可以是小数
+
+    同一渲染参数只排版、绘制一次, 批处理中的每张图片和平铺的每次重复都复用这份缓冲区.
+    需要在已创建 QApplication 的进程中调用 (进程池的子进程中没有字体数据库), 可以在任意线程中
+    调用: 只在 QImage 上绘制, 不涉及窗口部件, Qt 6 的字体排版和 QImage 绘制都支持非界面线程.
+    """
+    font = QFont(font_family) if font_family else QFont()
+    font.setPixelSize(max(1, round(font_size * scale / 100)))
+
+    metrics = QFontMetricsF(font)
+    text_rect = metrics.boundingRect(QRectF(), Qt.AlignLeft, text)
+
+    transform = QTransform().rotate(rotation)
+    bounding = transform.mapRect(text_rect)
+    width = max(1, math.ceil(bounding.width()))
+    height = max(1, math.ceil(bounding.height()))
+
+    image = QImage(width, height, QImage.Format_RGBA8888_Premultiplied)
+    image.fill(Qt.transparent)
+
+    painter = QPainter(image)
+    painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing)
+    painter.translate(width / 2, height / 2)
+    painter.rotate(rotation)
+    painter.translate(-text_rect.center())
+    painter.setFont(font)
+    painter.setPen(QColor(color))
+    painter.drawText(text_rect, Qt.AlignLeft, text)
+    painter.end()
+
+    return qimage_to_array(image)
+
+
+@lru_cache(maxsize=8)
+def render_image_tile(image_path: str, mtime: float, opacity: int, rotation: int, scale: float) -> np.ndarray:
+    """ 读取图片水印并应用缩放、旋转和透明度, mtime 用于在文件被修改后让缓存失效 """
+    with Image.open(image_path) as im:
+        layer = im.convert("RGBA")
+
+    if scale != 100:
+        size = (max(1, round(layer.width * scale / 100)),
+                max(1, round(layer.height * scale / 100)))
+        layer = layer.resize(size, Image.LANCZOS)
+
+    if rotation:
+        # PIL 逆时针为正, 与滑条 (QPainter 顺时针为正) 相反
+        layer = layer.rotate(-rotation, Image.BICUBIC, expand=True)
+
+    rgba = np.asarray(layer).copy()
+    rgba[..., 3] = (rgba[..., 3].astype(np.uint16) * opacity + 50) // 100
+    array = premultiply(rgba)
+    array.flags.writeable = False
+    return array
+
+
+def render_layer(settings: WatermarkSettings) -> np.ndarray:
+    """ 根据水印内容类型返回 (可能已缓存的) 预乘 alpha 水印图块 """
+    if settings.content_type == ContentType.IMAGE:
+        return render_image_tile(settings.image_path, os.path.getmtime(settings.image_path),
+                                 settings.opacity, settings.rotation, settings.scale)
+    return render_text_tile(settings.text, settings.font_family, settings.font_size,
+                            settings.color, settings.rotation, settings.scale)
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from enum import Enum
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp", ".avif", ".tif", ".tiff")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+
+class WatermarkType(Enum):
+    """ 水印类型 """
+
+    VISIBLE = "visible"
+    BLIND = "blind"
+
+
+class ContentType(Enum):
+    """ 水印内容类型 """
+
+    TEXT = "text"
+    IMAGE = "image"
+
+
+class Location(Enum):
+    """ 水印位置, 顺序与 watermark_location_combo 的选项一致 """
+
+    TOP_LEFT = 0
+    TOP_CENTER = 1
+    TOP_RIGHT = 2
+    CENTER_LEFT = 3
+    CENTER = 4
+    CENTER_RIGHT = 5
+    BOTTOM_LEFT = 6
+    BOTTOM_CENTER = 7
+    BOTTOM_RIGHT = 8
+    TILE = 9
+
+
+class OutputFormat(Enum):
+    """ 输出格式, 顺序与 output_format_combo 的选项一致 """
+
+    KEEP = "keep"
+    JPG = "jpg"
+    PNG = "png"
+
+
+@dataclass(frozen=True)
+class WatermarkSettings:
+    """ 水印处理参数, 由 WatermarkAdd 面板收集, 可以安全地传给子进程 """
+
+    watermark_type: WatermarkType = WatermarkType.VISIBLE
+    content_type: ContentType = ContentType.TEXT
+
+    # 文字水印
+    text: str = "@ PowerTools"
+    font_family: str = ""
+    font_size: int = 15
+    color: str = "#000000"
+
+    # 图片水印
+    image_path: str = ""
+    opacity: int = 20
+
+    # 水印设置
+    location: Location = Location.BOTTOM_RIGHT
+    rotation: int = 0
+    scale: int = 100
+    margin: int = 20
+
+    # 盲水印, 水印文字即为嵌入的内容
+    blind_key: int = 5470
+    blind_strength: float = 24.0
+    blind_block: int = 8
+
+    # 输出设置
+    output_dir: str = ""
+    output_format: OutputFormat = OutputFormat.KEEP
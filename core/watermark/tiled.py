@@ -0,0 +1,290 @@
+import os
+import struct
+import zlib
+
+import numpy as np
+from PIL import Image, ExifTags
+
+
+# 条带处理时每个像素的峰值内存估计 (字节): 条带本身、盲水印的亮度/DCT 系数/增量和 int16 中间结果
+PEAK_BYTES_PER_PIXEL = 24
+# 整图处理时每个像素的内存估计 (字节): 解码结果、可写的像素数组和待编码的图像各一份, 按 4 通道计
+DECODE_BYTES_PER_PIXEL = 12
+
+# 未压缩像素数据的原始排列 -> (每像素字节数, 转为 RGB(A) 的通道顺序)
+RAW_LAYOUTS = {
+    "RGB": (3, [0, 1, 2]),
+    "BGR": (3, [2, 1, 0]),
+    "RGBA": (4, [0, 1, 2, 3]),
+    "BGRA": (4, [2, 1, 0, 3]),
+    "RGBX": (4, [0, 1, 2]),
+    "BGRX": (4, [2, 1, 0]),
+}
+
+
+def check_decode_budget(size: tuple, budget: int, bytes_per_pixel: int = DECODE_BYTES_PER_PIXEL):
+    """ 整图解码前按文件头中的尺寸估计内存, 超出预算时抛出 MemoryError
+
+    JPEG 和压缩的 PNG/TIFF 无法按行区间读取, 只能整图解码; 超出预算时直接失败并说明原因,
+    而不是在解码途中耗尽内存.
+    """
+    width, height = size
+    required = width * height * bytes_per_pixel
+    if required > budget:
+        raise MemoryError(f"图片过大 ({width}×{height}), 整图解码约需 {required >> 20} MB, "
+                          f"超出内存预算 {budget >> 20} MB; 只有未压缩的 BMP/TIFF 可以按条带处理")
+
+
+class MemoryShares:
+    """ 在进程池的所有子进程之间分配的内存预算
+
+    预算均分为 count 份. 每个任务开始前按估计的内存占用取得若干份 (至少 1 份), 完成后归还,
+    取得的份数就是该任务允许的整图解码预算; 所有进程同时持有的份数不超过 count, 合计内存
+    不超过总预算. 取得多份时持有锁, 等待中的大图不会被陆续到来的小图饿死.
+    信号量和锁是 Manager 的代理, 可以通过进程池的 initargs 传给子进程.
+    """
+
+    def __init__(self, manager, budget: int, count: int):
+        self.count = count
+        self.share = budget // count
+        self.tokens = manager.Semaphore(count)
+        self.lock = manager.Lock()
+
+    def acquire(self, required: int) -> int:
+        """ 阻塞直到取得容纳 required 字节所需的份数, 超出总预算时取得全部, 返回份数 """
+        count = min(max(-(-required // self.share), 1), self.count)
+        with self.lock:
+            for _ in range(count):
+                self.tokens.acquire()
+        return count
+
+    def release(self, count: int):
+        for _ in range(count):
+            self.tokens.release()
+
+
+def strip_rows(width: int, budget: int, align: int) -> int:
+    """ 在内存预算内每个条带的行数, 向下对齐到 align (盲水印分块大小) 的整数倍 """
+    rows = budget // max(width * PEAK_BYTES_PER_PIXEL, 1)
+    return max(rows // align * align, align)
+
+
+class RawStripReader:
+    """ 按行区间读取未压缩图片 (BMP、无压缩 TIFF、PPM) 的像素
+
+    直接从文件中定位并读取条带所在的字节, 不经过 PIL 解码, 内存中只有当前条带.
+    不使用内存映射: 映射的文件页会计入进程常驻内存, 无法受预算约束.
+    info 为文件头中的 EXIF 和 ICC 字节, 交给写出器原样保留.
+    """
+
+    def __init__(self, path: str, width: int, height: int, offset: int, stride: int,
+                 bottom_up: bool, layout: str, info: dict = None):
+        self.file = open(path, "rb")
+        self.info = info or {}
+        self.width = width
+        self.height = height
+        self.offset = offset
+        self.stride = stride
+        self.bottom_up = bottom_up
+        self.pixel_bytes, self.order = RAW_LAYOUTS[layout]
+        self.channels = len(self.order)
+
+    def read(self, y0: int, y1: int) -> np.ndarray:
+        """ 返回第 y0 到 y1 行的 RGB(A) 数组 """
+        first = self.height - y1 if self.bottom_up else y0
+        self.file.seek(self.offset + first * self.stride)
+        data = np.fromfile(self.file, np.uint8, (y1 - y0) * self.stride).reshape(y1 - y0, self.stride)
+        rows = data[:, :self.width * self.pixel_bytes].reshape(y1 - y0, self.width, self.pixel_bytes)
+        if self.bottom_up:
+            rows = rows[::-1]
+        return rows[..., self.order]
+
+    def close(self):
+        self.file.close()
+
+
+def open_raw_strips(path: str):
+    """ 图片像素以未压缩的单一数据块存储时返回 RawStripReader, 否则返回 None
+
+    只解析文件头. 超大图片会触发 PIL 的解压炸弹检查, 这里像素不经过 PIL 解码, 读取文件头时临时关闭.
+    """
+    limit, Image.MAX_IMAGE_PIXELS = Image.MAX_IMAGE_PIXELS, None
+    try:
+        with Image.open(path) as im:
+            if len(im.tile) != 1 or im.tile[0].codec_name != "raw":
+                return None
+            # 带方向标签的图片需要先整图摆正
+            if im.getexif().get(ExifTags.Base.Orientation, 1) != 1:
+                return None
+            tile = im.tile[0]
+            width, height = im.size
+            info = {key: im.info[key] for key in ("exif", "icc_profile") if im.info.get(key)}
+    finally:
+        Image.MAX_IMAGE_PIXELS = limit
+
+    args = tile.args if isinstance(tile.args, tuple) else (tile.args,)
+    layout, stride, ystep = (args + (0, 1))[:3]
+    if layout not in RAW_LAYOUTS or tile.extents != (0, 0, width, height):
+        return None
+    stride = stride or width * RAW_LAYOUTS[layout][0]
+    return RawStripReader(path, width, height, tile.offset, stride, ystep < 0, layout, info)
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+class PngStripWriter:
+    """ 逐条带写出 PNG, 像素经 Up 滤波后流式压缩, 内存占用与图片高度无关 """
+
+    def __init__(self, path: str, width: int, height: int, channels: int, info: dict = None):
+        self.file = open(path, "wb")
+        self.compressor = zlib.compressobj(6)
+        self.previous = np.zeros(width * channels, np.uint8)
+
+        color_type = 6 if channels == 4 else 2
+        self.file.write(b"\x89PNG\r\n\x1a\n")
+        self.file.write(_png_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)))
+        info = info or {}
+        if info.get("icc_profile"):
+            self.file.write(_png_chunk(b"iCCP", b"ICC Profile\0\0" + zlib.compress(info["icc_profile"])))
+        if info.get("exif"):
+            exif = info["exif"]
+            self.file.write(_png_chunk(b"eXIf", exif[6:] if exif.startswith(b"Exif\0\0") else exif))
+
+    def write(self, rows: np.ndarray):
+        rows = rows.reshape(rows.shape[0], -1)
+        # Up 滤波: 每行减去上一行, 可以整块向量化计算
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), np.uint8)
+        filtered[:, 0] = 2
+        np.subtract(rows[0], self.previous, out=filtered[0, 1:])
+        np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+        self.previous = rows[-1].copy()
+
+        data = self.compressor.compress(filtered.data)
+        if data:
+            self.file.write(_png_chunk(b"IDAT", data))
+
+    def close(self):
+        self.file.write(_png_chunk(b"IDAT", self.compressor.flush()))
+        self.file.write(_png_chunk(b"IEND", b""))
+        self.file.close()
+
+
+class TiffStripWriter:
+    """ 逐条带写出 Deflate 压缩的 TIFF, 每个处理条带对应一个 TIFF strip, 目录写在文件末尾
+
+    源文件的 ICC 配置写入 InterColorProfile 标签; EXIF 需要单独的子目录, 不保留.
+    """
+
+    def __init__(self, path: str, width: int, height: int, channels: int, rows_per_strip: int, info: dict = None):
+        self.file = open(path, "wb")
+        self.icc_profile = (info or {}).get("icc_profile")
+        self.width = width
+        self.height = height
+        self.channels = channels
+        self.rows_per_strip = rows_per_strip
+        self.offsets = []
+        self.counts = []
+        self.file.write(b"II*\0" + struct.pack("<I", 0))      # 目录偏移在 close 时回填
+
+    def write(self, rows: np.ndarray):
+        data = zlib.compress(np.ascontiguousarray(rows).data, 6)
+        self.offsets.append(self.file.tell())
+        self.counts.append(len(data))
+        self.file.write(data)
+
+    def close(self):
+        f = self.file
+        if f.tell() % 2:
+            f.write(b"\0")
+
+        # 超过 4 字节的标签值写在目录之前
+        bits_offset = f.tell()
+        f.write(struct.pack(f"<{self.channels}H", *[8] * self.channels))
+        offsets_offset = f.tell()
+        f.write(struct.pack(f"<{len(self.offsets)}I", *self.offsets))
+        counts_offset = f.tell()
+        f.write(struct.pack(f"<{len(self.counts)}I", *self.counts))
+        icc_offset = f.tell()
+        if self.icc_profile:
+            f.write(self.icc_profile)
+            if f.tell() % 2:
+                f.write(b"\0")
+
+        def array_tag(values, offset):
+            return values[0] if len(values) == 1 else offset
+
+        entries = [
+            (256, 4, 1, self.width),                                    # ImageWidth
+            (257, 4, 1, self.height),                                   # ImageLength
+            (258, 3, self.channels, bits_offset),                       # BitsPerSample
+            (259, 3, 1, 8),                                             # Compression: Deflate
+            (262, 3, 1, 2),                                             # Photometric: RGB
+            (273, 4, len(self.offsets), array_tag(self.offsets, offsets_offset)),
+            (277, 3, 1, self.channels),                                 # SamplesPerPixel
+            (278, 4, 1, self.rows_per_strip),                           # RowsPerStrip
+            (279, 4, len(self.counts), array_tag(self.counts, counts_offset)),
+            (284, 3, 1, 1),                                             # PlanarConfiguration: chunky
+        ]
+        if self.channels == 4:
+            entries.append((338, 3, 1, 2))                              # ExtraSamples: 非预乘 alpha
+        if self.icc_profile:
+            entries.append((34675, 7, len(self.icc_profile), icc_offset))  # InterColorProfile
+
+        directory = f.tell()
+        f.write(struct.pack("<H", len(entries)))
+        for tag, kind, count, value in entries:
+            packed = struct.pack("<H", value) + b"\0\0" if kind == 3 and count == 1 else struct.pack("<I", value)
+            f.write(struct.pack("<HHI", tag, kind, count) + packed)
+        f.write(struct.pack("<I", 0))
+
+        f.seek(4)
+        f.write(struct.pack("<I", directory))
+        f.close()
+
+
+class BmpStripWriter:
+    """ 逐条带写出 24 位 BMP; BMP 行序自下而上, 预先确定文件大小后按偏移写入每个条带 """
+
+    def __init__(self, path: str, width: int, height: int):
+        self.file = open(path, "wb")
+        self.height = height
+        self.stride = (width * 3 + 3) & ~3
+        self.width = width
+        self.y = 0
+
+        size = 54 + self.stride * height
+        self.file.write(b"BM" + struct.pack("<IHHI", size, 0, 0, 54))
+        self.file.write(struct.pack("<IiiHHIIiiII", 40, width, height, 1, 24, 0, self.stride * height,
+                                    2835, 2835, 0, 0))
+        self.file.truncate(size)
+
+    def write(self, rows: np.ndarray):
+        count = rows.shape[0]
+        padded = np.zeros((count, self.stride), np.uint8)
+        padded[:, :self.width * 3] = rows[::-1, :, 2::-1].reshape(count, -1)
+        self.file.seek(54 + (self.height - self.y - count) * self.stride)
+        self.file.write(padded.data)
+        self.y += count
+
+    def close(self):
+        self.file.close()
+
+
+def strip_writable(path: str, channels: int) -> bool:
+    """ 输出格式是否支持逐条带写出 """
+    ext = os.path.splitext(path)[1].lower()
+    return ext in (".png", ".tif", ".tiff") or (ext == ".bmp" and channels == 3)
+
+
+def open_strip_writer(path: str, width: int, height: int, channels: int, rows_per_strip: int, info: dict = None):
+    """ 按输出扩展名返回流式写出器, 该格式不支持逐条带写出时返回 None """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".png":
+        return PngStripWriter(path, width, height, channels, info)
+    if ext in (".tif", ".tiff"):
+        return TiffStripWriter(path, width, height, channels, rows_per_strip, info)
+    if ext == ".bmp" and channels == 3:
+        return BmpStripWriter(path, width, height)
+    return None
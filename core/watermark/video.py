@@ -0,0 +1,264 @@
+import os
+import time
+from abc import abstractmethod
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PySide6.QtCore import QObject, Signal, QUrl
+from PySide6.QtGui import QImage
+from PySide6.QtMultimedia import (QMediaPlayer, QVideoSink, QVideoFrame, QVideoFrameFormat, QVideoFrameInput,
+                                  QMediaCaptureSession, QMediaRecorder, QMediaFormat, QMediaMetaData)
+
+from core.watermark.settings import WatermarkSettings, WatermarkType
+from core.watermark.composite import composite_layer
+from core.watermark.render import qimage_view
+from core.watermark import blind
+
+
+PLAYBACK_RATE = 8.0             # 转码时的初始播放倍速, 不受实时播放速度限制
+DROP_TOLERANCE = 1.5            # 相邻两帧的时间戳间隔超过帧间隔的这么多倍时视为丢帧
+
+
+# 输出容器与源文件扩展名一致, 编码器按容器选择
+CONTAINER_FORMATS = {
+    ".mp4": (QMediaFormat.FileFormat.MPEG4, QMediaFormat.VideoCodec.H264),
+    ".avi": (QMediaFormat.FileFormat.AVI, QMediaFormat.VideoCodec.MPEG4),
+    ".mov": (QMediaFormat.FileFormat.QuickTime, QMediaFormat.VideoCodec.H264),
+    ".mkv": (QMediaFormat.FileFormat.Matroska, QMediaFormat.VideoCodec.H264),
+}
+
+
+def _media_format(path: str) -> QMediaFormat:
+    ext = os.path.splitext(path)[1].lower()
+    file_format, codec = CONTAINER_FORMATS.get(ext, CONTAINER_FORMATS[".mp4"])
+    media_format = QMediaFormat()
+    media_format.setFileFormat(file_format)
+    media_format.setVideoCodec(codec)
+    return media_format
+
+
+def image_frame(image: QImage, start_time: int, end_time: int) -> QVideoFrame:
+    """ 用处理后的图片生成视频帧, 时间戳沿用源帧 """
+    result = QVideoFrame(image)
+    result.setStartTime(start_time)
+    result.setEndTime(end_time)
+    return result
+
+
+class VideoPipeline(QObject):
+    """ 流式视频处理
+
+    QMediaPlayer + QVideoSink 解码出的帧进入有界队列, 由线程池逐帧处理,
+    再按原顺序经 QVideoFrameInput 交给 QMediaRecorder 重新编码. 队列满时暂停播放器,
+    编码器未就绪时停止出队, 因此内存占用只与队列长度有关, 与视频时长无关.
+    输出只包含视频轨.
+
+    播放器以 PLAYBACK_RATE 倍速运行, 吞吐量不受实时播放限制. 播放器跟不上时会跳过帧, 因此按
+    时间戳检查相邻帧的间隔: 发现丢帧时倍速减半并跳回最后收到的帧重新解码, 跳回后重复的帧被丢弃.
+    1 倍速下的间隔视为源视频本身的间隔 (可变帧率), 照常处理.
+
+    子类实现 process_frame, 每个输入帧返回零个或多个输出帧; 需要参考后续帧的处理可以
+    先保留帧, 在 flush 中输出剩余的帧. 这类处理有顺序依赖, 应使用单个工作线程.
+    """
+
+    progressChanged = Signal(int, int, float)       # processed frames, total frames (未知时为 0), fps
+    finished = Signal(str)                          # 失败原因, 成功时为空字符串
+
+    _frameProcessed = Signal()
+
+    def __init__(self, src: str, dst: str, workers: int = None, queue_size: int = 8, parent=None):
+        # QObject 的元类不能与 ABCMeta 组合, 抽象方法在构造时检查
+        if getattr(type(self).process_frame, "__isabstractmethod__", False):
+            raise TypeError(f"{type(self).__name__} 没有实现抽象方法 process_frame")
+        super().__init__(parent=parent)
+        self.src = src
+        self.dst = dst
+        self.queue_size = queue_size
+        self.progress_interval = 0.25
+
+        self.pool = ThreadPoolExecutor(workers or os.cpu_count() or 1)
+        self.queue = deque()            # 按解码顺序排列的 future, 结果为输出帧列表
+        self.ready = deque()            # 已处理、等待送入编码器的帧
+        self.decoded = 0
+        self.processed = 0
+        self.total = 0
+        self.decoding_finished = False
+        self.stopped = False
+        self.start_time = 0
+        self.last_emit = 0
+        self.rate = PLAYBACK_RATE
+        self.frame_interval = 0         # 帧间隔 (微秒), 由帧率或第一帧的时长得到
+        self.last_time = -1             # 最后接收的帧的时间戳 (微秒)
+
+        self.player = QMediaPlayer(self)
+        self.sink = QVideoSink(self)
+        self.player.setVideoSink(self.sink)
+
+        self.session = QMediaCaptureSession(self)
+        self.recorder = QMediaRecorder(self)
+        self.recorder.setMediaFormat(_media_format(dst))
+        self.recorder.setQuality(QMediaRecorder.Quality.HighQuality)
+        self.recorder.setOutputLocation(QUrl.fromLocalFile(os.path.abspath(dst)))
+        self.session.setRecorder(self.recorder)
+        self.frame_input = None
+
+        self.sink.videoFrameChanged.connect(self._onFrameDecoded)
+        self.player.mediaStatusChanged.connect(self._onMediaStatusChanged)
+        self.player.errorOccurred.connect(lambda error, message: self._fail(message))
+        self.recorder.errorOccurred.connect(lambda error, message: self._fail(message))
+        self.recorder.recorderStateChanged.connect(self._onRecorderStateChanged)
+        self._frameProcessed.connect(self._sendReadyFrames)
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.dst)), exist_ok=True)
+        self.start_time = time.monotonic()
+        self.player.setSource(QUrl.fromLocalFile(self.src))
+        self.player.setPlaybackRate(self.rate)
+        self.player.play()
+
+    def cancel(self):
+        self._fail(self.tr("已取消"))
+
+    @abstractmethod
+    def process_frame(self, frame: QVideoFrame) -> list:
+        """ 在工作线程中处理一帧, 返回可以按顺序送入编码器的帧 """
+
+    def flush(self) -> list:
+        """ 解码结束后在工作线程中调用, 返回保留的剩余帧 """
+        return []
+
+    def _submit(self, fn, *args):
+        future = self.pool.submit(fn, *args)
+        future.add_done_callback(lambda _: self._frameProcessed.emit())
+        self.queue.append(future)
+
+    def _onFrameDecoded(self, frame: QVideoFrame):
+        if self.stopped or not frame.isValid():
+            return
+
+        if not self.total:
+            rate = self.player.metaData().value(QMediaMetaData.Key.VideoFrameRate) or 0
+            self.total = round(self.player.duration() / 1000 * float(rate))
+            if rate:
+                self.frame_interval = 1e6 / float(rate)
+            elif frame.endTime() > frame.startTime() >= 0:
+                self.frame_interval = frame.endTime() - frame.startTime()
+
+        timestamp = frame.startTime()
+        if timestamp >= 0:
+            if timestamp <= self.last_time:
+                return      # 跳回后重新解码出的已处理帧
+            if self.rate > 1 and self.last_time >= 0 and self.frame_interval \
+                    and timestamp - self.last_time > DROP_TOLERANCE * self.frame_interval:
+                self._onFramesDropped()
+                return
+            self.last_time = timestamp
+
+        self.decoded += 1
+        self._submit(self.process_frame, QVideoFrame(frame))
+
+        # 反压: 队列满时暂停解码, 等处理完的帧送出后再继续
+        if len(self.queue) >= self.queue_size:
+            self.player.pause()
+
+    def _onFramesDropped(self):
+        """ 播放器跳过了帧: 倍速减半, 跳回最后收到的帧重新解码 """
+        self.rate = max(self.rate / 2, 1.0)
+        self.player.setPlaybackRate(self.rate)
+        self.player.setPosition(self.last_time // 1000)
+
+    def _sendReadyFrames(self):
+        """ 按解码顺序把已处理的帧送入编码器 """
+        while not self.stopped:
+            if not self.ready:
+                if not (self.queue and self.queue[0].done()):
+                    break
+                try:
+                    self.ready.extend(self.queue.popleft().result())
+                except Exception as e:
+                    self._fail(str(e) or type(e).__name__)
+                    return
+                continue
+
+            frame = self.ready[0]
+            if self.frame_input is None:
+                self._startRecorder(frame)
+            if not self.frame_input.sendVideoFrame(frame):
+                return      # 编码器繁忙, 等待 readyToSendVideoFrame
+
+            self.ready.popleft()
+            self.processed += 1
+            self._emitProgress()
+
+        if self.stopped:
+            return
+        if len(self.queue) < self.queue_size and not self.decoding_finished:
+            self.player.play()
+        elif self.decoding_finished and not self.queue and not self.ready:
+            self.recorder.stop()
+
+    def _startRecorder(self, frame: QVideoFrame):
+        self.frame_input = QVideoFrameInput(QVideoFrameFormat(frame.size(), QVideoFrameFormat.Format_RGBX8888), self)
+        self.frame_input.readyToSendVideoFrame.connect(self._sendReadyFrames)
+        self.session.setVideoFrameInput(self.frame_input)
+        self.recorder.record()
+
+    def _emitProgress(self, force=False):
+        now = time.monotonic()
+        if force or now - self.last_emit >= self.progress_interval:
+            self.last_emit = now
+            fps = self.processed / max(now - self.start_time, 1e-6)
+            self.progressChanged.emit(self.processed, max(self.total, self.processed), fps)
+
+    def _onMediaStatusChanged(self, status):
+        if status == QMediaPlayer.MediaStatus.EndOfMedia:
+            if not self.decoded:
+                self._fail(self.tr("没有解码出视频帧"))
+                return
+            self.decoding_finished = True
+            self._submit(self.flush)
+            self._sendReadyFrames()
+        elif status == QMediaPlayer.MediaStatus.InvalidMedia:
+            self._fail(self.player.errorString() or self.tr("无法解码视频"))
+
+    def _onRecorderStateChanged(self, state):
+        if state == QMediaRecorder.RecorderState.StoppedState and not self.stopped:
+            self._finish("")
+
+    def _fail(self, reason: str):
+        if self.stopped:
+            return
+        # 先标记停止, 避免 recorder.stop() 触发的状态变化被当作正常结束
+        self.stopped = True
+        self.recorder.stop()
+        self._finish(reason)
+
+    def _finish(self, reason: str):
+        self.stopped = True
+        self.player.stop()
+        self.queue.clear()
+        self.ready.clear()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        self._emitProgress(force=True)
+        self.finished.emit(reason)
+
+
+class VideoWatermarkPipeline(VideoPipeline):
+    """ 流式视频水印, 每帧独立叠加缓存的水印图块, 可以在多个线程中并行 """
+
+    def __init__(self, src: str, dst: str, settings: WatermarkSettings, layer: np.ndarray = None,
+                 workers: int = None, queue_size: int = 8, parent=None):
+        super().__init__(src, dst, workers, queue_size, parent)
+        self.settings = settings
+        self.layer = layer
+
+    def process_frame(self, frame: QVideoFrame) -> list:
+        image = frame.toImage().convertToFormat(QImage.Format_RGBX8888)
+        pixels = qimage_view(image)
+        if self.settings.watermark_type == WatermarkType.BLIND:
+            plan = blind.get_plan(self.settings.blind_key, self.settings.blind_strength, self.settings.blind_block)
+            blind.embed(pixels, self.settings.text, plan)
+        else:
+            composite_layer(pixels[..., :3], self.layer, self.settings.location, self.settings.margin)
+        return [image_frame(image, frame.startTime(), frame.endTime())]